@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from telegram import Bot, ChatMember
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATUSES = (ChatMember.ADMINISTRATOR, ChatMember.OWNER)
+
+
+class AdminCache:
+    """Per-chat cache of administrator IDs with a TTL and LRU eviction.
+
+    A lookup fetches the whole admin list of a chat once with
+    get_chat_administrators and answers every following check from memory
+    until the entry expires or is invalidated by a ChatMember update.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_chats: int = 10000):
+        self.ttl = ttl
+        self.max_chats = max_chats
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, Tuple[float, FrozenSet[int]]]" = OrderedDict()
+        self._pending: Dict[int, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, chat_id: int) -> Optional[FrozenSet[int]]:
+        """Return the cached admin set for a chat if it is still fresh."""
+        entry = self._entries.get(chat_id)
+        if entry is None:
+            return None
+        expires_at, admins = entry
+        if expires_at <= time.monotonic():
+            del self._entries[chat_id]
+            return None
+        self._entries.move_to_end(chat_id)
+        return admins
+
+    def _store(self, chat_id: int, admins: FrozenSet[int]):
+        """Store an admin set and evict the least recently used chats."""
+        self._entries[chat_id] = (time.monotonic() + self.ttl, admins)
+        self._entries.move_to_end(chat_id)
+        while len(self._entries) > self.max_chats:
+            self._entries.popitem(last=False)
+
+    async def get_admins(self, bot: Bot, chat_id: int) -> FrozenSet[int]:
+        """Return the admin IDs of a chat, fetching them on a cache miss.
+
+        Concurrent misses for the same chat share a single API request.
+        """
+        admins = self._lookup(chat_id)
+        if admins is not None:
+            self.hits += 1
+            return admins
+
+        self.misses += 1
+        pending = self._pending.get(chat_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[chat_id] = future
+        try:
+            members = await bot.get_chat_administrators(chat_id)
+            admins = frozenset(
+                member.user.id for member in members
+                if member.status in ADMIN_STATUSES
+            )
+            self._store(chat_id, admins)
+            future.set_result(admins)
+            return admins
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve the exception so waiters-less futures don't log warnings
+            future.exception()
+            raise
+        finally:
+            del self._pending[chat_id]
+
+    async def is_admin(self, bot: Bot, chat_id: int, user_id: int) -> bool:
+        """Check whether a user is an administrator of a chat."""
+        return user_id in await self.get_admins(bot, chat_id)
+
+    def invalidate(self, chat_id: int):
+        """Drop the cached admin list of a chat."""
+        self._entries.pop(chat_id, None)
+
+    def clear(self):
+        """Drop all cached admin lists."""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the number of cached chats."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "chats": len(self._entries),
+        }
@@ -0,0 +1,107 @@
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+FLOOD = "flood"
+REPEAT = "repeat"
+
+
+class FloodTracker:
+    """Ring buffers of recent message times and content hashes for one user."""
+
+    __slots__ = ("times", "time_index", "hashes", "hash_index", "offenses", "last_offense")
+
+    def __init__(self, limit: int, history: int):
+        self.times = array("d", bytes(8 * limit))
+        self.time_index = 0
+        self.hashes = array("L", bytes(array("L").itemsize * history))
+        self.hash_index = 0
+        self.offenses = 0
+        self.last_offense = 0.0
+
+    def reset(self):
+        for i in range(len(self.times)):
+            self.times[i] = 0.0
+        for i in range(len(self.hashes)):
+            self.hashes[i] = 0
+
+
+def content_hash(content: str) -> int:
+    """Fingerprint message content, ignoring case and surrounding whitespace."""
+    # 0 marks an empty slot in the hash ring, so never return it
+    return zlib.crc32(content.strip().lower().encode()) or 1
+
+
+class FloodDetector:
+    """Per-(chat, user) message rate and repeated content detection.
+
+    A user floods when more than `limit` messages arrive within `window`
+    seconds; the time ring holds exactly the last `limit` timestamps, so the
+    check only compares against the oldest one. A user repeats when the same
+    content shows up `repeat_limit` times among their last `history`
+    messages.
+    Trackers live in an LRU bounded by `max_users`, so memory stays fixed.
+    """
+
+    def __init__(
+        self,
+        limit: int = 6,
+        window: float = 5.0,
+        repeat_limit: int = 3,
+        history: int = 6,
+        offense_ttl: float = 3600.0,
+        max_users: int = 100000,
+    ):
+        self.limit = limit
+        self.window = window
+        self.repeat_limit = repeat_limit
+        self.history = history
+        self.offense_ttl = offense_ttl
+        self.max_users = max_users
+        self._trackers: "OrderedDict[Tuple[int, int], FloodTracker]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._trackers)
+
+    def _tracker(self, key: Tuple[int, int]) -> FloodTracker:
+        tracker = self._trackers.get(key)
+        if tracker is None:
+            tracker = self._trackers[key] = FloodTracker(self.limit, self.history)
+            if len(self._trackers) > self.max_users:
+                self._trackers.popitem(last=False)
+        else:
+            self._trackers.move_to_end(key)
+        return tracker
+
+    def check(self, chat_id: int, user_id: int, content: Optional[str], now: Optional[float] = None) -> Optional[str]:
+        """Record a message and return FLOOD, REPEAT or None."""
+        now = time.monotonic() if now is None else now
+        tracker = self._tracker((chat_id, user_id))
+
+        oldest = tracker.times[tracker.time_index]
+        tracker.times[tracker.time_index] = now
+        tracker.time_index = (tracker.time_index + 1) % self.limit
+        if oldest and now - oldest < self.window:
+            return FLOOD
+
+        if content:
+            fingerprint = content_hash(content)
+            repeats = tracker.hashes.count(fingerprint) + 1
+            tracker.hashes[tracker.hash_index] = fingerprint
+            tracker.hash_index = (tracker.hash_index + 1) % self.history
+            if repeats >= self.repeat_limit:
+                return REPEAT
+        return None
+
+    def record_offense(self, chat_id: int, user_id: int, now: Optional[float] = None) -> int:
+        """Count an offense, reset the user's buffers and return the offense number."""
+        now = time.monotonic() if now is None else now
+        tracker = self._tracker((chat_id, user_id))
+        if now - tracker.last_offense > self.offense_ttl:
+            tracker.offenses = 0
+        tracker.offenses += 1
+        tracker.last_offense = now
+        tracker.reset()
+        return tracker.offenses
@@ -0,0 +1,39 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, TypeVar
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def call_with_retry(
+    call: Callable[[], Awaitable[T]],
+    retries: int = 3,
+    backoff: float = 1.0,
+) -> T:
+    """Await a Bot API call, retrying on flood control and network errors.
+
+    RetryAfter waits for the delay Telegram asks for; other transient
+    errors back off exponentially. Any other exception is raised directly,
+    including BadRequest, which PTB derives from NetworkError but which
+    won't succeed on a retry.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except RetryAfter as e:
+            if attempt >= retries:
+                raise
+            logger.warning(f"Flood control hit, retrying in {e.retry_after}s")
+            await asyncio.sleep(e.retry_after)
+        except BadRequest:
+            raise
+        except (TimedOut, NetworkError):
+            if attempt >= retries:
+                raise
+            await asyncio.sleep(backoff * 2 ** attempt)
+        attempt += 1
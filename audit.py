@@ -0,0 +1,49 @@
+import html
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+WARN = "warn"
+KICK = "kick"
+BAN = "ban"
+UNBAN = "unban"
+MUTE = "mute"
+UNMUTE = "unmute"
+PURGE = "purge"
+LOCKDOWN = "lockdown"
+UNLOCK = "unlock"
+
+ACTION_ICONS = {
+    WARN: "⚠️",
+    KICK: "👢",
+    BAN: "🚫",
+    UNBAN: "✅",
+    MUTE: "🔇",
+    UNMUTE: "🔊",
+    PURGE: "🗑",
+    LOCKDOWN: "🚨",
+    UNLOCK: "🛡",
+}
+
+
+class AuditEvent(NamedTuple):
+    """One moderation action. `event_id` is assigned by the storage backend."""
+
+    chat_id: int
+    actor_id: int
+    target_id: Optional[int]
+    action: str
+    reason: str
+    timestamp: float
+    event_id: Optional[int] = None
+
+
+def format_event(event: AuditEvent) -> str:
+    """Render an event as one HTML line for /modlog and /history."""
+    when = datetime.fromtimestamp(event.timestamp).strftime("%Y-%m-%d %H:%M")
+    line = f"<code>#{event.event_id}</code> {when} {ACTION_ICONS.get(event.action, '•')} {event.action}"
+    if event.target_id is not None:
+        line += f' <a href="tg://user?id={event.target_id}">{event.target_id}</a>'
+    line += f' by <a href="tg://user?id={event.actor_id}">{event.actor_id}</a>'
+    if event.reason:
+        line += f"\n    {html.escape(event.reason)}"
+    return line
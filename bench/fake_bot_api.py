@@ -0,0 +1,147 @@
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from typing import Optional
+
+from aiohttp import web
+
+BOT_USER = {
+    "id": 1000,
+    "is_bot": True,
+    "first_name": "GroupHelpBot",
+    "username": "grouphelp_bench_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": True,
+    "supports_inline_queries": False,
+}
+
+ADMIN_USER = {"id": 1, "is_bot": False, "first_name": "Admin", "username": "admin"}
+
+# Methods that return a Message object
+MESSAGE_METHODS = frozenset({"sendMessage", "editMessageText", "copyMessage", "forwardMessage"})
+
+
+class FakeBotApi:
+    """Local stand-in for the Bot API server.
+
+    Every method answers with a minimal valid result after `latency`
+    seconds. A fraction `error_rate` of requests gets a 429 response asking
+    the client to retry after `retry_after` seconds. User 1 is the only
+    administrator of every chat.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8181, latency: float = 0.0,
+                 error_rate: float = 0.0, retry_after: int = 1, seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        self.in_flight = 0
+        self.last_request = time.monotonic()
+        self._message_id = 1_000_000
+        self._random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/bot"
+
+    @property
+    def total_calls(self) -> int:
+        return sum(count for method, count in self.calls.items() if method != "getMe")
+
+    def reset(self):
+        self.calls.clear()
+        self.rate_limited.clear()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _read_params(self, request: web.Request) -> dict:
+        if request.content_type == "application/json":
+            return await request.json()
+        params = {}
+        for key, value in (await request.post()).items():
+            try:
+                params[key] = json.loads(value)
+            except (TypeError, ValueError):
+                params[key] = value
+        return params
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await self._read_params(request)
+        self.calls[method] += 1
+        self.in_flight += 1
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return self.respond(method, params)
+        finally:
+            self.in_flight -= 1
+            self.last_request = time.monotonic()
+
+    async def wait_idle(self, quiet: float, timeout: float) -> float:
+        """Wait until no request has been seen for `quiet` seconds.
+
+        Returns the monotonic time of the last answered request.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.in_flight and time.monotonic() - self.last_request >= quiet:
+                break
+            await asyncio.sleep(0.05)
+        return self.last_request
+
+    def respond(self, method: str, params: dict) -> web.Response:
+        if method != "getMe" and self.error_rate and self._random.random() < self.error_rate:
+            self.rate_limited[method] += 1
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+
+        return web.json_response({"ok": True, "result": self.result(method, params)})
+
+    def result(self, method: str, params: dict):
+        if method == "getMe":
+            return BOT_USER
+        if method in MESSAGE_METHODS:
+            self._message_id += 1
+            return {
+                "message_id": params.get("message_id", self._message_id),
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "supergroup", "title": "Bench"},
+                "from": BOT_USER,
+                "text": params.get("text", ""),
+            }
+        if method == "getChatAdministrators":
+            return [{"status": "creator", "user": ADMIN_USER, "is_anonymous": False}]
+        if method == "getChatMember":
+            user_id = int(params.get("user_id", 0))
+            status = "creator" if user_id == ADMIN_USER["id"] else "member"
+            return {"status": status, "user": {"id": user_id, "is_bot": False, "first_name": "User"}}
+        if method == "getChat":
+            return {
+                "id": int(params.get("chat_id", 0)),
+                "type": "supergroup",
+                "title": "Bench",
+                "permissions": {"can_send_messages": True},
+            }
+        return True
@@ -0,0 +1,276 @@
+"""Offline throughput benchmark for GroupHelpBot.
+
+Runs the real Application built by GroupHelpBot against a local fake Bot
+API server and replays synthetic update streams:
+
+    python -m bench.run_bench --scenario all --updates 1000 --latency 20
+
+Reports updates/s, p50/p99 handler latency, API calls per update and peak
+RSS for each scenario.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+from typing import Callable, Dict, List
+
+BENCH_TOKEN = "123456:BENCH"
+ADMIN_ID = 1
+BASE_CHAT_ID = -1001000000000
+
+# Benchmarks measure the bot, not Telegram's limits, unless asked to
+BENCH_ENV = {
+    "STORAGE_BACKEND": "memory",
+    "RATE_LIMIT_GLOBAL": "1000000",
+    "RATE_LIMIT_GROUP_PER_MINUTE": "1000000000",
+    "WELCOME_WINDOW_SECONDS": "0.2",
+    "METRICS_PORT": "0",
+}
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+
+def _chat(index: int) -> dict:
+    return {"id": BASE_CHAT_ID - index, "type": "supergroup", "title": f"Bench {index}"}
+
+
+def _command(text: str) -> List[dict]:
+    return [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+
+
+def join_raid(count: int, chats: int) -> List[dict]:
+    """One new member per update, spread across chats."""
+    return [
+        {
+            "update_id": i + 1,
+            "message": {
+                "message_id": i + 1,
+                "date": int(time.time()),
+                "chat": _chat(i % chats),
+                "from": _user(10_000 + i),
+                "new_chat_members": [_user(10_000 + i)],
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def warn_storm(count: int, chats: int) -> List[dict]:
+    """Admins replying /warn to messages of many different users."""
+    updates = []
+    for i in range(count):
+        chat = _chat(i % chats)
+        target = _user(20_000 + i % 500)
+        updates.append({
+            "update_id": i + 1,
+            "message": {
+                "message_id": 2 * i + 2,
+                "date": int(time.time()),
+                "chat": chat,
+                "from": _user(ADMIN_ID),
+                "text": "/warn spam",
+                "entities": _command("/warn spam"),
+                "reply_to_message": {
+                    "message_id": 2 * i + 1,
+                    "date": int(time.time()),
+                    "chat": chat,
+                    "from": target,
+                    "text": "buy now",
+                },
+            },
+        })
+    return updates
+
+
+def purge(count: int, chats: int) -> List[dict]:
+    """One /purge per chat, each deleting `count` messages."""
+    updates = []
+    for i in range(chats):
+        chat = _chat(i)
+        updates.append({
+            "update_id": i + 1,
+            "message": {
+                "message_id": count + 1,
+                "date": int(time.time()),
+                "chat": chat,
+                "from": _user(ADMIN_ID),
+                "text": "/purge",
+                "entities": _command("/purge"),
+                "reply_to_message": {
+                    "message_id": 1,
+                    "date": int(time.time()),
+                    "chat": chat,
+                    "from": _user(30_000),
+                    "text": "first",
+                },
+            },
+        })
+    return updates
+
+
+def callback_flood(count: int, chats: int) -> List[dict]:
+    """Users pressing the "Rules" button of a welcome message."""
+    return [
+        {
+            "update_id": i + 1,
+            "callback_query": {
+                "id": str(i + 1),
+                "from": _user(40_000 + i),
+                "chat_instance": "bench",
+                "data": "show_rules",
+                "message": {
+                    "message_id": 1,
+                    "date": int(time.time()),
+                    "chat": _chat(i % chats),
+                    "from": {"id": 1000, "is_bot": True, "first_name": "GroupHelpBot"},
+                    "text": "Welcome!",
+                },
+            },
+        }
+        for i in range(count)
+    ]
+
+
+SCENARIOS: Dict[str, Callable[[int, int], List[dict]]] = {
+    "join_raid": join_raid,
+    "warn_storm": warn_storm,
+    "purge": purge,
+    "callback_flood": callback_flood,
+}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def run_scenario(name: str, raw_updates: List[dict], api, drain_timeout: float) -> dict:
+    from telegram import Update
+
+    from main import GroupHelpBot
+
+    bot = GroupHelpBot(BENCH_TOKEN, base_url=api.base_url)
+    application = bot.application
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    api.reset()
+
+    latencies: List[float] = []
+    done = asyncio.Event()
+    process_update = application.process_update
+
+    async def timed_process_update(update):
+        started = time.perf_counter()
+        try:
+            await process_update(update)
+        finally:
+            latencies.append(time.perf_counter() - started)
+            if len(latencies) == len(raw_updates):
+                done.set()
+
+    application.process_update = timed_process_update
+
+    started = time.monotonic()
+    for data in raw_updates:
+        await application.update_queue.put(Update.de_json(data, application.bot))
+    await done.wait()
+    processed = time.monotonic() - started
+
+    # Let background work (purges, coalesced welcomes, retries) reach the API.
+    # Quiet must outlast a RetryAfter pause or a paused request looks finished.
+    await bot.welcome_coalescer.flush_all()
+    last_request = await api.wait_idle(quiet=api.retry_after + 0.5, timeout=drain_timeout)
+    drained = max(last_request - started, processed)
+
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
+
+    return {
+        "scenario": name,
+        "updates": len(raw_updates),
+        "updates_per_second": round(len(raw_updates) / processed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "api_calls": api.total_calls,
+        "api_calls_per_update": round(api.total_calls / len(raw_updates), 2),
+        "rate_limited": sum(api.rate_limited.values()),
+        "drain_seconds": round(drained - processed, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+async def main(args: argparse.Namespace) -> List[dict]:
+    from bench.fake_bot_api import FakeBotApi
+
+    api = FakeBotApi(
+        port=args.port,
+        latency=args.latency / 1000,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    await api.start()
+    try:
+        names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+        results = []
+        for name in names:
+            updates = SCENARIOS[name](args.updates, args.chats)
+            results.append(await run_scenario(name, updates, api, args.drain_timeout))
+        return results
+    finally:
+        await api.stop()
+
+
+def print_table(results: List[dict]):
+    columns = list(results[0])
+    widths = [max(len(column), *(len(str(row[column])) for row in results)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in results:
+        print("  ".join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=["all", *SCENARIOS], default="all")
+    parser.add_argument("--updates", type=int, default=1000,
+                        help="updates per scenario (messages per chat for purge)")
+    parser.add_argument("--chats", type=int, default=10, help="number of chats to spread updates over")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake Bot API latency in milliseconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--port", type=int, default=8181, help="port of the fake Bot API server")
+    parser.add_argument("--seed", type=int, default=None, help="seed for 429 injection")
+    parser.add_argument("--drain-timeout", type=float, default=60.0,
+                        help="seconds to wait for background work after the last update")
+    parser.add_argument("--real-limits", action="store_true",
+                        help="keep the bot's configured outbound rate limits")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    for key, value in BENCH_ENV.items():
+        if args.real_limits and key.startswith("RATE_LIMIT"):
+            continue
+        os.environ.setdefault(key, value)
+
+    results = asyncio.run(main(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
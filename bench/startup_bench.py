@@ -0,0 +1,185 @@
+"""Cold-start benchmark for GroupHelpBot.
+
+Starts the bot in fresh interpreter processes against a local fake Bot
+API server that has one update waiting, the way a redeployed worker
+finds its backlog:
+
+    python -m bench.startup_bench --runs 5
+
+Reports the median time from spawning the process to the first update
+being handled, split into importing main, building the bot, initializing
+it and polling, together with the import time of the project modules and
+third-party packages, taken from `python -X importtime`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+from bench.run_bench import BENCH_ENV, BENCH_TOKEN, _chat, _command, _user, print_table
+
+ROOT = Path(__file__).resolve().parent.parent
+PROJECT_MODULES = {path.stem for path in ROOT.glob("*.py")}
+
+PHASES = ["import_ms", "build_ms", "initialize_ms", "post_init_ms", "first_update_ms", "total_ms"]
+
+
+def first_update() -> dict:
+    return {
+        "update_id": 1,
+        "message": {
+            "message_id": 1,
+            "date": int(time.time()),
+            "chat": _chat(0),
+            "from": _user(1),
+            "text": "/help",
+            "entities": _command("/help"),
+        },
+    }
+
+
+async def serve_first_update(base_url: str) -> Dict[str, float]:
+    """Child process: start the bot, handle the first update and shut down."""
+    started = time.perf_counter()
+    from main import GroupHelpBot
+    imported = time.perf_counter()
+
+    bot = GroupHelpBot(BENCH_TOKEN, base_url=base_url)
+    application = bot.application
+    built = time.perf_counter()
+
+    handled = asyncio.Event()
+    process_update = application.process_update
+
+    async def timed_process_update(update):
+        try:
+            await process_update(update)
+        finally:
+            handled.set()
+
+    application.process_update = timed_process_update
+
+    await application.initialize()
+    initialized = time.perf_counter()
+    await bot.start_polling()
+    polling = time.perf_counter()
+    await handled.wait()
+    first = time.perf_counter()
+    await bot.stop_polling()
+
+    return {
+        "import_ms": imported - started,
+        "build_ms": built - imported,
+        "initialize_ms": initialized - built,
+        "post_init_ms": polling - initialized,
+        "first_update_ms": first - polling,
+        "first_update_at": time.time(),
+    }
+
+
+def parse_importtime(stderr: str) -> Dict[str, float]:
+    """Return the cumulative import time in ms of project modules and third-party packages."""
+    stdlib = sys.stdlib_module_names
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if not cumulative.strip().isdigit() or "." in name or name in stdlib or name.startswith("_"):
+            continue
+        times[name] = int(cumulative) / 1000
+    return times
+
+
+def run_child(base_url: str) -> Dict[str, Dict[str, float]]:
+    env = dict(os.environ, SNAPSHOT_PATH="", PYTHONPATH=str(ROOT))
+    for key, value in BENCH_ENV.items():
+        env.setdefault(key, value)
+
+    spawned = time.time()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "bench.startup_bench", "--child", base_url],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    first_update_at = result.pop("first_update_at")
+    phases = {key: value * 1000 for key, value in result.items()}
+    phases["total_ms"] = (first_update_at - spawned) * 1000
+    return {"phases": phases, "imports": parse_importtime(process.stderr)}
+
+
+async def main(args: argparse.Namespace) -> dict:
+    from bench.fake_bot_api import FakeBotApi
+
+    class StartupApi(FakeBotApi):
+        """Fake Bot API with one pending update for every bot that starts."""
+
+        pending = True
+
+        def result(self, method: str, params: dict):
+            if method == "getUpdates":
+                updates = [first_update()] if self.pending and not int(params.get("offset") or 0) else []
+                if updates:
+                    self.pending = False
+                return updates
+            return super().result(method, params)
+
+    api = StartupApi(port=args.port)
+    await api.start()
+    runs = []
+    try:
+        for _ in range(args.runs):
+            api.pending = True
+            runs.append(await asyncio.get_running_loop().run_in_executor(None, run_child, api.base_url))
+    finally:
+        await api.stop()
+
+    modules = sorted(
+        {name for run in runs for name in run["imports"]},
+        key=lambda name: -statistics.median(run["imports"].get(name, 0) for run in runs)
+    )
+    return {
+        "phases": {
+            phase: round(statistics.median(run["phases"][phase] for run in runs), 1) for phase in PHASES
+        },
+        "imports": [
+            {
+                "module": name,
+                "project": name in PROJECT_MODULES,
+                "cumulative_ms": round(statistics.median(run["imports"].get(name, 0) for run in runs), 1),
+            }
+            for name in modules[:args.top]
+        ],
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="number of cold starts to take the median of")
+    parser.add_argument("--top", type=int, default=25, help="number of slowest imports to report")
+    parser.add_argument("--port", type=int, default=8181, help="port of the fake Bot API server")
+    parser.add_argument("--child", metavar="BASE_URL", help=argparse.SUPPRESS)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.child:
+        print(json.dumps(asyncio.run(serve_first_update(args.child))))
+        sys.exit()
+
+    results = asyncio.run(main(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table([results["phases"]])
+        print()
+        print_table(results["imports"])
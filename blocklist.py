@@ -0,0 +1,197 @@
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+ACTION_DELETE = "delete"
+ACTION_WARN = "warn"
+ACTION_MUTE = "mute"
+ACTIONS = (ACTION_DELETE, ACTION_WARN, ACTION_MUTE)
+
+LINK_PATTERN = r"(?:https?://|www\.|t\.me/|telegram\.me/)\S+"
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton matching many keywords in one pass over the text.
+
+    Keywords that start or end with a word character only match on word
+    boundaries, so "ass" does not match inside "class".
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[str]] = [[]]
+
+        for keyword in keywords:
+            self._add(keyword.lower())
+        self._build_failure_links()
+
+    def _add(self, keyword: str):
+        if not keyword:
+            return
+        state = 0
+        for char in keyword:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append(keyword)
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find(self, text: str) -> Optional[str]:
+        """Return the first keyword found in `text`, or None."""
+        text = text.lower()
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword in output[state]:
+                if _on_word_boundary(text, index - len(keyword) + 1, index + 1, keyword):
+                    return keyword
+        return None
+
+
+def _on_word_boundary(text: str, start: int, end: int, keyword: str) -> bool:
+    if keyword[0].isalnum() and start > 0 and text[start - 1].isalnum():
+        return False
+    if keyword[-1].isalnum() and end < len(text) and text[end].isalnum():
+        return False
+    return True
+
+
+def _combinable(pattern: str) -> bool:
+    """Return whether a valid pattern can join the combined alternation.
+
+    Patterns with groups can't: named groups clash and numbered
+    backreferences point at another pattern's group once combined. Neither
+    can patterns with inline global flags like (?i), which must start the
+    whole expression. Raises re.error if the pattern is invalid.
+    """
+    if re.compile(pattern).groups:
+        return False
+    try:
+        re.compile(f"(?:)|(?:{pattern})")
+    except re.error:
+        return False
+    return True
+
+
+class ChatFilter:
+    """Banned words and patterns of one chat, compiled on first use.
+
+    Words go into an Aho-Corasick automaton and regular expressions into one
+    combined alternation, so a message is scanned once by each. Patterns
+    that can't be combined safely are compiled and searched one by one. The
+    compiled matchers are rebuilt only after the lists change.
+    """
+
+    def __init__(self, words: Iterable[str] = (), patterns: Iterable[str] = (),
+                 block_links: bool = False, action: str = ACTION_DELETE):
+        self.words = set(words)
+        self.patterns = list(patterns)
+        self.block_links = block_links
+        self.action = action
+        self._automaton: Optional[AhoCorasick] = None
+        self._regex: Optional[re.Pattern] = None
+        self._separate: List[re.Pattern] = []
+        self._dirty = True
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ChatFilter":
+        return cls(
+            words=data.get("words", ()),
+            patterns=data.get("patterns", ()),
+            block_links=data.get("block_links", False),
+            action=data.get("action", ACTION_DELETE),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "words": sorted(self.words),
+            "patterns": self.patterns,
+            "block_links": self.block_links,
+            "action": self.action,
+        }
+
+    @property
+    def empty(self) -> bool:
+        return not (self.words or self.patterns or self.block_links)
+
+    def add_words(self, words: Iterable[str]):
+        self.words.update(word.lower() for word in words if word)
+        self._dirty = True
+
+    def add_pattern(self, pattern: str):
+        """Add a regular expression, raising re.error if it is invalid."""
+        _combinable(pattern)
+        if pattern not in self.patterns:
+            self.patterns.append(pattern)
+        self._dirty = True
+
+    def remove(self, entry: str) -> bool:
+        """Remove a word or pattern and return whether it existed."""
+        if entry.lower() in self.words:
+            self.words.discard(entry.lower())
+        elif entry in self.patterns:
+            self.patterns.remove(entry)
+        else:
+            return False
+        self._dirty = True
+        return True
+
+    def set_block_links(self, enabled: bool):
+        self.block_links = enabled
+        self._dirty = True
+
+    def _compile(self):
+        self._automaton = AhoCorasick(self.words) if self.words else None
+        alternatives = []
+        self._separate = []
+        for pattern in self.patterns:
+            try:
+                if _combinable(pattern):
+                    alternatives.append(f"(?:{pattern})")
+                else:
+                    self._separate.append(re.compile(pattern, re.IGNORECASE))
+            except re.error:
+                # Stored before patterns were validated; it can never match
+                continue
+        if self.block_links:
+            alternatives.append(f"(?:{LINK_PATTERN})")
+        self._regex = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+        self._dirty = False
+
+    def match(self, text: str) -> Optional[str]:
+        """Return the banned word or matched text found in `text`, or None."""
+        if self._dirty:
+            self._compile()
+        if self._automaton is not None:
+            word = self._automaton.find(text)
+            if word is not None:
+                return word
+        if self._regex is not None:
+            found = self._regex.search(text)
+            if found is not None:
+                return found.group(0)
+        for regex in self._separate:
+            found = regex.search(text)
+            if found is not None:
+                return found.group(0)
+        return None
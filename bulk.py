@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from telegram.error import TelegramError
+
+from apiutil import call_with_retry
+
+logger = logging.getLogger(__name__)
+
+
+class BulkResult(NamedTuple):
+    succeeded: int
+    # Error description -> number of users it happened for
+    errors: Dict[str, int]
+
+    @property
+    def failed(self) -> int:
+        return sum(self.errors.values())
+
+
+class RecentJoins:
+    """Per-chat log of recent joins, used to select the users of a raid.
+
+    Each chat keeps at most `max_per_chat` joins no older than `max_age`
+    seconds. Chats are kept in LRU order, at most `max_chats` of them.
+    """
+
+    def __init__(self, max_age: float = 24 * 60 * 60, max_per_chat: int = 5000, max_chats: int = 10000):
+        self.max_age = max_age
+        self.max_per_chat = max_per_chat
+        self.max_chats = max_chats
+        self._joins: "OrderedDict[int, Deque[Tuple[float, int]]]" = OrderedDict()
+
+    def record(self, chat_id: int, user_id: int, now: Optional[float] = None):
+        """Remember that a user joined a chat."""
+        now = time.monotonic() if now is None else now
+        joins = self._joins.get(chat_id)
+        if joins is None:
+            joins = self._joins[chat_id] = deque(maxlen=self.max_per_chat)
+            while len(self._joins) > self.max_chats:
+                self._joins.popitem(last=False)
+        else:
+            self._joins.move_to_end(chat_id)
+        joins.append((now, user_id))
+        while joins[0][0] <= now - self.max_age:
+            joins.popleft()
+
+    def since(self, chat_id: int, seconds: float, now: Optional[float] = None) -> List[int]:
+        """Return the users who joined a chat in the last `seconds`, oldest first."""
+        now = time.monotonic() if now is None else now
+        cutoff = now - seconds
+        users = []
+        for joined_at, user_id in reversed(self._joins.get(chat_id, ())):
+            if joined_at < cutoff:
+                break
+            users.append(user_id)
+        return list(dict.fromkeys(reversed(users)))
+
+    def forget(self, chat_id: int):
+        self._joins.pop(chat_id, None)
+
+    def chats(self) -> List[int]:
+        return list(self._joins)
+
+    def joins(self, chat_id: int, now: Optional[float] = None) -> List[Tuple[float, int]]:
+        """Return the (join time, user ID) pairs of a chat that are still kept, oldest first."""
+        now = time.monotonic() if now is None else now
+        cutoff = now - self.max_age
+        return [join for join in self._joins.get(chat_id, ()) if join[0] > cutoff]
+
+    def restore(self, chat_id: int, joins: List[Tuple[float, int]]):
+        """Put back joins saved by joins(), e.g. across a restart."""
+        for joined_at, user_id in joins:
+            self.record(chat_id, user_id, now=joined_at)
+
+
+class BulkModerator:
+    """Apply one moderation action to many users.
+
+    Calls are made with at most `concurrency` in flight and retried on
+    RetryAfter and network errors. Users whose call still fails are
+    counted per error instead of aborting the run.
+    """
+
+    def __init__(self, concurrency: int = 8, retries: int = 3):
+        self.concurrency = concurrency
+        self.retries = retries
+
+    async def run(self, user_ids: Iterable[int], action: Callable[[int], Awaitable],
+                  on_success: Optional[Callable[[int], Awaitable]] = None) -> BulkResult:
+        """Call `action(user_id)` for every user and aggregate the outcome.
+
+        `on_success(user_id)` is awaited after each action that succeeded.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        errors: Dict[str, int] = Counter()
+
+        async def apply(user_id: int) -> bool:
+            async with semaphore:
+                try:
+                    await call_with_retry(lambda: action(user_id), retries=self.retries)
+                except TelegramError as e:
+                    logger.debug(f"Bulk action failed for user {user_id}: {e}")
+                    errors[e.message] += 1
+                    return False
+            if on_success is not None:
+                await on_success(user_id)
+            return True
+
+        succeeded = sum(await asyncio.gather(*(apply(user_id) for user_id in user_ids)))
+        return BulkResult(succeeded=succeeded, errors=dict(errors))
@@ -0,0 +1,208 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHALLENGE_EMOJIS = ("🍎", "🚗", "🐶", "⭐", "🎈", "🌵", "🚀", "🍕")
+CHALLENGE_OPTIONS = 4
+
+ChallengeKey = Tuple[int, int]
+
+
+def new_challenge(rng: random.Random = random) -> Tuple[int, List[int]]:
+    """Pick the emoji to tap and the shuffled emoji buttons, as indexes into CHALLENGE_EMOJIS."""
+    options = rng.sample(range(len(CHALLENGE_EMOJIS)), CHALLENGE_OPTIONS)
+    return rng.choice(options), options
+
+
+class Challenge:
+    """A new member who has to tap `answer` before `expires_at` (monotonic).
+
+    `answer` and `message_id` are set once the challenge message is sent.
+    """
+
+    __slots__ = ("chat_id", "user_id", "expires_at", "answer", "message_id")
+
+    def __init__(self, chat_id: int, user_id: int, expires_at: float):
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.expires_at = expires_at
+        self.answer: Optional[int] = None
+        self.message_id: Optional[int] = None
+
+
+class CaptchaTracker:
+    """Pending join challenges with heap-driven expiry.
+
+    Challenges are kept in a dict and a min-heap of expiry times, so a
+    single task sleeps until the earliest one is due and hands every due
+    challenge to `on_expire` in one batch, however many members joined.
+    At most `max_pending` challenges are kept; past that, the one closest
+    to expiring is expired early.
+
+    A challenge message is shared by the members who joined together. Once
+    none of them is pending any more, its ID is queued and the queued IDs
+    of a chat are passed to `on_cleanup` together, at most `cleanup_batch`
+    at a time, `cleanup_delay` seconds after the first was queued.
+    """
+
+    def __init__(
+        self,
+        on_expire: Callable[[List[Challenge]], Awaitable[None]],
+        on_cleanup: Callable[[int, List[int]], Awaitable[None]],
+        max_pending: int = 10000,
+        cleanup_delay: float = 5.0,
+        cleanup_batch: int = 100,
+    ):
+        self.on_expire = on_expire
+        self.on_cleanup = on_cleanup
+        self.max_pending = max_pending
+        self.cleanup_delay = cleanup_delay
+        self.cleanup_batch = cleanup_batch
+        self.pending: Dict[ChallengeKey, Challenge] = {}
+        self._heap: List[Tuple[float, int, ChallengeKey]] = []
+        self._counter = itertools.count()
+        self._overflow: List[Challenge] = []
+        # (chat_id, message_id) -> members still pending on that message
+        self._message_users: Dict[Tuple[int, int], int] = {}
+        self._cleanup: Dict[int, List[int]] = {}
+        self._cleanup_due: Optional[float] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def get(self, chat_id: int, user_id: int) -> Optional[Challenge]:
+        return self.pending.get((chat_id, user_id))
+
+    def add(self, chat_id: int, user_id: int, timeout: float) -> Challenge:
+        """Start a challenge, replacing any pending one of the same member."""
+        key = (chat_id, user_id)
+        self._discard(self.pending.pop(key, None))
+        if len(self.pending) >= self.max_pending:
+            oldest = self._pop_due(float("inf"))
+            if oldest is not None:
+                self._overflow.append(oldest)
+
+        challenge = self.pending[key] = Challenge(chat_id, user_id, time.monotonic() + timeout)
+        if not self._heap or challenge.expires_at < self._heap[0][0] or self._overflow:
+            self._wakeup.set()
+        heapq.heappush(self._heap, (challenge.expires_at, next(self._counter), key))
+        return challenge
+
+    def attach_message(self, challenges: List[Challenge], message_id: int):
+        """Record the message that challenges a group of members."""
+        chat_id = None
+        count = 0
+        for challenge in challenges:
+            if self.pending.get((challenge.chat_id, challenge.user_id)) is challenge:
+                challenge.message_id = message_id
+                chat_id = challenge.chat_id
+                count += 1
+        if count:
+            self._message_users[(chat_id, message_id)] = count
+        elif challenges:
+            # Everyone was done before the message was sent
+            self._queue_cleanup(challenges[0].chat_id, message_id)
+
+    def resolve(self, chat_id: int, user_id: int) -> Optional[Challenge]:
+        """End a member's challenge and return it, or None if there was none."""
+        challenge = self.pending.pop((chat_id, user_id), None)
+        self._discard(challenge)
+        return challenge
+
+    def _discard(self, challenge: Optional[Challenge]):
+        if challenge is None or challenge.message_id is None:
+            return
+        key = (challenge.chat_id, challenge.message_id)
+        remaining = self._message_users.get(key, 1) - 1
+        if remaining > 0:
+            self._message_users[key] = remaining
+        else:
+            self._message_users.pop(key, None)
+            self._queue_cleanup(challenge.chat_id, challenge.message_id)
+
+    def _queue_cleanup(self, chat_id: int, message_id: int):
+        self._cleanup.setdefault(chat_id, []).append(message_id)
+        if self._cleanup_due is None:
+            self._cleanup_due = time.monotonic() + self.cleanup_delay
+            self._wakeup.set()
+
+    def _pop_due(self, now: float) -> Optional[Challenge]:
+        """Remove and return the earliest challenge if it's due at `now`."""
+        while self._heap:
+            expires_at, _, key = self._heap[0]
+            challenge = self.pending.get(key)
+            if challenge is None or challenge.expires_at != expires_at:
+                # Resolved or replaced since it was pushed
+                heapq.heappop(self._heap)
+                continue
+            if expires_at > now:
+                return None
+            heapq.heappop(self._heap)
+            del self.pending[key]
+            return challenge
+        return None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop expiring challenges and delete the challenge messages queued so far."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._flush_cleanup()
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            expired, self._overflow = self._overflow, []
+            while True:
+                challenge = self._pop_due(now)
+                if challenge is None:
+                    break
+                expired.append(challenge)
+            if expired:
+                for challenge in expired:
+                    self._discard(challenge)
+                try:
+                    await self.on_expire(expired)
+                except Exception as e:
+                    logger.error(f"Failed to handle {len(expired)} expired challenges: {e}")
+
+            if self._cleanup_due is not None and self._cleanup_due <= time.monotonic():
+                await self._flush_cleanup()
+
+            deadlines = [self._cleanup_due] if self._cleanup_due is not None else []
+            if self._heap:
+                deadlines.append(self._heap[0][0])
+            self._wakeup.clear()
+            if self._overflow:
+                continue
+            timeout = max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _flush_cleanup(self):
+        cleanup, self._cleanup = self._cleanup, {}
+        self._cleanup_due = None
+        for chat_id, message_ids in cleanup.items():
+            for start in range(0, len(message_ids), self.cleanup_batch):
+                try:
+                    await self.on_cleanup(chat_id, message_ids[start:start + self.cleanup_batch])
+                except Exception as e:
+                    logger.warning(f"Failed to delete challenge messages in chat {chat_id}: {e}")
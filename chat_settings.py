@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DURATION_UNITS = {"m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
+
+# Warnings are kept in storage this long, so no chat can expire them later
+MAX_WARNING_EXPIRY = 90 * 24 * 60 * 60
+
+
+def parse_duration(text: str) -> Optional[int]:
+    """Parse durations like 30m, 1h, 2d or 1w into seconds."""
+    match = re.fullmatch(r"(\d+)([mhdw])", text.lower())
+    if not match:
+        return None
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def _parse_seconds(text: str) -> Optional[int]:
+    return int(text) if text.isdigit() else parse_duration(text)
+
+
+def _parse_int(text: str) -> Optional[int]:
+    return int(text) if text.isdigit() else None
+
+
+def _parse_bool(text: str) -> Optional[bool]:
+    return {"on": True, "true": True, "yes": True, "off": False, "false": False, "no": False}.get(text.lower())
+
+
+class Field(NamedTuple):
+    parse: Callable[[str], Any]
+    # Inclusive bounds of numeric settings
+    low: Optional[int] = None
+    high: Optional[int] = None
+
+
+FIELDS: Dict[str, Field] = {
+    "max_warnings": Field(_parse_int, 1, 100),
+    "warning_expiry": Field(_parse_seconds, 60, MAX_WARNING_EXPIRY),
+    "mute_duration": Field(_parse_seconds, 60, 366 * 24 * 60 * 60),
+    "welcome": Field(_parse_bool),
+    "goodbye": Field(_parse_bool),
+    "captcha": Field(_parse_bool),
+    "captcha_timeout": Field(_parse_seconds, 30, 24 * 60 * 60),
+}
+
+
+def parse_setting(name: str, value: Any) -> Any:
+    """Validate one setting given as text or JSON value; raise ValueError if it's invalid."""
+    field = FIELDS.get(name)
+    if field is None:
+        raise ValueError(f"Unknown setting {name}")
+    parsed = field.parse(str(value).lower())
+    if parsed is None or (field.low is not None and not field.low <= parsed <= field.high):
+        raise ValueError(f"Invalid value for {name}: {value}")
+    return parsed
+
+
+def parse_settings(values: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: parse_setting(name, value) for name, value in values.items()}
+
+
+class ChatSettings:
+    """Effective settings of one chat."""
+
+    __slots__ = tuple(FIELDS)
+
+    def __init__(self, max_warnings: int, warning_expiry: int, mute_duration: int, welcome: bool, goodbye: bool,
+                 captcha: bool, captcha_timeout: int):
+        self.max_warnings = max_warnings
+        self.warning_expiry = warning_expiry
+        self.mute_duration = mute_duration
+        self.welcome = welcome
+        self.goodbye = goodbye
+        self.captcha = captcha
+        self.captcha_timeout = captcha_timeout
+
+    def replace(self, values: Dict[str, Any]) -> "ChatSettings":
+        """Return a copy with some settings changed."""
+        settings = ChatSettings(*(getattr(self, name) for name in self.__slots__))
+        for name, value in values.items():
+            setattr(settings, name, value)
+        return settings
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class SettingsTable:
+    """Per-chat settings kept in memory and loaded lazily.
+
+    A chat's settings are built from, in increasing precedence: the
+    defaults, the "defaults" of the settings file, the file's entry for
+    the chat, and the values admins set with /set, which are persisted
+    through `save`. Stored values are read once, on the first get() for a
+    chat; every later get() is a dictionary lookup. Reloading the settings
+    file rebuilds the loaded chats in memory without touching storage.
+    At most `max_chats` chats are kept, in LRU order.
+    """
+
+    def __init__(self, load: Callable[[int], Awaitable[Optional[dict]]],
+                 save: Callable[[int, dict], Awaitable[None]],
+                 defaults: ChatSettings, max_chats: int = 100000):
+        self.load = load
+        self.save = save
+        self.base_defaults = defaults
+        self.defaults = defaults
+        self.max_chats = max_chats
+        self.file_chats: Dict[int, Dict[str, Any]] = {}
+        # Chat ID -> effective settings and the values set by admins
+        self._entries: "OrderedDict[int, Tuple[ChatSettings, Dict[str, Any]]]" = OrderedDict()
+        self._mtime: Optional[float] = None
+        self._watcher: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _resolve(self, chat_id: int, overrides: Dict[str, Any]) -> ChatSettings:
+        return self.defaults.replace({**self.file_chats.get(chat_id, {}), **overrides})
+
+    async def _entry(self, chat_id: int) -> Tuple[ChatSettings, Dict[str, Any]]:
+        entry = self._entries.get(chat_id)
+        if entry is not None:
+            self._entries.move_to_end(chat_id)
+            return entry
+
+        stored = await self.load(chat_id) or {}
+        try:
+            overrides = parse_settings(stored)
+        except ValueError as e:
+            logger.warning(f"Ignoring stored settings of chat {chat_id}: {e}")
+            overrides = {}
+        entry = self._entries[chat_id] = (self._resolve(chat_id, overrides), overrides)
+        while len(self._entries) > self.max_chats:
+            self._entries.popitem(last=False)
+        return entry
+
+    async def get(self, chat_id: int) -> ChatSettings:
+        """Return the settings of a chat."""
+        return (await self._entry(chat_id))[0]
+
+    async def set(self, chat_id: int, name: str, value: Any) -> ChatSettings:
+        """Set one setting of a chat, or reset it to the default if `value` is None.
+
+        Raises ValueError if the setting or value is invalid.
+        """
+        _, overrides = await self._entry(chat_id)
+        overrides = dict(overrides)
+        if value is None:
+            if name not in FIELDS:
+                raise ValueError(f"Unknown setting {name}")
+            overrides.pop(name, None)
+        else:
+            overrides[name] = parse_setting(name, value)
+        await self.save(chat_id, overrides)
+        settings = self._resolve(chat_id, overrides)
+        self._entries[chat_id] = (settings, overrides)
+        return settings
+
+    def load_file(self, path: str):
+        """Apply a settings file.
+
+        The file holds {"defaults": {...}, "chats": {"<chat_id>": {...}}}.
+        Raises OSError or ValueError if it can't be read, leaving the
+        current settings in place.
+        """
+        with open(path) as f:
+            data = json.load(f)
+        defaults = self.base_defaults.replace(parse_settings(data.get("defaults", {})))
+        file_chats = {int(chat_id): parse_settings(values) for chat_id, values in data.get("chats", {}).items()}
+
+        self.defaults = defaults
+        self.file_chats = file_chats
+        for chat_id, (_, overrides) in self._entries.items():
+            self._entries[chat_id] = (self._resolve(chat_id, overrides), overrides)
+
+    def reload_file(self, path: str):
+        """Apply a settings file if it changed since it was last applied."""
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError as e:
+            logger.error(f"Cannot read chat settings {path}: {e}")
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            self.load_file(path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Ignoring chat settings {path}: {e}")
+            return
+        logger.info(f"Applied chat settings from {path}")
+
+    def start_watcher(self, path: str, interval: float = 5.0):
+        """Apply a settings file now and again whenever it changes."""
+        self.reload_file(path)
+        if self._watcher is None:
+            self._watcher = asyncio.get_running_loop().create_task(self._watch(path, interval))
+
+    async def stop_watcher(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    async def _watch(self, path: str, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self.reload_file(path)
@@ -0,0 +1,48 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram import MessageEntity, Update
+from telegram.ext import BaseHandler
+
+CommandCallback = Callable[[Update, Any], Awaitable[Any]]
+
+
+class CommandTable(BaseHandler):
+    """Route bot commands to their callbacks through one dict lookup.
+
+    The application tries the handlers of a group one after another, so a
+    CommandHandler per command parses every message once per command. This
+    handler parses the command once and looks its callback up in `commands`,
+    which is keyed by lower-case command name and fills in context.args.
+    Unlike CommandHandler, it ignores edited messages, which the command
+    callbacks don't handle.
+    """
+
+    def __init__(self, commands: Dict[str, CommandCallback]):
+        # Callbacks are picked per command in handle_update()
+        super().__init__(None)
+        self.commands = {name.lower(): callback for name, callback in commands.items()}
+
+    def check_update(self, update: object) -> Optional[Tuple[CommandCallback, List[str]]]:
+        if not isinstance(update, Update):
+            return None
+        message = update.message
+        if message is None or not message.text or not message.entities:
+            return None
+        entity = message.entities[0]
+        if entity.type != MessageEntity.BOT_COMMAND or entity.offset != 0:
+            return None
+
+        name, _, username = message.text[1:entity.length].partition("@")
+        callback = self.commands.get(name.lower())
+        if callback is None:
+            return None
+        if username and username.lower() != message.get_bot().username.lower():
+            return None
+        return callback, message.text.split()[1:]
+
+    def collect_additional_context(self, context, update, application, check_result):
+        context.args = check_result[1]
+
+    async def handle_update(self, update, application, check_result, context):
+        self.collect_additional_context(context, update, application, check_result)
+        return await check_result[0](update, context)
@@ -1,18 +1,67 @@
+import asyncio
+import html
 import os
+import json
 import logging
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+import re
+import signal
+import sys
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+from datetime import datetime, timedelta, timezone
 
-from telegram import Update, ChatMember, ChatPermissions, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import (
+    Update,
+    User,
+    ChatPermissions,
+    MessageEntity
+)
 from telegram.ext import (
     Application,
-    CommandHandler,
+    ApplicationHandlerStop,
     MessageHandler,
+    TypeHandler,
     CallbackQueryHandler,
+    ChatMemberHandler,
     ContextTypes,
     filters
 )
 from telegram.constants import ParseMode
+from telegram.error import TelegramError
+
+from admin_cache import ADMIN_STATUSES, AdminCache
+from antiflood import FLOOD, FloodDetector
+import audit
+from audit import AuditEvent, format_event
+from bulk import BulkModerator, RecentJoins
+from blocklist import ACTION_MUTE, ACTION_WARN, ACTIONS, ChatFilter
+from captcha import CHALLENGE_EMOJIS, CaptchaTracker, Challenge, new_challenge
+from chat_settings import FIELDS, MAX_WARNING_EXPIRY, ChatSettings, SettingsTable, parse_duration
+from commands import CommandTable
+from metrics import ErrorLogLimiter, Metrics, MetricsServer
+from raid import RaidDetector
+from scheduler import Job, Scheduler
+from ratelimit import PRIORITY_COSMETIC, PriorityRateLimiter, PriorityTokenBucket
+from request import Request, SharedRequest
+from resources import SharedResources
+from responses import (
+    ADMIN_PANEL_DENIED_TEXT,
+    ADMIN_PANEL_TEXT,
+    CAPTCHA_TEXT,
+    HELP_TEXT,
+    START_GROUP_TEXT,
+    START_PRIVATE_TEXT,
+    ResponseCache,
+    captcha_keyboard,
+    help_keyboard,
+    older_events_keyboard,
+    welcome_keyboard
+)
+from storage import NamespacedStorage, create_storage
+from update_processor import ChatOrderedUpdateProcessor
+from user_index import UsernameIndex
+from welcome import WelcomeCoalescer, join_names
 
 # Enable logging
 logging.basicConfig(
@@ -23,40 +72,239 @@ logger = logging.getLogger(__name__)
 
 # Configuration
 BOT_TOKEN = os.getenv("BOT_TOKEN", "8369433260:AAFRgg9zRzBzChyKGqmZ3H9Nw9xjYxNJ6mY")
+BOT_API_BASE_URL = os.getenv("BOT_API_BASE_URL")
 ADMIN_IDS = list(map(int, os.getenv("6871652449,7896059741", "").split(","))) if os.getenv("ADMIN_IDS") else []
 MAX_WARNINGS = 3
 WARNING_EXPIRE_DAYS = 7
+ADMIN_CACHE_TTL = float(os.getenv("ADMIN_CACHE_TTL", "300"))
+ADMIN_CACHE_MAX_CHATS = int(os.getenv("ADMIN_CACHE_MAX_CHATS", "10000"))
+PURGE_CONCURRENCY = int(os.getenv("PURGE_CONCURRENCY", "4"))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "8"))
+BULK_MAX_TARGETS = int(os.getenv("BULK_MAX_TARGETS", "1000"))
+MODLOG_PAGE_SIZE = 10
+CHAT_SETTINGS_PATH = os.getenv("CHAT_SETTINGS_PATH")
+CHAT_SETTINGS_CHECK_SECONDS = float(os.getenv("CHAT_SETTINGS_CHECK_SECONDS", "5"))
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+DATABASE_PATH = os.getenv("DATABASE_PATH", "grouphelpbot.db")
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "32"))
+UPDATE_QUEUE_PER_CHAT = int(os.getenv("UPDATE_QUEUE_PER_CHAT", "100"))
+RUN_MODE = os.getenv("RUN_MODE", "polling")
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "grouphelpbot.snapshot")
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "10"))
+BACKLOG_UPDATES_PER_SECOND = float(os.getenv("BACKLOG_UPDATES_PER_SECOND", "50"))
+BACKLOG_BATCH_SIZE = 100
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+BOTS_CONFIG = os.getenv("BOTS_CONFIG")
+BOTS_CONFIG_CHECK_SECONDS = float(os.getenv("BOTS_CONFIG_CHECK_SECONDS", "5"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "256"))
+RATE_LIMIT_GLOBAL = float(os.getenv("RATE_LIMIT_GLOBAL", "30"))
+RATE_LIMIT_GROUP_PER_MINUTE = float(os.getenv("RATE_LIMIT_GROUP_PER_MINUTE", "20"))
+WELCOME_WINDOW_SECONDS = float(os.getenv("WELCOME_WINDOW_SECONDS", "2"))
+WELCOME_MAX_MENTIONS = int(os.getenv("WELCOME_MAX_MENTIONS", "10"))
+WELCOME_DELETE_PREVIOUS = os.getenv("WELCOME_DELETE_PREVIOUS", "0") == "1"
+DEFAULT_WELCOME_MESSAGE = "Welcome {mention} to the group! 🎉"
+DEFAULT_MUTE_SECONDS = 60 * 60
+WARNING_SWEEP_SECONDS = 60 * 60
+USERNAME_INDEX_MAX_BYTES = int(os.getenv("USERNAME_INDEX_MAX_BYTES", str(32 * 1024 * 1024)))
+USERNAME_INDEX_PATH = os.getenv("USERNAME_INDEX_PATH")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+ERROR_LOG_BURST = int(os.getenv("ERROR_LOG_BURST", "10"))
+ERROR_LOG_INTERVAL = float(os.getenv("ERROR_LOG_INTERVAL", "60"))
+FLOOD_MESSAGE_LIMIT = int(os.getenv("FLOOD_MESSAGE_LIMIT", "6"))
+FLOOD_WINDOW_SECONDS = float(os.getenv("FLOOD_WINDOW_SECONDS", "5"))
+FLOOD_REPEAT_LIMIT = int(os.getenv("FLOOD_REPEAT_LIMIT", "3"))
+FLOOD_MUTE_SECONDS = int(os.getenv("FLOOD_MUTE_SECONDS", "3600"))
+FLOOD_MAX_TRACKED_USERS = int(os.getenv("FLOOD_MAX_TRACKED_USERS", "100000"))
+RAID_JOIN_THRESHOLD = int(os.getenv("RAID_JOIN_THRESHOLD", "10"))
+RAID_WINDOW_SECONDS = float(os.getenv("RAID_WINDOW_SECONDS", "60"))
+RAID_LOCK_SECONDS = int(os.getenv("RAID_LOCK_SECONDS", "600"))
+CAPTCHA_ENABLED = os.getenv("CAPTCHA_ENABLED", "0") == "1"
+CAPTCHA_TIMEOUT_SECONDS = int(os.getenv("CAPTCHA_TIMEOUT_SECONDS", "120"))
+CAPTCHA_MAX_PENDING = int(os.getenv("CAPTCHA_MAX_PENDING", "10000"))
+
+# Command name -> GroupHelpBot method handling it
+COMMANDS = {
+    "start": "start_command",
+    "help": "help_command",
+    "rules": "rules_command",
+    "warn": "warn_command",
+    "warnings": "warnings_command",
+    "kick": "kick_command",
+    "ban": "ban_command",
+    "mute": "mute_command",
+    "unmute": "unmute_command",
+    "tmute": "tmute_command",
+    "tban": "tban_command",
+    "massban": "mass_ban_command",
+    "masskick": "mass_kick_command",
+    "massmute": "mass_mute_command",
+    "raid": "raid_command",
+    "modlog": "modlog_command",
+    "history": "history_command",
+    "jobs": "jobs_command",
+    "canceljob": "cancel_job_command",
+    "setrules": "set_rules_command",
+    "setwelcome": "set_welcome_command",
+    "settings": "settings_command",
+    "set": "set_command",
+    "purge": "purge_command",
+    "promote": "promote_command",
+    "demote": "demote_command",
+    "pin": "pin_command",
+    "unpin": "unpin_command",
+    "addfilter": "add_filter_command",
+    "addregex": "add_regex_command",
+    "delfilter": "del_filter_command",
+    "filters": "filters_command",
+    "filterlinks": "filter_links_command",
+    "filteraction": "filter_action_command"
+}
+
+MUTE_PERMISSIONS = ChatPermissions.no_permissions()
+UNMUTE_PERMISSIONS = ChatPermissions(
+    can_send_messages=True,
+    can_send_audios=True,
+    can_send_documents=True,
+    can_send_photos=True,
+    can_send_videos=True,
+    can_send_video_notes=True,
+    can_send_voice_notes=True,
+    can_send_polls=True,
+    can_send_other_messages=True,
+    can_add_web_page_previews=True,
+    can_change_info=False,
+    can_invite_users=False,
+    can_pin_messages=False
+)
 
-# Data storage (in production, use a database)
-user_warnings: Dict[int, List[datetime]] = {}
-group_rules: Dict[int, str] = {}
-welcome_messages: Dict[int, str] = {}
+def create_shared_resources(request: Optional[SharedRequest] = None) -> SharedResources:
+    """Create the storage backend and caches that bots of this process share."""
+    return SharedResources(
+        create_storage(
+            STORAGE_BACKEND, DATABASE_PATH,
+            warning_ttl=MAX_WARNING_EXPIRY
+        ),
+        AdminCache(ttl=ADMIN_CACHE_TTL, max_chats=ADMIN_CACHE_MAX_CHATS),
+        UsernameIndex(max_bytes=USERNAME_INDEX_MAX_BYTES),
+        request=request,
+        username_index_path=USERNAME_INDEX_PATH
+    )
 
 class GroupHelpBot:
-    def __init__(self, token: str):
-        self.application = Application.builder().token(token).build()
+    def __init__(
+        self,
+        token: str,
+        base_url: Optional[str] = BOT_API_BASE_URL,
+        shared: Optional[SharedResources] = None,
+        namespace: int = 0,
+        rate_limit_global: float = RATE_LIMIT_GLOBAL,
+        rate_limit_group_per_minute: float = RATE_LIMIT_GROUP_PER_MINUTE,
+        metrics_port: int = METRICS_PORT,
+        worker: int = 0,
+        workers: int = 1
+    ):
+        self.shared = shared or create_shared_resources()
+        self.metrics = Metrics()
+        self.error_log_limiter = ErrorLogLimiter(burst=ERROR_LOG_BURST, interval=ERROR_LOG_INTERVAL)
+        self.metrics_server = MetricsServer(self.metrics, METRICS_HOST, metrics_port) if metrics_port else None
+        self.rate_limiter = PriorityRateLimiter(
+            global_rate=rate_limit_global,
+            group_rate=rate_limit_group_per_minute / 60,
+            metrics=self.metrics
+        )
+        self.update_processor = ChatOrderedUpdateProcessor(UPDATE_CONCURRENCY, UPDATE_QUEUE_PER_CHAT)
+        builder = (
+            Application.builder()
+            .token(token)
+            .concurrent_updates(self.update_processor)
+            .rate_limiter(self.rate_limiter)
+            .post_init(self.post_init)
+            .post_stop(self.post_stop)
+            .post_shutdown(self.post_shutdown)
+        )
+        if base_url:
+            builder.base_url(base_url)
+        builder.request(self.shared.request or Request(connection_pool_size=HTTP_POOL_SIZE))
+        builder.get_updates_request(Request())
+        self.application = builder.build()
+        self.storage = NamespacedStorage(self.shared.storage, namespace)
+        # Whether post_init got as far as acquiring the shared resources
+        self.acquired_shared = False
+        self.admin_cache = self.shared.admin_cache
+        self.settings = SettingsTable(
+            self.storage.get_chat_settings,
+            self.storage.set_chat_settings,
+            ChatSettings(
+                max_warnings=MAX_WARNINGS,
+                warning_expiry=WARNING_EXPIRE_DAYS * 24 * 60 * 60,
+                mute_duration=DEFAULT_MUTE_SECONDS,
+                welcome=True,
+                goodbye=True,
+                captcha=CAPTCHA_ENABLED,
+                captcha_timeout=CAPTCHA_TIMEOUT_SECONDS
+            )
+        )
+        # Built on the first /purge
+        self.purge_engine = None
+        self.bulk_moderator = BulkModerator(concurrency=BULK_CONCURRENCY)
+        self.recent_joins = RecentJoins()
+        self.responses = ResponseCache(self.storage.get_rules, self.storage.get_welcome, DEFAULT_WELCOME_MESSAGE)
+        self.help_keyboard = help_keyboard(None)
+        self.welcome_coalescer = WelcomeCoalescer(self.send_welcome, window=WELCOME_WINDOW_SECONDS)
+        self.captcha_coalescer = WelcomeCoalescer(self.send_captcha, window=WELCOME_WINDOW_SECONDS)
+        self.captcha = CaptchaTracker(
+            self.expire_captchas,
+            self.delete_captcha_messages,
+            max_pending=CAPTCHA_MAX_PENDING
+        )
+        self.last_welcome: Dict[int, int] = {}
+        self.chat_filters: Dict[int, ChatFilter] = {}
+        self.username_index = self.shared.username_index
+        # Workers share the database; each runs the jobs of the chats routed
+        # to it, the same mapping as sharding.shard_for
+        self.scheduler = Scheduler(self.storage, owns=lambda chat_id: chat_id % workers == worker)
+        self.scheduler.register("unmute", self.run_unmute_job)
+        self.scheduler.register("unban", self.run_unban_job)
+        self.scheduler.register("delete_message", self.run_delete_message_job)
+        self.scheduler.register("expire_warnings", self.run_expire_warnings_job)
+        self.scheduler.register("lift_raid", self.run_lift_raid_job)
+        self.flood_detector = FloodDetector(
+            limit=FLOOD_MESSAGE_LIMIT,
+            window=FLOOD_WINDOW_SECONDS,
+            repeat_limit=FLOOD_REPEAT_LIMIT,
+            max_users=FLOOD_MAX_TRACKED_USERS
+        )
+        self.raid_detector = RaidDetector(
+            threshold=RAID_JOIN_THRESHOLD,
+            window=RAID_WINDOW_SECONDS,
+            max_joiners=BULK_MAX_TARGETS
+        )
+        # Polling mode keeps chat state and unprocessed updates across restarts
+        self.snapshot_path = f"{SNAPSHOT_PATH}.{namespace}" if SNAPSHOT_PATH and namespace else SNAPSHOT_PATH
+        self.snapshot: Optional["Snapshot"] = None
+        self.restored_chats = set()
+        self.backlog: Deque[Update] = deque()
+        self.next_update_id = 0
+        self.catch_up_task: Optional[asyncio.Task] = None
         self.setup_handlers()
     
     def setup_handlers(self):
         """Setup all command and message handlers"""
         
-        # Command handlers
-        self.application.add_handler(CommandHandler("start", self.start_command))
-        self.application.add_handler(CommandHandler("help", self.help_command))
-        self.application.add_handler(CommandHandler("rules", self.rules_command))
-        self.application.add_handler(CommandHandler("warn", self.warn_command))
-        self.application.add_handler(CommandHandler("warnings", self.warnings_command))
-        self.application.add_handler(CommandHandler("kick", self.kick_command))
-        self.application.add_handler(CommandHandler("ban", self.ban_command))
-        self.application.add_handler(CommandHandler("mute", self.mute_command))
-        self.application.add_handler(CommandHandler("unmute", self.unmute_command))
-        self.application.add_handler(CommandHandler("setrules", self.set_rules_command))
-        self.application.add_handler(CommandHandler("setwelcome", self.set_welcome_command))
-        self.application.add_handler(CommandHandler("purge", self.purge_command))
-        self.application.add_handler(CommandHandler("promote", self.promote_command))
-        self.application.add_handler(CommandHandler("demote", self.demote_command))
-        self.application.add_handler(CommandHandler("pin", self.pin_command))
-        self.application.add_handler(CommandHandler("unpin", self.unpin_command))
+        # Index usernames from every update before any other handler runs
+        self.application.add_handler(TypeHandler(Update, self.track_users), group=-1)
+        
+        # Commands, routed through one handler by name
+        self.application.add_handler(CommandTable({
+            command: getattr(self, method) for command, method in COMMANDS.items()
+        }))
         
         # Callback query handlers
         self.application.add_handler(CallbackQueryHandler(self.button_callback))
@@ -65,93 +313,286 @@ class GroupHelpBot:
         self.application.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, self.welcome_new_members))
         self.application.add_handler(MessageHandler(filters.StatusUpdate.LEFT_CHAT_MEMBER, self.goodbye_member))
         
+        # Anti-flood sees every group message, in its own group so commands still run.
+        # Messages it acts on stop there and don't reach the blocklist.
+        self.application.add_handler(
+            MessageHandler(
+                filters.UpdateType.MESSAGE & filters.ChatType.GROUPS & ~filters.StatusUpdate.ALL,
+                self.antiflood_check
+            ),
+            group=1
+        )
+        self.application.add_handler(
+            MessageHandler(
+                filters.UpdateType.MESSAGE & filters.ChatType.GROUPS & (filters.TEXT | filters.CAPTION),
+                self.blocklist_check
+            ),
+            group=2
+        )
+        
+        # Chat member handlers
+        self.application.add_handler(ChatMemberHandler(self.track_admin_changes, ChatMemberHandler.ANY_CHAT_MEMBER))
+        
         # Error handler
         self.application.add_error_handler(self.error_handler)
+        
+        self.instrument_handlers()
+    
+    def instrument_handlers(self):
+        """Wrap every registered handler callback to record latency metrics."""
+        for handlers in self.application.handlers.values():
+            for handler in handlers:
+                if isinstance(handler, CommandTable):
+                    for command, callback in handler.commands.items():
+                        handler.commands[command] = self.metrics.instrument(callback.__name__, callback)
+                else:
+                    handler.callback = self.metrics.instrument(handler.callback.__name__, handler.callback)
+        
+        self.metrics.gauge(
+            "grouphelpbot_update_queue_depth", "Updates waiting to be processed",
+            lambda: self.application.update_queue.qsize()
+        )
+        self.metrics.gauge(
+            "grouphelpbot_active_chats", "Chats with an update being processed",
+            lambda: self.update_processor.active_chats
+        )
+        self.metrics.gauge(
+            "grouphelpbot_chat_queue_depth", "Updates queued behind another update of their chat",
+            lambda: self.update_processor.queued_updates
+        )
+        self.metrics.gauge(
+            "grouphelpbot_send_queue_depth", "Bot API requests waiting for a rate limit token",
+            lambda: self.rate_limiter.global_bucket.depth + sum(
+                bucket.depth for bucket in self.rate_limiter.chat_buckets.values()
+            )
+        )
+        self.metrics.gauge(
+            "grouphelpbot_admin_cache_hits", "Admin cache hits", lambda: self.admin_cache.hits
+        )
+        self.metrics.gauge(
+            "grouphelpbot_admin_cache_misses", "Admin cache misses", lambda: self.admin_cache.misses
+        )
+        self.metrics.gauge(
+            "grouphelpbot_response_cache_hits", "Response cache hits", lambda: self.responses.hits
+        )
+        self.metrics.gauge(
+            "grouphelpbot_response_cache_misses", "Response cache misses", lambda: self.responses.misses
+        )
+        self.metrics.gauge(
+            "grouphelpbot_pending_captchas", "New members who haven't answered their challenge",
+            lambda: len(self.captcha)
+        )
+        self.metrics.gauge(
+            "grouphelpbot_chat_settings_loaded", "Chats with settings in memory", lambda: len(self.settings)
+        )
+        self.metrics.gauge(
+            "grouphelpbot_scheduled_jobs", "Pending scheduled jobs", lambda: len(self.scheduler)
+        )
+    
+    async def post_init(self, application: Application):
+        """Open the storage backend and resume scheduled jobs before handling updates."""
+        await self.shared.acquire()
+        self.acquired_shared = True
+        await self.scheduler.start()
+        self.captcha.start()
+        self.help_keyboard = help_keyboard(application.bot.username)
+        if CHAT_SETTINGS_PATH:
+            self.settings.start_watcher(CHAT_SETTINGS_PATH, CHAT_SETTINGS_CHECK_SECONDS)
+        self.metrics.start_loop_monitor()
+        if self.metrics_server:
+            await self.metrics_server.start()
+        # Keep suppressing welcomes in chats still locked down before a restart
+        for job in self.scheduler.jobs.values():
+            if job.kind == "lift_raid":
+                self.raid_detector.start(job.chat_id)
+        if self.scheduler.owns(0):
+            sweeps = self.scheduler.find(0, kind="expire_warnings")
+            # Drop copies left by workers that used to schedule their own
+            for job in sweeps[1:]:
+                await self.scheduler.cancel(job.job_id)
+            if not sweeps:
+                await self.scheduler.schedule("expire_warnings", WARNING_SWEEP_SECONDS, 0)
+    
+    async def post_stop(self, application: Application):
+        """Send pending welcomes and stop running scheduled jobs."""
+        await self.welcome_coalescer.flush_all()
+        await self.captcha_coalescer.flush_all()
+        await self.captcha.stop()
+        await self.scheduler.stop()
+        await self.settings.stop_watcher()
+    
+    async def post_shutdown(self, application: Application):
+        """Release the shared storage backend if post_init acquired it."""
+        if self.acquired_shared:
+            self.acquired_shared = False
+            await self.shared.release()
+        await self.metrics.stop_loop_monitor()
+        if self.metrics_server:
+            await self.metrics_server.stop()
+    
+    async def start_polling(self):
+        """Start processing updates and catch up on those that piled up while the bot was down.
+        
+        The application must be initialized. Updates held in the snapshot
+        of the last run are processed first, then the updates Telegram
+        queued while the bot was down, both at BACKLOG_UPDATES_PER_SECOND;
+        long polling only starts once the backlog is fed in.
+        """
+        updates = []
+        if self.snapshot_path:
+            from snapshot import Snapshot
+            
+            self.snapshot = Snapshot.open(self.snapshot_path)
+        if self.snapshot is not None:
+            # The mapping stays readable; a crash before the next snapshot
+            # must not replay the held updates a second time
+            os.unlink(self.snapshot_path)
+            self.next_update_id = self.snapshot.next_update_id
+            updates = [Update.de_json(data, self.application.bot) for data in self.snapshot.updates()]
+            logger.info(
+                f"Loaded snapshot with {self.snapshot.chat_count} chats and {len(updates)} unprocessed updates"
+            )
+        
+        await self.application.post_init(self.application)
+        await self.application.start()
+        self.catch_up_task = asyncio.get_running_loop().create_task(self.catch_up(updates))
+    
+    async def catch_up(self, updates: List[Update]):
+        """Feed held updates and Telegram's backlog in at a steady rate, then start long polling.
+        
+        Only the backlog from before the start is paced. Once getUpdates
+        returns a short batch or a message sent after the start, the rest
+        of the batch is queued at once and long polling takes over, so
+        traffic above BACKLOG_UPDATES_PER_SECOND can't keep the bot paced.
+        """
+        bucket = PriorityTokenBucket(BACKLOG_UPDATES_PER_SECOND, BACKLOG_UPDATES_PER_SECOND)
+        started = datetime.now(timezone.utc)
+        self.backlog.extend(updates)
+        caught_up = False
+        try:
+            while not caught_up:
+                while self.backlog:
+                    await bucket.acquire()
+                    await self.application.update_queue.put(self.backlog.popleft())
+                # Fetching from an offset confirms every earlier update
+                updates = await self.application.bot.get_updates(
+                    offset=self.next_update_id,
+                    timeout=0,
+                    limit=BACKLOG_BATCH_SIZE,
+                    allowed_updates=Update.ALL_TYPES
+                )
+                if not updates:
+                    break
+                self.next_update_id = updates[-1].update_id + 1
+                self.backlog.extend(updates)
+                caught_up = len(updates) < BACKLOG_BATCH_SIZE or any(
+                    update.message is not None and update.message.date >= started for update in updates
+                )
+            while self.backlog:
+                await self.application.update_queue.put(self.backlog.popleft())
+            if caught_up:
+                # Confirm the last batch; an update returned here is fetched again by long polling
+                await self.application.bot.get_updates(offset=self.next_update_id, timeout=0, limit=1)
+        except TelegramError as e:
+            logger.warning(f"Stopped catching up on the backlog early: {e}")
+        
+        try:
+            await self.application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        except Exception as e:
+            logger.error(f"Failed to start polling: {e}")
+    
+    async def stop_polling(self):
+        """Stop fetching updates, drain the ones being processed and snapshot the rest.
+        
+        Handlers already running get SHUTDOWN_DRAIN_SECONDS to finish and are
+        cancelled after that. Updates that were fetched but not started are
+        written to the snapshot together with the chat state.
+        """
+        if self.catch_up_task is not None:
+            self.catch_up_task.cancel()
+            try:
+                await self.catch_up_task
+            except asyncio.CancelledError:
+                pass
+            self.catch_up_task = None
+        application = self.application
+        if application.updater.running:
+            await application.updater.stop()
+        
+        self.update_processor.hold()
+        if application.running:
+            stopping = asyncio.ensure_future(application.stop())
+            done, _ = await asyncio.wait({stopping}, timeout=SHUTDOWN_DRAIN_SECONDS)
+            if not done:
+                aborted = self.update_processor.abort()
+                logger.warning(f"Cancelled {aborted} updates still being processed after {SHUTDOWN_DRAIN_SECONDS}s")
+                try:
+                    await asyncio.wait_for(stopping, SHUTDOWN_DRAIN_SECONDS)
+                except asyncio.TimeoutError:
+                    logger.warning("Gave up waiting for background tasks to finish")
+        
+        await application.post_stop(application)
+        if self.snapshot_path:
+            try:
+                self.save_snapshot()
+            except OSError as e:
+                logger.error(f"Failed to write snapshot {self.snapshot_path}: {e}")
+        await application.shutdown()
+        await application.post_shutdown(application)
+    
+    def save_snapshot(self):
+        """Write the chat state and the updates that weren't processed to the snapshot file."""
+        from snapshot import ChatState, encode_chat, write_snapshot
+        
+        wall_offset = time.time() - time.monotonic()
+        chats = {}
+        if self.snapshot is not None:
+            # Chats not seen since the last restart keep their saved state
+            for chat_id, data in self.snapshot.raw_chats():
+                if chat_id not in self.restored_chats:
+                    chats[chat_id] = data
+        for chat_id in set(self.recent_joins.chats()) | set(self.last_welcome):
+            joins = [(joined_at + wall_offset, user_id) for joined_at, user_id in self.recent_joins.joins(chat_id)]
+            chats[chat_id] = encode_chat(ChatState(self.last_welcome.get(chat_id, 0), joins))
+        
+        updates = sorted(self.update_processor.held + list(self.backlog), key=lambda update: update.update_id)
+        next_update_id = max(self.next_update_id, self.update_processor.last_update_id + 1)
+        write_snapshot(self.snapshot_path, next_update_id, chats, [update.to_dict() for update in updates])
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+        logger.info(f"Saved snapshot with {len(chats)} chats and {len(updates)} unprocessed updates")
+    
+    def restore_chat(self, chat_id: int):
+        """Load a chat's state from the snapshot on its first update after a restart."""
+        self.restored_chats.add(chat_id)
+        state = self.snapshot.chat(chat_id)
+        if state is None:
+            return
+        if state.last_welcome:
+            self.last_welcome.setdefault(chat_id, state.last_welcome)
+        monotonic_offset = time.monotonic() - time.time()
+        joins = [(joined_at + monotonic_offset, user_id) for joined_at, user_id in state.joins]
+        self.recent_joins.restore(chat_id, joins)
+        self.raid_detector.restore(chat_id, joins)
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Send a welcome message when the command /start is issued."""
         user = update.effective_user
         
         if update.effective_chat.type == "private":
-            welcome_text = f"""
-👋 Hello {user.mention_html()}!
-
-🤖 I'm GroupHelpBot - Your friendly group management assistant!
-
-📋 **Available Commands:**
-• /help - Show all commands
-• /rules - Show group rules
-• /warn @user - Warn a user
-• /warnings @user - Check user warnings
-• /kick @user - Kick a user
-• /ban @user - Ban a user
-• /mute @user [time] - Mute a user
-• /unmute @user - Unmute a user
-
-🔧 **Admin Commands:**
-• /setrules [rules] - Set group rules
-• /setwelcome [message] - Set welcome message
-• /purge [number] - Delete multiple messages
-• /promote @user - Promote to admin
-• /demote @user - Remove admin
-• /pin - Pin current message
-• /unpin - Unpin current message
-
-Add me to your group and make me admin to start managing!
-            """
-            await update.message.reply_html(welcome_text)
+            await update.message.reply_html(START_PRIVATE_TEXT.format(mention=user.mention_html()))
         else:
-            await update.message.reply_text(
-                "Hello! I'm here to help manage this group. Use /help to see all available commands."
-            )
+            await update.message.reply_text(START_GROUP_TEXT)
     
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Send a help message with all commands."""
-        help_text = """
-📚 **GroupHelpBot Commands:**
-
-👥 **Basic Commands:**
-• /rules - Show group rules
-• /help - Show this help message
-
-⚡ **Moderation Commands:**
-• /warn @user [reason] - Warn a user
-• /warnings @user - Check user warnings
-• /kick @user [reason] - Kick a user from group
-• /ban @user [reason] - Ban a user from group
-• /mute @user [1h/1d/1w] - Mute a user
-• /unmute @user - Unmute a user
-• /purge [number] - Delete multiple messages
-
-⚙️ **Admin Commands:**
-• /setrules [rules] - Set group rules
-• /setwelcome [message] - Set welcome message
-• /promote @user - Promote user to admin
-• /demote @user - Remove admin rights
-• /pin - Pin current message
-• /unpin - Unpin current message
-
-💡 **Tips:**
-• Make sure I have admin privileges for full functionality
-• Use @username to mention users
-• Time formats for mute: 1h, 2d, 1w
-        """
-        
-        keyboard = [
-            [InlineKeyboardButton("📜 Rules", callback_data="show_rules")],
-            [InlineKeyboardButton("👮 Admin Panel", callback_data="admin_panel")],
-            [InlineKeyboardButton("➕ Add to Group", url="http://t.me/your_bot_username?startgroup=true")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(help_text, reply_markup=reply_markup)
+        await update.message.reply_html(HELP_TEXT, reply_markup=self.help_keyboard)
     
     async def rules_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show group rules."""
         chat_id = update.effective_chat.id
-        rules = group_rules.get(chat_id, "No rules set yet. Admins can set rules using /setrules")
-        
-        await update.message.reply_text(f"📜 **Group Rules:**\n\n{rules}")
+        await update.message.reply_html(await self.responses.rules(chat_id))
     
     async def warn_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Warn a user."""
@@ -159,69 +600,67 @@ Add me to your group and make me admin to start managing!
             await update.message.reply_text("❌ You need to be an admin to warn users!")
             return
         
-        if not context.args:
-            await update.message.reply_text("Usage: /warn @username [reason]")
+        # Get user from message reply or username
+        target_user, args = self.resolve_target(update, context)
+        if target_user is None:
+            await update.message.reply_text(self.target_usage("/warn @username [reason]", context))
             return
         
-        # Parse username and reason
-        username = context.args[0].replace("@", "")
-        reason = " ".join(context.args[1:]) if len(context.args) > 1 else "No reason provided"
+        reason = " ".join(args) if args else "No reason provided"
         
-        # Get user from message reply or username
-        target_user = None
-        if update.message.reply_to_message:
-            target_user = update.message.reply_to_message.from_user
-        else:
-            # You would need to implement user lookup by username
-            await update.message.reply_text("Please reply to a message or implement user lookup")
-            return
+        warning_message = await self.add_warning(
+            context.bot, update.effective_chat.id, target_user, reason, actor_id=update.effective_user.id
+        )
+        await update.message.reply_html(warning_message)
+    
+    async def add_warning(self, bot, chat_id: int, target_user, reason: str, actor_id: Optional[int] = None) -> str:
+        """Warn a user, kick them at the chat's warning limit and return the warning message.
         
-        chat_id = update.effective_chat.id
+        `actor_id` is the admin who gave the warning, or None for the bot.
+        """
         user_id = target_user.id
+        actor_id = bot.id if actor_id is None else actor_id
+        settings = await self.settings.get(chat_id)
         
         # Add warning
-        if user_id not in user_warnings:
-            user_warnings[user_id] = []
-        
-        user_warnings[user_id].append(datetime.now())
-        
-        # Clean old warnings
-        self.clean_old_warnings(user_id)
+        await self.storage.add_warning(chat_id, user_id, datetime.now())
+        await self.audit(chat_id, actor_id, user_id, audit.WARN, reason)
         
-        warning_count = len(user_warnings[user_id])
+        warning_count = len(await self.storage.get_warnings(chat_id, user_id, self.warning_cutoff(settings)))
         
         warning_message = (
-            f"⚠️ Warning #{warning_count}/{MAX_WARNINGS}\n"
+            f"⚠️ Warning #{warning_count}/{settings.max_warnings}\n"
             f"User: {target_user.mention_html()}\n"
             f"Reason: {reason}\n\n"
         )
         
-        if warning_count >= MAX_WARNINGS:
+        if warning_count >= settings.max_warnings:
             warning_message += "🔴 MAX WARNINGS REACHED! User will be kicked."
             # Kick user
             try:
-                await context.bot.ban_chat_member(chat_id, user_id)
-                await context.bot.unban_chat_member(chat_id, user_id)
+                await bot.ban_chat_member(chat_id, user_id)
+                await bot.unban_chat_member(chat_id, user_id)
+                await self.audit(chat_id, bot.id, user_id, audit.KICK, "Reached the warning limit")
                 warning_message += "\n✅ User has been kicked!"
             except Exception as e:
                 warning_message += f"\n❌ Failed to kick: {str(e)}"
         else:
-            warning_message += f"⚠️ {MAX_WARNINGS - warning_count} warnings left before kick"
+            warning_message += f"⚠️ {settings.max_warnings - warning_count} warnings left before kick"
         
-        await update.message.reply_html(warning_message)
+        return warning_message
     
     async def warnings_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Check user warnings."""
         chat_id = update.effective_chat.id
         
-        # Get user from message reply
-        if update.message.reply_to_message:
-            target_user = update.message.reply_to_message.from_user
+        # Get user from message reply or username
+        target_user, _ = self.resolve_target(update, context)
+        if target_user:
             user_id = target_user.id
+            settings = await self.settings.get(chat_id)
             
-            if user_id in user_warnings:
-                warnings = user_warnings[user_id]
-                self.clean_old_warnings(user_id)
+            warnings = await self.storage.get_warnings(chat_id, user_id, self.warning_cutoff(settings))
+            if warnings:
                 warning_count = len(warnings)
                 
                 warning_list = "\n".join([
@@ -231,13 +670,13 @@ Add me to your group and make me admin to start managing!
                 
                 message = (
                     f"📊 Warnings for {target_user.mention_html()}\n"
-                    f"Total: {warning_count}/{MAX_WARNINGS}\n\n"
+                    f"Total: {warning_count}/{settings.max_warnings}\n\n"
                     f"Recent warnings:\n{warning_list if warning_list else 'No active warnings'}"
                 )
             else:
                 message = f"✅ {target_user.mention_html()} has no warnings!"
         else:
-            message = "Please reply to a user's message to check their warnings"
+            message = self.target_usage("/warnings @username", context)
         
         await update.message.reply_html(message)
     
@@ -247,14 +686,15 @@ Add me to your group and make me admin to start managing!
             await update.message.reply_text("❌ You need to be an admin to kick users!")
             return
         
-        if update.message.reply_to_message:
-            target_user = update.message.reply_to_message.from_user
+        target_user, args = self.resolve_target(update, context)
+        if target_user:
             chat_id = update.effective_chat.id
-            reason = " ".join(context.args) if context.args else "No reason provided"
+            reason = " ".join(args) if args else "No reason provided"
             
             try:
                 await context.bot.ban_chat_member(chat_id, target_user.id)
                 await context.bot.unban_chat_member(chat_id, target_user.id)
+                await self.audit(chat_id, update.effective_user.id, target_user.id, audit.KICK, reason)
                 
                 kick_message = (
                     f"👢 User {target_user.mention_html()} has been kicked!\n"
@@ -265,7 +705,7 @@ Add me to your group and make me admin to start managing!
             except Exception as e:
                 await update.message.reply_text(f"❌ Failed to kick user: {str(e)}")
         else:
-            await update.message.reply_text("Please reply to a user's message to kick them")
+            await update.message.reply_text(self.target_usage("/kick @username [reason]", context))
     
     async def ban_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Ban a user from the group."""
@@ -273,13 +713,14 @@ Add me to your group and make me admin to start managing!
             await update.message.reply_text("❌ You need to be an admin to ban users!")
             return
         
-        if update.message.reply_to_message:
-            target_user = update.message.reply_to_message.from_user
+        target_user, args = self.resolve_target(update, context)
+        if target_user:
             chat_id = update.effective_chat.id
-            reason = " ".join(context.args) if context.args else "No reason provided"
+            reason = " ".join(args) if args else "No reason provided"
             
             try:
                 await context.bot.ban_chat_member(chat_id, target_user.id)
+                await self.audit(chat_id, update.effective_user.id, target_user.id, audit.BAN, reason)
                 
                 ban_message = (
                     f"🚫 User {target_user.mention_html()} has been banned!\n"
@@ -290,7 +731,7 @@ Add me to your group and make me admin to start managing!
             except Exception as e:
                 await update.message.reply_text(f"❌ Failed to ban user: {str(e)}")
         else:
-            await update.message.reply_text("Please reply to a user's message to ban them")
+            await update.message.reply_text(self.target_usage("/ban @username [reason]", context))
     
     async def mute_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Mute a user for a specified time."""
@@ -298,44 +739,29 @@ Add me to your group and make me admin to start managing!
             await update.message.reply_text("❌ You need to be an admin to mute users!")
             return
         
-        if update.message.reply_to_message:
-            target_user = update.message.reply_to_message.from_user
+        target_user, args = self.resolve_target(update, context)
+        if target_user:
             chat_id = update.effective_chat.id
             
             # Parse mute duration
-            mute_duration = 60 * 60  # Default: 1 hour
-            if context.args:
-                time_arg = context.args[0].lower()
-                if 'h' in time_arg:
-                    hours = int(time_arg.replace('h', ''))
-                    mute_duration = hours * 60 * 60
-                elif 'd' in time_arg:
-                    days = int(time_arg.replace('d', ''))
-                    mute_duration = days * 24 * 60 * 60
-                elif 'w' in time_arg:
-                    weeks = int(time_arg.replace('w', ''))
-                    mute_duration = weeks * 7 * 24 * 60 * 60
+            mute_duration = (await self.settings.get(chat_id)).mute_duration
+            if args:
+                mute_duration = self.parse_duration(args[0])
+                if mute_duration is None:
+                    await update.message.reply_text("Usage: Reply to a user's message with /mute [1h/2d/1w] or use /mute @username [1h/2d/1w]")
+                    return
             
             until_date = datetime.now() + timedelta(seconds=mute_duration)
             
             try:
-                permissions = ChatPermissions(
-                    can_send_messages=False,
-                    can_send_media_messages=False,
-                    can_send_polls=False,
-                    can_send_other_messages=False,
-                    can_add_web_page_previews=False,
-                    can_change_info=False,
-                    can_invite_users=False,
-                    can_pin_messages=False
-                )
-                
                 await context.bot.restrict_chat_member(
-                    chat_id, target_user.id, permissions,
+                    chat_id, target_user.id, MUTE_PERMISSIONS,
                     until_date=int(until_date.timestamp())
                 )
                 
                 duration_text = self.format_duration(mute_duration)
+                await self.audit(chat_id, update.effective_user.id, target_user.id, audit.MUTE, f"For {duration_text}")
+                
                 mute_message = (
                     f"🔇 User {target_user.mention_html()} has been muted for {duration_text}!"
                 )
@@ -344,7 +770,7 @@ Add me to your group and make me admin to start managing!
             except Exception as e:
                 await update.message.reply_text(f"❌ Failed to mute user: {str(e)}")
         else:
-            await update.message.reply_text("Usage: Reply to a user's message with /mute [1h/2d/1w]")
+            await update.message.reply_text("Usage: Reply to a user's message with /mute [1h/2d/1w] or use /mute @username [1h/2d/1w]")
     
     async def unmute_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Unmute a user."""
@@ -352,29 +778,429 @@ Add me to your group and make me admin to start managing!
             await update.message.reply_text("❌ You need to be an admin to unmute users!")
             return
         
-        if update.message.reply_to_message:
-            target_user = update.message.reply_to_message.from_user
+        target_user, _ = self.resolve_target(update, context)
+        if target_user:
             chat_id = update.effective_chat.id
             
             try:
-                permissions = ChatPermissions(
-                    can_send_messages=True,
-                    can_send_media_messages=True,
-                    can_send_polls=True,
-                    can_send_other_messages=True,
-                    can_add_web_page_previews=True,
-                    can_change_info=False,
-                    can_invite_users=False,
-                    can_pin_messages=False
-                )
-                
-                await context.bot.restrict_chat_member(chat_id, target_user.id, permissions)
+                await context.bot.restrict_chat_member(chat_id, target_user.id, UNMUTE_PERMISSIONS)
+                await self.audit(chat_id, update.effective_user.id, target_user.id, audit.UNMUTE)
                 await update.message.reply_html(f"🔊 User {target_user.mention_html()} has been unmuted!")
                 
             except Exception as e:
                 await update.message.reply_text(f"❌ Failed to unmute user: {str(e)}")
         else:
-            await update.message.reply_text("Please reply to a user's message to unmute them")
+            await update.message.reply_text(self.target_usage("/unmute @username", context))
+    
+    async def tmute_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Mute a user and schedule the unmute."""
+        if not await self.is_admin(update, context):
+            await update.message.reply_text("❌ You need to be an admin to mute users!")
+            return
+        
+        target_user, args = self.resolve_target(update, context)
+        duration = self.parse_duration(args[0]) if args else None
+        if target_user is None or duration is None:
+            await update.message.reply_text(
+                "Usage: Reply to a user's message with /tmute [30m/1h/2d/1w] or use /tmute @username [30m/1h/2d/1w]"
+            )
+            return
+        
+        chat_id = update.effective_chat.id
+        
+        try:
+            # until_date lifts the mute even if the job is lost or cancelled
+            await self.mute_user(context.bot, chat_id, target_user.id, duration)
+            job = await self.scheduler.reschedule("unmute", duration, chat_id, user_id=target_user.id)
+            await self.audit(
+                chat_id, update.effective_user.id, target_user.id, audit.MUTE, f"For {self.format_duration(duration)}"
+            )
+            
+            await update.message.reply_html(
+                f"🔇 User {target_user.mention_html()} has been muted for {self.format_duration(duration)}!\n"
+                f"Job: <code>{job.job_id}</code>"
+            )
+        except Exception as e:
+            await update.message.reply_text(f"❌ Failed to mute user: {str(e)}")
+    
+    async def tban_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Ban a user and schedule the unban."""
+        if not await self.is_admin(update, context):
+            await update.message.reply_text("❌ You need to be an admin to ban users!")
+            return
+        
+        target_user, args = self.resolve_target(update, context)
+        duration = self.parse_duration(args[0]) if args else None
+        if target_user is None or duration is None:
+            await update.message.reply_text(
+                "Usage: Reply to a user's message with /tban [30m/1h/2d/1w] or use /tban @username [30m/1h/2d/1w]"
+            )
+            return
+        
+        chat_id = update.effective_chat.id
+        
+        try:
+            until_date = datetime.now() + timedelta(seconds=duration)
+            await context.bot.ban_chat_member(chat_id, target_user.id, until_date=int(until_date.timestamp()))
+            job = await self.scheduler.reschedule("unban", duration, chat_id, user_id=target_user.id)
+            await self.audit(
+                chat_id, update.effective_user.id, target_user.id, audit.BAN, f"For {self.format_duration(duration)}"
+            )
+            
+            await update.message.reply_html(
+                f"🚫 User {target_user.mention_html()} has been banned for {self.format_duration(duration)}!\n"
+                f"Job: <code>{job.job_id}</code>"
+            )
+        except Exception as e:
+            await update.message.reply_text(f"❌ Failed to ban user: {str(e)}")
+    
+    async def mass_ban_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Ban many users at once."""
+        targets = await self.bulk_targets(update, context, "ban", "/massban")
+        if targets is None:
+            return
+        
+        user_ids, unknown, args = targets
+        bot, chat_id = context.bot, update.effective_chat.id
+        await self.start_bulk_action(
+            update, context, user_ids, unknown, "🚫 Banned", audit.BAN, " ".join(args),
+            lambda user_id: bot.ban_chat_member(chat_id, user_id)
+        )
+    
+    async def mass_kick_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Kick many users at once."""
+        targets = await self.bulk_targets(update, context, "kick", "/masskick")
+        if targets is None:
+            return
+        
+        user_ids, unknown, args = targets
+        bot, chat_id = context.bot, update.effective_chat.id
+        await self.start_bulk_action(
+            update, context, user_ids, unknown, "👢 Kicked", audit.KICK, " ".join(args),
+            lambda user_id: self.kick_user(bot, chat_id, user_id)
+        )
+    
+    async def mass_mute_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Mute many users at once."""
+        targets = await self.bulk_targets(update, context, "mute", "/massmute", "[1h/2d/1w]")
+        if targets is None:
+            return
+        
+        user_ids, unknown, args = targets
+        duration = self.parse_duration(args[0]) if args else None
+        if duration is None:
+            duration = (await self.settings.get(update.effective_chat.id)).mute_duration
+        else:
+            args = args[1:]
+        
+        bot, chat_id = context.bot, update.effective_chat.id
+        await self.start_bulk_action(
+            update, context, user_ids, unknown,
+            f"🔇 Muted for {self.format_duration(duration)}", audit.MUTE, " ".join(args),
+            lambda user_id: self.mute_user(bot, chat_id, user_id, duration)
+        )
+    
+    async def bulk_targets(self, update: Update, context: ContextTypes.DEFAULT_TYPE, verb: str, command: str, extra: str = "[reason]"):
+        """Resolve the targets of a bulk command, replying with the problem if there are none.
+        
+        Returns the user IDs, the @usernames that could not be resolved and
+        the remaining arguments. Admins, the bot and the caller are never
+        targeted.
+        """
+        if not await self.is_admin(update, context):
+            await update.message.reply_text(f"❌ You need to be an admin to {verb} users!")
+            return None
+        
+        chat_id = update.effective_chat.id
+        user_ids, unknown, args = self.parse_bulk_targets(chat_id, context.args or [])
+        if update.message.reply_to_message:
+            user_ids.append(update.message.reply_to_message.from_user.id)
+        
+        try:
+            user_ids = await self.exclude_protected(update, context, user_ids)
+        except Exception as e:
+            await update.message.reply_text(f"❌ Failed to {verb} users: {str(e)}")
+            return None
+        
+        if not user_ids:
+            text = f"Usage: {command} [user IDs, @usernames or joined:10m] {extra}"
+            if unknown:
+                text = f"❌ I haven't seen {', '.join(unknown)} in this chat yet.\n{text}"
+            await update.message.reply_text(text)
+            return None
+        if len(user_ids) > BULK_MAX_TARGETS:
+            await update.message.reply_text(
+                f"❌ That selects {len(user_ids)} users, the limit is {BULK_MAX_TARGETS} per command."
+            )
+            return None
+        return user_ids, unknown, args
+    
+    async def exclude_protected(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_ids: List[int]) -> List[int]:
+        """Drop duplicates, admins, the bot and the caller from a list of targets."""
+        protected = await self.admin_cache.get_admins(context.bot, update.effective_chat.id)
+        protected = protected | {context.bot.id, update.effective_user.id}
+        return [user_id for user_id in dict.fromkeys(user_ids) if user_id not in protected]
+    
+    def parse_bulk_targets(self, chat_id: int, args: List[str]):
+        """Split bulk command arguments into user IDs, unknown @usernames and the rest.
+        
+        Targets are numeric user IDs, @usernames and joined:<duration>, which
+        selects everyone who joined in that period. Parsing stops at the
+        first argument that is none of these.
+        """
+        user_ids: List[int] = []
+        unknown: List[str] = []
+        for index, arg in enumerate(args):
+            if arg.isdigit():
+                user_ids.append(int(arg))
+            elif arg.startswith("@"):
+                user = self.username_index.resolve(chat_id, arg)
+                if user:
+                    user_ids.append(user.id)
+                else:
+                    unknown.append(arg)
+            elif arg.lower().startswith("joined:") and self.parse_duration(arg[len("joined:"):]):
+                user_ids.extend(self.recent_joins.since(chat_id, self.parse_duration(arg[len("joined:"):])))
+            else:
+                return user_ids, unknown, args[index:]
+        return user_ids, unknown, []
+    
+    async def start_bulk_action(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_ids: List[int],
+                                unknown: List[str], done_text: str, audit_action: str, reason: str, action):
+        """Acknowledge a bulk command and run it in the background."""
+        status = await update.message.reply_text(f"⏳ Working on {len(user_ids)} users...")
+        chat_id, actor_id = update.effective_chat.id, update.effective_user.id
+        
+        async def record(user_id: int):
+            await self.audit(chat_id, actor_id, user_id, audit_action, reason)
+        
+        context.application.create_task(
+            self.run_bulk_action(status, user_ids, unknown, done_text, reason, action, record),
+            update=update
+        )
+    
+    async def run_bulk_action(self, status, user_ids: List[int], unknown: List[str], done_text: str, reason: str,
+                              action, on_success=None):
+        """Apply a moderation action to every user and edit the status message into a summary."""
+        result = await self.bulk_moderator.run(user_ids, action, on_success)
+        
+        lines = [f"{done_text}: {result.succeeded} of {len(user_ids)} users"]
+        if reason:
+            lines.append(f"Reason: {reason}")
+        if result.failed:
+            lines.append(f"⚠️ Failed for {result.failed} users:")
+            errors = sorted(result.errors.items(), key=lambda item: -item[1])
+            lines.extend(f"• {error} ({count})" for error, count in errors[:5])
+        if unknown:
+            lines.append(f"❓ Not seen in this chat: {', '.join(unknown)}")
+        
+        await status.edit_text("\n".join(lines))
+    
+    async def raid_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show or control raid mode: /raid [on [duration]|off|kick|ban]."""
+        if not await self.is_admin(update, context):
+            await update.message.reply_text("❌ You need to be an admin to manage raid mode!")
+            return
+        
+        chat_id = update.effective_chat.id
+        action = context.args[0].lower() if context.args else None
+        
+        if action is None:
+            raid = self.raid_detector.raids.get(chat_id)
+            if raid is None:
+                await update.message.reply_text(
+                    f"🛡 Raid mode is off. It turns on at {RAID_JOIN_THRESHOLD} joins "
+                    f"within {self.format_duration(int(RAID_WINDOW_SECONDS))}."
+                )
+            else:
+                await update.message.reply_text(
+                    f"🚨 Raid mode is on, {len(raid.joiners)} users who joined during the raid are queued.\n"
+                    "Use /raid kick or /raid ban to remove them, /raid off to unlock the chat."
+                )
+        
+        elif action == "on":
+            duration = self.parse_duration(context.args[1]) if len(context.args) > 1 else RAID_LOCK_SECONDS
+            if duration is None:
+                await update.message.reply_text("Usage: /raid on [30m/1h/1d]")
+                return
+            self.raid_detector.start(chat_id)
+            await self.start_lockdown(context.bot, chat_id, duration, actor_id=update.effective_user.id)
+        
+        elif action == "off":
+            jobs = self.scheduler.find(chat_id, kind="lift_raid")
+            if not jobs and not self.raid_detector.is_active(chat_id):
+                await update.message.reply_text("🛡 Raid mode is already off.")
+                return
+            for job in jobs:
+                await self.scheduler.cancel(job.job_id)
+            await self.lift_lockdown(
+                context.bot, chat_id, jobs[0].payload.get("permissions") if jobs else None,
+                actor_id=update.effective_user.id
+            )
+        
+        elif action in ("kick", "ban"):
+            try:
+                user_ids = await self.exclude_protected(update, context, self.raid_detector.take_joiners(chat_id))
+            except Exception as e:
+                await update.message.reply_text(f"❌ Failed to {action} users: {str(e)}")
+                return
+            if not user_ids:
+                await update.message.reply_text("No raid members are queued.")
+                return
+            bot = context.bot
+            if action == "kick":
+                done_text, remove = "👢 Kicked", lambda user_id: self.kick_user(bot, chat_id, user_id)
+            else:
+                done_text, remove = "🚫 Banned", lambda user_id: bot.ban_chat_member(chat_id, user_id)
+            await self.start_bulk_action(update, context, user_ids, [], done_text, action, "raid", remove)
+        
+        else:
+            await update.message.reply_text("Usage: /raid [on [30m/1h/1d]|off|kick|ban]")
+    
+    async def start_lockdown(self, bot, chat_id: int, seconds: int, actor_id: Optional[int] = None):
+        """Lock a chat's default permissions and schedule the unlock."""
+        jobs = self.scheduler.find(chat_id, kind="lift_raid")
+        if jobs:
+            # Already locked, keep the permissions saved before the first lock
+            permissions = jobs[0].payload.get("permissions")
+        else:
+            try:
+                chat = await bot.get_chat(chat_id)
+                permissions = chat.permissions.to_dict() if chat.permissions else None
+            except Exception as e:
+                # The lift then falls back to UNMUTE_PERMISSIONS
+                logger.warning(f"Failed to read permissions of chat {chat_id} during a raid: {e}")
+                permissions = None
+        
+        try:
+            await bot.set_chat_permissions(chat_id, MUTE_PERMISSIONS)
+            locked = True
+        except Exception as e:
+            logger.warning(f"Failed to lock chat {chat_id} during a raid: {e}")
+            locked = False
+        await self.scheduler.reschedule("lift_raid", seconds, chat_id, payload={"permissions": permissions})
+        await self.audit(
+            chat_id, bot.id if actor_id is None else actor_id, None, audit.LOCKDOWN,
+            f"Raid mode for {self.format_duration(seconds)}"
+        )
+        
+        queued = len(self.raid_detector.raids[chat_id].joiners) if self.raid_detector.is_active(chat_id) else 0
+        text = (
+            f"🚨 <b>Raid mode on</b> for {self.format_duration(seconds)}.\n"
+            + ("New members can't send messages and " if locked else "I couldn't lock the chat, but ")
+            + f"welcomes are paused.\n{queued} users who joined during the raid are queued: "
+            "use /raid kick or /raid ban to remove them, /raid off to end raid mode."
+        )
+        await bot.send_message(chat_id, text, parse_mode=ParseMode.HTML)
+    
+    async def lift_lockdown(self, bot, chat_id: int, permissions: Optional[dict], actor_id: Optional[int] = None):
+        """Restore a chat's permissions from before its raid."""
+        self.raid_detector.lift(chat_id)
+        restored = ChatPermissions.de_json(permissions, bot) if permissions else UNMUTE_PERMISSIONS
+        await bot.set_chat_permissions(chat_id, restored)
+        await self.audit(chat_id, bot.id if actor_id is None else actor_id, None, audit.UNLOCK, "Raid mode ended")
+        await bot.send_message(chat_id, "🛡 Raid mode is off, the chat is unlocked.")
+    
+    async def modlog_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show the chat's moderation log, newest first."""
+        if not await self.is_admin(update, context):
+            await update.message.reply_text("❌ You need to be an admin to view the moderation log!")
+            return
+        
+        text, reply_markup = await self.render_audit_page(update.effective_chat.id)
+        await update.message.reply_html(text, reply_markup=reply_markup)
+    
+    async def history_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show the moderation history of one user in this chat."""
+        if not await self.is_admin(update, context):
+            await update.message.reply_text("❌ You need to be an admin to view moderation history!")
+            return
+        
+        target_user, _ = self.resolve_target(update, context)
+        if target_user is None:
+            await update.message.reply_text(self.target_usage("/history @username", context))
+            return
+        
+        text, reply_markup = await self.render_audit_page(update.effective_chat.id, target_user.id)
+        await update.message.reply_html(text, reply_markup=reply_markup)
+    
+    async def render_audit_page(self, chat_id: int, target_id: Optional[int] = None, before_id: Optional[int] = None):
+        """Return the text and "Older" button of one page of the audit log."""
+        # One extra event tells whether an older page exists
+        events = await self.storage.get_audit_events(chat_id, target_id, before_id, MODLOG_PAGE_SIZE + 1)
+        page = events[:MODLOG_PAGE_SIZE]
+        
+        if target_id is None:
+            title = "📋 <b>Moderation log</b>"
+        else:
+            title = f'📋 <b>Moderation history of</b> <a href="tg://user?id={target_id}">{target_id}</a>'
+        if not page:
+            return f"{title}\n\nNo {'older ' if before_id else ''}events.", None
+        
+        text = f"{title}\n\n" + "\n".join(format_event(event) for event in page)
+        reply_markup = older_events_keyboard(target_id, page[-1].event_id) if len(events) > MODLOG_PAGE_SIZE else None
+        return text, reply_markup
+    
+    async def jobs_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """List pending unmutes and unbans in this chat."""
+        if not await self.is_admin(update, context):
+            await update.message.reply_text("❌ You need to be an admin to view scheduled jobs!")
+            return
+        
+        jobs = [
+            job for job in self.scheduler.find(update.effective_chat.id)
+            if job.kind in ("unmute", "unban")
+        ]
+        if not jobs:
+            await update.message.reply_text("No pending jobs")
+            return
+        
+        now = datetime.now().timestamp()
+        job_list = "\n".join(
+            f"<code>{job.job_id}</code> - {job.kind} user {job.user_id} "
+            f"in {self.format_duration(max(int(job.run_at - now), 0))}"
+            for job in jobs[:50]
+        )
+        await update.message.reply_html(f"⏰ Pending jobs:\n\n{job_list}")
+    
+    async def cancel_job_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Cancel a pending job in this chat."""
+        if not await self.is_admin(update, context):
+            await update.message.reply_text("❌ You need to be an admin to cancel scheduled jobs!")
+            return
+        
+        if not context.args:
+            await update.message.reply_text("Usage: /canceljob [job id]")
+            return
+        
+        job = self.scheduler.jobs.get(context.args[0])
+        if job is None or job.chat_id != update.effective_chat.id:
+            await update.message.reply_text("❌ No such job")
+            return
+        
+        await self.scheduler.cancel(job.job_id)
+        await update.message.reply_text(f"✅ Cancelled {job.kind} job {job.job_id}")
+    
+    async def run_unmute_job(self, job: Job):
+        bot = self.application.bot
+        await bot.restrict_chat_member(job.chat_id, job.user_id, UNMUTE_PERMISSIONS)
+        await self.audit(job.chat_id, bot.id, job.user_id, audit.UNMUTE, "Mute expired")
+    
+    async def run_unban_job(self, job: Job):
+        bot = self.application.bot
+        await bot.unban_chat_member(job.chat_id, job.user_id, only_if_banned=True)
+        await self.audit(job.chat_id, bot.id, job.user_id, audit.UNBAN, "Ban expired")
+    
+    async def run_delete_message_job(self, job: Job):
+        await self.application.bot.delete_message(job.chat_id, job.payload["message_id"])
+    
+    async def run_lift_raid_job(self, job: Job):
+        await self.lift_lockdown(self.application.bot, job.chat_id, job.payload.get("permissions"))
+    
+    async def run_expire_warnings_job(self, job: Job):
+        # Warnings of each chat expire on read; this only bounds what's stored
+        await self.storage.expire_warnings(datetime.now() - timedelta(seconds=MAX_WARNING_EXPIRY))
+        await self.scheduler.schedule("expire_warnings", WARNING_SWEEP_SECONDS, 0)
     
     async def set_rules_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Set group rules."""
@@ -385,7 +1211,8 @@ Add me to your group and make me admin to start managing!
         if context.args:
             rules = " ".join(context.args)
             chat_id = update.effective_chat.id
-            group_rules[chat_id] = rules
+            await self.storage.set_rules(chat_id, rules)
+            self.responses.invalidate(chat_id)
             
             await update.message.reply_text("✅ Group rules have been updated!")
         else:
@@ -400,12 +1227,168 @@ Add me to your group and make me admin to start managing!
         if context.args:
             welcome_message = " ".join(context.args)
             chat_id = update.effective_chat.id
-            welcome_messages[chat_id] = welcome_message
+            await self.storage.set_welcome(chat_id, welcome_message)
+            self.responses.invalidate(chat_id)
             
             await update.message.reply_text("✅ Welcome message has been updated!")
         else:
             await update.message.reply_text("Usage: /setwelcome [welcome message]\n\nYou can use {username} and {mention} in the message.")
     
+    async def settings_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show the chat's settings."""
+        settings = await self.settings.get(update.effective_chat.id)
+        
+        lines = [
+            "⚙️ Settings",
+            f"max_warnings: {settings.max_warnings}",
+            f"warning_expiry: {self.format_duration(settings.warning_expiry)}",
+            f"mute_duration: {self.format_duration(settings.mute_duration)}",
+            f"welcome: {'on' if settings.welcome else 'off'}",
+            f"goodbye: {'on' if settings.goodbye else 'off'}",
+            f"captcha: {'on' if settings.captcha else 'off'}",
+            f"captcha_timeout: {self.format_duration(settings.captcha_timeout)}",
+            "",
+            "Admins can change them with /set [setting] [value]",
+        ]
+        await update.message.reply_text("\n".join(lines))
+    
+    async def set_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Change one of the chat's settings."""
+        if not await self.is_admin(update, context):
+            await update.message.reply_text("❌ You need to be an admin to change settings!")
+            return
+        
+        if len(context.args) != 2 or context.args[0].lower() not in FIELDS:
+            await update.message.reply_text(
+                "Usage: /set [setting] [value]\n\n"
+                "Settings: max_warnings 3, warning_expiry 7d, mute_duration 1h, welcome on/off, goodbye on/off, "
+                "captcha on/off, captcha_timeout 2m\n"
+                "Use /set [setting] default to restore the default."
+            )
+            return
+        
+        name, value = context.args[0].lower(), context.args[1]
+        try:
+            await self.settings.set(update.effective_chat.id, name, None if value.lower() == "default" else value)
+        except ValueError:
+            await update.message.reply_text(f"❌ Invalid value for {name}: {value}")
+            return
+        
+        await update.message.reply_text(f"✅ {name} has been updated!")
+    
+    async def get_chat_filter(self, chat_id: int) -> ChatFilter:
+        """Return the blocklist of a chat, loading it from storage once."""
+        chat_filter = self.chat_filters.get(chat_id)
+        if chat_filter is None:
+            config = await self.storage.get_filters(chat_id)
+            chat_filter = ChatFilter.from_dict(config) if config else ChatFilter()
+            self.chat_filters[chat_id] = chat_filter
+        return chat_filter
+    
+    async def add_filter_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Add banned words to the chat's blocklist."""
+        if not await self.is_admin(update, context):
+            await update.message.reply_text("❌ You need to be an admin to manage filters!")
+            return
+        
+        if context.args:
+            chat_id = update.effective_chat.id
+            chat_filter = await self.get_chat_filter(chat_id)
+            chat_filter.add_words(context.args)
+            await self.storage.set_filters(chat_id, chat_filter.to_dict())
+            
+            await update.message.reply_text(f"✅ Added {len(context.args)} word(s) to the filter list!")
+        else:
+            await update.message.reply_text("Usage: /addfilter [word] [word] ...")
+    
+    async def add_regex_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Add a regular expression to the chat's blocklist."""
+        if not await self.is_admin(update, context):
+            await update.message.reply_text("❌ You need to be an admin to manage filters!")
+            return
+        
+        if context.args:
+            pattern = " ".join(context.args)
+            chat_id = update.effective_chat.id
+            chat_filter = await self.get_chat_filter(chat_id)
+            try:
+                chat_filter.add_pattern(pattern)
+            except re.error as e:
+                await update.message.reply_text(f"❌ Invalid pattern: {str(e)}")
+                return
+            await self.storage.set_filters(chat_id, chat_filter.to_dict())
+            
+            await update.message.reply_text("✅ Pattern added to the filter list!")
+        else:
+            await update.message.reply_text("Usage: /addregex [pattern]")
+    
+    async def del_filter_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Remove a word or pattern from the chat's blocklist."""
+        if not await self.is_admin(update, context):
+            await update.message.reply_text("❌ You need to be an admin to manage filters!")
+            return
+        
+        if context.args:
+            entry = " ".join(context.args)
+            chat_id = update.effective_chat.id
+            chat_filter = await self.get_chat_filter(chat_id)
+            if chat_filter.remove(entry):
+                await self.storage.set_filters(chat_id, chat_filter.to_dict())
+                await update.message.reply_text("✅ Filter removed!")
+            else:
+                await update.message.reply_text("❌ No such filter")
+        else:
+            await update.message.reply_text("Usage: /delfilter [word or pattern]")
+    
+    async def filters_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """List the chat's blocklist."""
+        chat_filter = await self.get_chat_filter(update.effective_chat.id)
+        if chat_filter.empty:
+            await update.message.reply_text("No filters set. Admins can add filters using /addfilter")
+            return
+        
+        lines = [f"🚫 Filters (action: {chat_filter.action})"]
+        if chat_filter.words:
+            lines.append("Words: " + ", ".join(sorted(chat_filter.words)))
+        for pattern in chat_filter.patterns:
+            lines.append(f"Pattern: {pattern}")
+        if chat_filter.block_links:
+            lines.append("Links are blocked")
+        await update.message.reply_text("\n".join(lines))
+    
+    async def filter_links_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Turn link blocking on or off."""
+        if not await self.is_admin(update, context):
+            await update.message.reply_text("❌ You need to be an admin to manage filters!")
+            return
+        
+        if context.args and context.args[0].lower() in ("on", "off"):
+            enabled = context.args[0].lower() == "on"
+            chat_id = update.effective_chat.id
+            chat_filter = await self.get_chat_filter(chat_id)
+            chat_filter.set_block_links(enabled)
+            await self.storage.set_filters(chat_id, chat_filter.to_dict())
+            
+            await update.message.reply_text(f"✅ Links are now {'blocked' if enabled else 'allowed'}!")
+        else:
+            await update.message.reply_text("Usage: /filterlinks on/off")
+    
+    async def filter_action_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Choose what happens to messages that match a filter."""
+        if not await self.is_admin(update, context):
+            await update.message.reply_text("❌ You need to be an admin to manage filters!")
+            return
+        
+        if context.args and context.args[0].lower() in ACTIONS:
+            chat_id = update.effective_chat.id
+            chat_filter = await self.get_chat_filter(chat_id)
+            chat_filter.action = context.args[0].lower()
+            await self.storage.set_filters(chat_id, chat_filter.to_dict())
+            
+            await update.message.reply_text(f"✅ Filter action set to {chat_filter.action}!")
+        else:
+            await update.message.reply_text(f"Usage: /filteraction {'/'.join(ACTIONS)}")
+    
     async def purge_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Delete multiple messages."""
         if not await self.is_admin(update, context):
@@ -416,34 +1399,49 @@ Add me to your group and make me admin to start managing!
             try:
                 # Delete command message
                 await update.message.delete()
-                
-                # Get message IDs to delete
-                start_message_id = update.message.reply_to_message.message_id
-                end_message_id = update.message.message_id
-                
-                # Delete messages
-                for message_id in range(start_message_id, end_message_id):
-                    try:
-                        await context.bot.delete_message(update.effective_chat.id, message_id)
-                    except:
-                        continue
-                
-                # Send confirmation
-                deleted_count = end_message_id - start_message_id
-                confirmation = await context.bot.send_message(
-                    update.effective_chat.id,
-                    f"✅ Deleted {deleted_count} messages!"
-                )
-                
-                # Delete confirmation after 3 seconds
-                await asyncio.sleep(3)
-                await confirmation.delete()
-                
             except Exception as e:
                 await update.message.reply_text(f"❌ Failed to purge messages: {str(e)}")
+                return
+            
+            # Get message IDs to delete
+            start_message_id = update.message.reply_to_message.message_id
+            end_message_id = update.message.message_id
+            
+            # Run the purge in the background so the handler returns right away
+            context.application.create_task(
+                self.run_purge(
+                    context, update.effective_chat.id, start_message_id, end_message_id, update.effective_user.id
+                ),
+                update=update
+            )
         else:
             await update.message.reply_text("Reply to a message to purge from that point")
     
+    async def run_purge(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, start_message_id: int,
+                        end_message_id: int, actor_id: int):
+        """Delete a message range and report the result."""
+        if self.purge_engine is None:
+            from purge import PurgeEngine
+            self.purge_engine = PurgeEngine(concurrency=PURGE_CONCURRENCY)
+        result = await self.purge_engine.purge(context.bot, chat_id, start_message_id, end_message_id)
+        await self.audit(
+            chat_id, actor_id, None, audit.PURGE,
+            f"Messages {start_message_id}-{end_message_id - 1}, {result.requested} requested"
+        )
+        
+        # Send confirmation
+        # Telegram doesn't say which of the requested messages still existed
+        text = f"✅ Purged up to {result.requested} messages!"
+        if result.skipped:
+            text += f"\n⚠️ Skipped {result.skipped} messages that could not be deleted"
+        confirmation = await context.bot.send_message(chat_id, text)
+        
+        # Delete confirmation after 3 seconds
+        await self.scheduler.schedule(
+            "delete_message", 3, chat_id,
+            payload={"message_id": confirmation.message_id}
+        )
+    
     async def promote_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Promote a user to admin."""
         if not await self.is_admin(update, context):
@@ -495,7 +1493,8 @@ Add me to your group and make me admin to start managing!
     async def welcome_new_members(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Welcome new members to the group."""
         chat_id = update.effective_chat.id
-        welcome_message = welcome_messages.get(chat_id, "Welcome {mention} to the group! 🎉")
+        new_members = []
+        raid_started = False
         
         for new_member in update.message.new_chat_members:
             if new_member.id == context.bot.id:
@@ -505,59 +1504,348 @@ Add me to your group and make me admin to start managing!
                     "to enable all features. Use /help to see available commands."
                 )
             else:
-                # Welcome regular user
-                personalized_message = welcome_message.format(
-                    username=new_member.username or new_member.first_name,
-                    mention=new_member.mention_html()
+                new_members.append(new_member)
+                raid_started |= self.raid_detector.record_join(chat_id, new_member.id)
+        
+        if raid_started:
+            self.welcome_coalescer.discard(chat_id)
+            context.application.create_task(self.start_lockdown(context.bot, chat_id, RAID_LOCK_SECONDS), update=update)
+        
+        # No welcomes during a raid
+        if self.raid_detector.is_active(chat_id):
+            return
+        
+        if not new_members:
+            return
+        
+        settings = await self.settings.get(chat_id)
+        if settings.captcha:
+            # Welcomed once they pass the challenge
+            await self.challenge_new_members(context.bot, chat_id, new_members, settings.captcha_timeout)
+        elif settings.welcome:
+            # Welcome regular users in one combined message per burst of joins
+            self.welcome_coalescer.add(context.bot, chat_id, new_members)
+    
+    async def challenge_new_members(self, bot, chat_id: int, new_members: List, timeout: int):
+        """Restrict new members until they answer a join challenge."""
+        for member in new_members:
+            self.captcha.add(chat_id, member.id, timeout)
+        
+        # The restriction outlasts the challenge a little, so Telegram lifts it
+        # even if the challenge is lost in a restart
+        results = await asyncio.gather(
+            *(self.mute_user(bot, chat_id, member.id, timeout + 60) for member in new_members),
+            return_exceptions=True
+        )
+        challenged = []
+        for member, result in zip(new_members, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Cannot restrict new member {member.id} in chat {chat_id}: {result}")
+                self.captcha.resolve(chat_id, member.id)
+            else:
+                challenged.append(member)
+        if challenged:
+            self.captcha_coalescer.add(bot, chat_id, challenged)
+    
+    async def send_captcha(self, bot, chat_id: int, new_members: List):
+        """Send one challenge message for a batch of new members."""
+        challenges = [self.captcha.get(chat_id, member.id) for member in new_members]
+        challenges = [challenge for challenge in challenges if challenge is not None]
+        if not challenges:
+            return
+        
+        answer, options = new_challenge()
+        for challenge in challenges:
+            challenge.answer = answer
+        pending = {challenge.user_id for challenge in challenges}
+        
+        try:
+            message = await bot.send_message(
+                chat_id,
+                CAPTCHA_TEXT.format(
+                    mentions=join_names(
+                        [member.mention_html() for member in new_members if member.id in pending],
+                        WELCOME_MAX_MENTIONS
+                    ),
+                    emoji=CHALLENGE_EMOJIS[answer],
+                    timeout=self.format_duration(round(challenges[0].expires_at - time.monotonic()))
+                ),
+                parse_mode=ParseMode.HTML,
+                reply_markup=captcha_keyboard(options)
+            )
+        except Exception:
+            # Let them in rather than kick them for a challenge they never saw
+            for challenge in challenges:
+                self.captcha.resolve(chat_id, challenge.user_id)
+            await asyncio.gather(
+                *(bot.restrict_chat_member(chat_id, user_id, UNMUTE_PERMISSIONS) for user_id in pending),
+                return_exceptions=True
+            )
+            raise
+        self.captcha.attach_message(challenges, message.message_id)
+    
+    async def captcha_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Check a new member's answer to their join challenge."""
+        query = update.callback_query
+        chat_id = update.effective_chat.id
+        user = query.from_user
+        
+        challenge = self.captcha.get(chat_id, user.id)
+        if challenge is None or challenge.message_id != query.message.message_id:
+            await query.answer("This challenge is for someone else.")
+            return
+        
+        self.captcha.resolve(chat_id, user.id)
+        if int(query.data.split(":")[1]) != challenge.answer:
+            await query.answer("❌ Wrong answer!")
+            try:
+                await self.kick_user(context.bot, chat_id, user.id)
+                await self.audit(chat_id, context.bot.id, user.id, audit.KICK, "Failed the join challenge")
+            except Exception as e:
+                logger.warning(f"Failed to kick user {user.id} from chat {chat_id}: {e}")
+            return
+        
+        await query.answer("✅ Verified, welcome!")
+        await context.bot.restrict_chat_member(chat_id, user.id, UNMUTE_PERMISSIONS)
+        if (await self.settings.get(chat_id)).welcome:
+            self.welcome_coalescer.add(context.bot, chat_id, [user])
+    
+    async def expire_captchas(self, challenges: List[Challenge]):
+        """Kick new members who didn't answer their challenge in time."""
+        bot = self.application.bot
+        user_ids: Dict[int, List[int]] = {}
+        for challenge in challenges:
+            user_ids.setdefault(challenge.chat_id, []).append(challenge.user_id)
+        
+        async def expire_chat(chat_id: int, members: List[int]):
+            result = await self.bulk_moderator.run(
+                members,
+                lambda user_id: self.kick_user(bot, chat_id, user_id),
+                on_success=lambda user_id: self.audit(
+                    chat_id, bot.id, user_id, audit.KICK, "Didn't answer the join challenge"
                 )
-                
-                # Create welcome buttons
-                keyboard = [
-                    [InlineKeyboardButton("📜 Read Rules", callback_data="show_rules")],
-                    [InlineKeyboardButton("👋 Say Hello", url=f"tg://user?id={new_member.id}")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                await update.message.reply_html(
-                    personalized_message,
-                    reply_markup=reply_markup
+            )
+            if result.failed:
+                logger.warning(f"Failed to kick {result.failed} unverified members from chat {chat_id}: {result.errors}")
+        
+        await asyncio.gather(*(expire_chat(chat_id, members) for chat_id, members in user_ids.items()))
+    
+    async def delete_captcha_messages(self, chat_id: int, message_ids: List[int]):
+        await self.application.bot.delete_messages(chat_id, message_ids, rate_limit_args=PRIORITY_COSMETIC)
+    
+    async def send_welcome(self, bot, chat_id: int, new_members: List):
+        """Send one welcome message for a batch of new members."""
+        template = await self.responses.welcome(chat_id)
+        
+        personalized_message = template.render(
+            username=join_names(
+                [html.escape(member.username or member.first_name) for member in new_members],
+                WELCOME_MAX_MENTIONS
+            ),
+            mention=join_names(
+                [member.mention_html() for member in new_members],
+                WELCOME_MAX_MENTIONS
+            )
+        )
+        
+        reply_markup = welcome_keyboard(new_members[0].id if len(new_members) == 1 else None)
+        
+        message = await bot.send_message(
+            chat_id,
+            personalized_message,
+            parse_mode=ParseMode.HTML,
+            reply_markup=reply_markup,
+            rate_limit_args=PRIORITY_COSMETIC
+        )
+        
+        # Keep only the latest welcome visible
+        previous_message_id = self.last_welcome.get(chat_id)
+        self.last_welcome[chat_id] = message.message_id
+        if WELCOME_DELETE_PREVIOUS and previous_message_id:
+            try:
+                await bot.delete_message(chat_id, previous_message_id, rate_limit_args=PRIORITY_COSMETIC)
+            except Exception:
+                pass
+    
+    async def antiflood_check(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Detect flooding and repeated messages and escalate automatically."""
+        message = update.message
+        user = update.effective_user
+        if message is None or user is None:
+            return
+        
+        content = message.text or message.caption or (message.sticker and message.sticker.file_unique_id)
+        verdict = self.flood_detector.check(message.chat_id, user.id, content)
+        if verdict is None or await self.is_admin(update, context):
+            return
+        
+        chat_id = message.chat_id
+        offense = self.flood_detector.record_offense(chat_id, user.id)
+        reason = "Flooding the chat" if verdict == FLOOD else "Repeating the same message"
+        
+        try:
+            await message.delete()
+        except Exception:
+            pass
+        
+        try:
+            if offense == 1:
+                text = await self.add_warning(context.bot, chat_id, user, f"{reason} (automatic)")
+            elif offense == 2:
+                await self.mute_user(context.bot, chat_id, user.id, FLOOD_MUTE_SECONDS)
+                await self.audit(chat_id, context.bot.id, user.id, audit.MUTE, f"{reason} (automatic)")
+                text = (
+                    f"🔇 User {user.mention_html()} has been muted for "
+                    f"{self.format_duration(FLOOD_MUTE_SECONDS)}!\nReason: {reason}"
+                )
+            else:
+                await context.bot.ban_chat_member(chat_id, user.id)
+                await self.audit(chat_id, context.bot.id, user.id, audit.BAN, f"{reason} (automatic)")
+                text = f"🚫 User {user.mention_html()} has been banned!\nReason: {reason}"
+        except Exception as e:
+            logger.warning(f"Anti-flood action failed for user {user.id} in chat {chat_id}: {e}")
+        else:
+            await context.bot.send_message(chat_id, text, parse_mode=ParseMode.HTML)
+        
+        # The message is gone, keep the blocklist from punishing it a second time
+        raise ApplicationHandlerStop
+    
+    async def blocklist_check(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Delete messages that match the chat's blocklist and punish the sender."""
+        message = update.message
+        user = update.effective_user
+        if user is None:
+            return
+        
+        chat_id = message.chat_id
+        chat_filter = await self.get_chat_filter(chat_id)
+        if chat_filter.empty:
+            return
+        
+        match = chat_filter.match(message.text or message.caption)
+        if match is None or await self.is_admin(update, context):
+            return
+        
+        try:
+            await message.delete()
+        except Exception:
+            pass
+        
+        reason = "Sending blocked content"
+        try:
+            if chat_filter.action == ACTION_WARN:
+                text = await self.add_warning(context.bot, chat_id, user, f"{reason} (automatic)")
+            elif chat_filter.action == ACTION_MUTE:
+                mute_duration = (await self.settings.get(chat_id)).mute_duration
+                await self.mute_user(context.bot, chat_id, user.id, mute_duration)
+                await self.audit(chat_id, context.bot.id, user.id, audit.MUTE, f"{reason} (automatic)")
+                text = (
+                    f"🔇 User {user.mention_html()} has been muted for "
+                    f"{self.format_duration(mute_duration)}!\nReason: {reason}"
                 )
+            else:
+                return
+        except Exception as e:
+            logger.warning(f"Filter action failed for user {user.id} in chat {chat_id}: {e}")
+            return
+        
+        await context.bot.send_message(chat_id, text, parse_mode=ParseMode.HTML)
     
     async def goodbye_member(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Say goodbye when a member leaves."""
         left_member = update.message.left_chat_member
         if left_member:
+            self.captcha.resolve(update.effective_chat.id, left_member.id)
+        if left_member and (await self.settings.get(update.effective_chat.id)).goodbye:
             goodbye_message = f"👋 Goodbye {left_member.mention_html()}! We'll miss you!"
-            await update.message.reply_html(goodbye_message)
+            await update.message.reply_html(goodbye_message, rate_limit_args=PRIORITY_COSMETIC)
     
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle button callbacks."""
         query = update.callback_query
+        if query.data.startswith("captcha:"):
+            await self.captcha_callback(update, context)
+            return
+        
         await query.answer()
         
         if query.data == "show_rules":
             chat_id = update.effective_chat.id
-            rules = group_rules.get(chat_id, "No rules set yet.")
-            await query.edit_message_text(f"📜 **Group Rules:**\n\n{rules}")
+            await query.edit_message_text(await self.responses.rules(chat_id), parse_mode=ParseMode.HTML)
         
         elif query.data == "admin_panel":
             if await self.is_admin(update, context):
-                admin_text = """
-🔧 **Admin Panel**
-
-Quick actions:
-• Use /warn @user to warn
-• Use /kick @user to kick
-• Use /purge to clean messages
-• Use /pin to pin important messages
-
-Settings:
-• /setrules - Configure group rules
-• /setwelcome - Set welcome message
-                """
-                await query.edit_message_text(admin_text)
+                await query.edit_message_text(ADMIN_PANEL_TEXT, parse_mode=ParseMode.HTML)
             else:
-                await query.edit_message_text("❌ Admin panel is only available for group admins")
+                await query.edit_message_text(ADMIN_PANEL_DENIED_TEXT)
+        
+        elif query.data.startswith("modlog:"):
+            if not await self.is_admin(update, context):
+                return
+            _, target_id, before_id = query.data.split(":")
+            text, reply_markup = await self.render_audit_page(
+                update.effective_chat.id, int(target_id) if target_id else None, int(before_id)
+            )
+            await query.edit_message_text(text, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
+    
+    async def track_users(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Record the usernames of every user seen in a chat."""
+        chat = update.effective_chat
+        if chat is None or chat.type == "private":
+            return
+        
+        if self.snapshot is not None and chat.id not in self.restored_chats:
+            self.restore_chat(chat.id)
+        
+        index = self.username_index
+        index.observe(chat.id, update.effective_user)
+        
+        message = update.effective_message
+        if message:
+            for new_member in message.new_chat_members or ():
+                index.observe(chat.id, new_member)
+                if new_member.id != context.bot.id:
+                    self.recent_joins.record(chat.id, new_member.id)
+            index.observe(chat.id, message.left_chat_member)
+            if message.reply_to_message:
+                index.observe(chat.id, message.reply_to_message.from_user)
+        
+        member_update = update.chat_member
+        if member_update:
+            index.observe(chat.id, member_update.new_chat_member.user)
+    
+    def resolve_target(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Return the user a command targets and the remaining arguments.
+        
+        The target is the author of the replied-to message, a text mention,
+        or an @username or numeric user ID given as the first argument.
+        """
+        args = context.args or []
+        message = update.message
+        
+        if message.reply_to_message:
+            return message.reply_to_message.from_user, args
+        
+        for entity in message.entities:
+            if entity.type == MessageEntity.TEXT_MENTION and entity.user:
+                mention_text = message.parse_entity(entity)
+                return entity.user, " ".join(args).replace(mention_text, "", 1).split()
+        
+        if args:
+            if args[0].startswith("@"):
+                user = self.username_index.resolve(update.effective_chat.id, args[0])
+                if user:
+                    return user, args[1:]
+            elif args[0].isdigit():
+                return User(id=int(args[0]), first_name=args[0], is_bot=False), args[1:]
+        
+        return None, args
+    
+    def target_usage(self, usage: str, context: ContextTypes.DEFAULT_TYPE) -> str:
+        """Explain why a command found no target user."""
+        if context.args and context.args[0].startswith("@"):
+            return f"❌ I haven't seen {context.args[0]} in this chat yet. Reply to one of their messages instead."
+        return f"Reply to a user's message or use: {usage}"
     
     async def is_admin(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
         """Check if user is admin."""
@@ -568,22 +1856,45 @@ Settings:
             return True
         
         try:
-            chat_member = await chat.get_member(user.id)
-            return chat_member.status in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]
-        except:
+            return await self.admin_cache.is_admin(context.bot, chat.id, user.id)
+        except Exception:
             return False
     
-    def clean_old_warnings(self, user_id: int):
-        """Remove warnings older than WARNING_EXPIRE_DAYS."""
-        if user_id in user_warnings:
-            cutoff_date = datetime.now() - timedelta(days=WARNING_EXPIRE_DAYS)
-            user_warnings[user_id] = [
-                warn for warn in user_warnings[user_id]
-                if warn > cutoff_date
-            ]
-            
-            if not user_warnings[user_id]:
-                del user_warnings[user_id]
+    async def track_admin_changes(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Invalidate the admin cache when someone gains or loses admin rights."""
+        member_update = update.chat_member or update.my_chat_member
+        was_admin = member_update.old_chat_member.status in ADMIN_STATUSES
+        is_admin = member_update.new_chat_member.status in ADMIN_STATUSES
+        
+        if was_admin != is_admin:
+            self.admin_cache.invalidate(member_update.chat.id)
+    
+    async def audit(self, chat_id: int, actor_id: int, target_id: Optional[int], action: str, reason: str = ""):
+        """Append a moderation action to the audit log."""
+        await self.storage.add_audit_event(
+            AuditEvent(chat_id, actor_id, target_id, action, reason, datetime.now().timestamp())
+        )
+    
+    async def kick_user(self, bot, chat_id: int, user_id: int):
+        """Remove a user from a chat without banning them."""
+        await bot.ban_chat_member(chat_id, user_id)
+        await bot.unban_chat_member(chat_id, user_id)
+    
+    async def mute_user(self, bot, chat_id: int, user_id: int, seconds: int):
+        """Restrict a user with MUTE_PERMISSIONS for `seconds`."""
+        until_date = datetime.now() + timedelta(seconds=seconds)
+        await bot.restrict_chat_member(
+            chat_id, user_id, MUTE_PERMISSIONS,
+            until_date=int(until_date.timestamp())
+        )
+    
+    def warning_cutoff(self, settings: ChatSettings) -> datetime:
+        """Return the time before which a chat's warnings have expired."""
+        return datetime.now() - timedelta(seconds=settings.warning_expiry)
+    
+    def parse_duration(self, text: str) -> Optional[int]:
+        """Parse durations like 30m, 1h, 2d or 1w into seconds."""
+        return parse_duration(text)
     
     def format_duration(self, seconds: int) -> str:
         """Format seconds into human readable duration."""
@@ -597,23 +1908,105 @@ Settings:
             return f"{seconds // 86400} days"
     
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Log errors."""
-        logger.error(f"Update {update} caused error {context.error}")
+        """Log errors as structured, rate-limited records."""
+        error = context.error
+        error_type = type(error).__name__
+        allowed, suppressed = self.error_log_limiter.allow(error_type)
+        if not allowed:
+            return
+        
+        record = {
+            "event": "handler_error",
+            "error_type": error_type,
+            "error": str(error),
+        }
+        if isinstance(update, Update):
+            record["update_id"] = update.update_id
+            if update.effective_chat:
+                record["chat_id"] = update.effective_chat.id
+            if update.effective_user:
+                record["user_id"] = update.effective_user.id
+        if suppressed:
+            record["suppressed"] = suppressed
+        
+        logger.error(json.dumps(record), exc_info=error)
     
     def run(self):
         """Run the bot."""
         print("🤖 GroupHelpBot is starting...")
         print("Press Ctrl+C to stop")
         
-        self.application.run_polling(allowed_updates=Update.ALL_TYPES)
-
-# Required imports for asyncio
-import asyncio
+        if RUN_MODE == "webhook":
+            asyncio.run(self.run_webhook())
+        else:
+            asyncio.run(self.run_polling())
+    
+    async def run_polling(self):
+        """Poll for updates until SIGINT/SIGTERM, then shut down gracefully."""
+        loop = asyncio.get_running_loop()
+        stop_event = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except NotImplementedError:
+                pass
+        
+        await self.application.initialize()
+        try:
+            await self.start_polling()
+            await stop_event.wait()
+        finally:
+            await self.stop_polling()
+    
+    async def run_webhook(self):
+        """Serve updates from a local webhook endpoint instead of polling."""
+        from webhook import WebhookServer, run_webhook
+        
+        server = WebhookServer(
+            self.application,
+            host=WEBHOOK_HOST,
+            port=WEBHOOK_PORT,
+            path=WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET_TOKEN
+        )
+        await run_webhook(
+            self.application, server,
+            webhook_url=WEBHOOK_URL,
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        )
 
 def main():
     """Start the bot."""
+    if WORKER_PROCESSES > 1:
+        from sharding import run_sharded
+        
+        print(f"🤖 GroupHelpBot is starting with {WORKER_PROCESSES} worker processes...")
+        asyncio.run(run_sharded(
+            BOT_TOKEN, WORKER_PROCESSES,
+            mode=RUN_MODE,
+            webhook_options={
+                "host": WEBHOOK_HOST,
+                "port": WEBHOOK_PORT,
+                "path": WEBHOOK_PATH,
+                "secret_token": WEBHOOK_SECRET_TOKEN
+            },
+            webhook_url=WEBHOOK_URL,
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        ))
+        return
+    
+    if BOTS_CONFIG:
+        print(f"🤖 GroupHelpBot is starting the bots in {BOTS_CONFIG}...")
+        from tenants import MultiBotRunner
+        
+        shared = create_shared_resources(SharedRequest(connection_pool_size=HTTP_POOL_SIZE))
+        asyncio.run(MultiBotRunner(BOTS_CONFIG, shared, check_interval=BOTS_CONFIG_CHECK_SECONDS).run())
+        return
+    
     bot = GroupHelpBot(BOT_TOKEN)
     bot.run()
 
 if __name__ == '__main__':
+    # tenants and sharding import GroupHelpBot from main; don't run this module twice
+    sys.modules.setdefault("main", sys.modules[__name__])
     main()
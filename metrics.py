@@ -0,0 +1,222 @@
+import asyncio
+import functools
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+from telegram.ext import ApplicationHandlerStop
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Gauge:
+    """A gauge whose value is read from a callback at scrape time."""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {value}",
+        ]
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # Per label set: bucket counts (with a final +Inf slot), sum and count
+        self.series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = ([0] * (len(self.buckets) + 1), [0.0, 0])
+        counts, totals = series
+        counts[bisect_left(self.buckets, value)] += 1
+        totals[0] += value
+        totals[1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, totals) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labels, label_values, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {totals[0]}")
+            lines.append(f"{self.name}_count{labels} {totals[1]}")
+        return lines
+
+
+class Metrics:
+    """Registry of the bot's metrics, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.handler_latency = Histogram(
+            "grouphelpbot_handler_duration_seconds", "Handler latency", ("handler",)
+        )
+        self.handler_errors = Counter(
+            "grouphelpbot_handler_errors_total", "Handler exceptions", ("handler",)
+        )
+        self.api_latency = Histogram(
+            "grouphelpbot_api_duration_seconds", "Bot API request latency", ("method",)
+        )
+        self.api_errors = Counter(
+            "grouphelpbot_api_errors_total", "Failed Bot API requests", ("method", "error")
+        )
+        self.loop_lag = Histogram(
+            "grouphelpbot_event_loop_lag_seconds", "Event loop scheduling delay",
+            buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+        )
+        self.gauges: List[Gauge] = []
+        self._lag_task: Optional[asyncio.Task] = None
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]):
+        """Register a gauge read from a callback at scrape time."""
+        self.gauges.append(Gauge(name, documentation, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.handler_latency, self.handler_errors, self.api_latency, self.api_errors, self.loop_lag):
+            lines.extend(metric.render())
+        for gauge in self.gauges:
+            lines.extend(gauge.render())
+        return "\n".join(lines) + "\n"
+
+    def instrument(self, name: str, callback: Callable) -> Callable:
+        """Wrap a handler callback to record its latency and errors."""
+        @functools.wraps(callback)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await callback(*args, **kwargs)
+            except ApplicationHandlerStop:
+                raise
+            except Exception:
+                self.handler_errors.inc(name)
+                raise
+            finally:
+                self.handler_latency.observe(time.perf_counter() - started, name)
+
+        return wrapper
+
+    def observe_api_call(self, method: str, seconds: float, error: Optional[BaseException] = None):
+        self.api_latency.observe(seconds, method)
+        if error is not None:
+            self.api_errors.inc(method, type(error).__name__)
+
+    def start_loop_monitor(self, interval: float = 0.5):
+        if self._lag_task is None:
+            self._lag_task = asyncio.get_running_loop().create_task(self._monitor_loop(interval))
+
+    async def stop_loop_monitor(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+            self._lag_task = None
+
+    async def _monitor_loop(self, interval: float):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag.observe(max(time.perf_counter() - started - interval, 0.0))
+
+
+class MetricsServer:
+    """Serves /metrics over HTTP."""
+
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: int = 9090):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        from aiohttp import web
+
+        async def handle_metrics(request):
+            return web.Response(text=self.metrics.render(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Metrics available at http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class ErrorLogLimiter:
+    """Allow at most `burst` log records per error type every `interval` seconds.
+
+    Suppressed records are counted and reported with the next record that
+    gets through, so a failure storm costs a few log lines, not thousands.
+    """
+
+    def __init__(self, burst: int = 10, interval: float = 60.0):
+        self.burst = burst
+        self.interval = interval
+        self._windows: Dict[str, List[float]] = {}
+
+    def allow(self, key: str) -> Tuple[bool, int]:
+        """Return whether to log now and how many records were suppressed before."""
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = int(window[2]) if window else 0
+            self._windows[key] = [now, 1, 0]
+            return True, suppressed
+        if window[1] < self.burst:
+            window[1] += 1
+            return True, 0
+        window[2] += 1
+        return False, 0
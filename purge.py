@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from typing import List, NamedTuple
+
+from telegram import Bot
+from telegram.error import TelegramError
+
+from apiutil import call_with_retry
+
+logger = logging.getLogger(__name__)
+
+# Bot API limit for a single deleteMessages call
+MAX_BATCH_SIZE = 100
+
+
+class PurgeResult(NamedTuple):
+    # IDs in batches Telegram accepted; some may not have existed any more
+    requested: int
+    skipped: int
+
+
+def chunk_message_ids(start_id: int, end_id: int, size: int = MAX_BATCH_SIZE) -> List[List[int]]:
+    """Split the message ID range [start_id, end_id) into batches."""
+    return [
+        list(range(batch_start, min(batch_start + size, end_id)))
+        for batch_start in range(start_id, end_id, size)
+    ]
+
+
+class PurgeEngine:
+    """Delete message ranges with batched deleteMessages calls.
+
+    Batches are sent with at most `concurrency` requests in flight and are
+    retried on RetryAfter. A batch that still fails, or that Telegram
+    doesn't confirm, is counted as skipped. deleteMessages silently ignores
+    IDs that no longer exist or are too old, so the number actually deleted
+    is unknown and `requested` counts the IDs of every accepted batch.
+    """
+
+    def __init__(self, concurrency: int = 4, batch_size: int = MAX_BATCH_SIZE, retries: int = 3):
+        self.concurrency = concurrency
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.retries = retries
+
+    async def purge(self, bot: Bot, chat_id: int, start_id: int, end_id: int) -> PurgeResult:
+        """Delete every message with start_id <= message_id < end_id."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def delete_batch(message_ids: List[int]) -> int:
+            async with semaphore:
+                try:
+                    deleted = await call_with_retry(
+                        lambda: bot.delete_messages(chat_id, message_ids),
+                        retries=self.retries
+                    )
+                    return len(message_ids) if deleted else 0
+                except TelegramError as e:
+                    logger.warning(
+                        f"Failed to delete messages {message_ids[0]}-{message_ids[-1]} "
+                        f"in chat {chat_id}: {e}"
+                    )
+                    return 0
+
+        batches = chunk_message_ids(start_id, end_id, self.batch_size)
+        requested = sum(await asyncio.gather(*(delete_batch(batch) for batch in batches)))
+        return PurgeResult(requested=requested, skipped=max(end_id - start_id, 0) - requested)
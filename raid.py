@@ -0,0 +1,117 @@
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class JoinRing:
+    """Ring buffers of the last joins of one chat: their times and user IDs."""
+
+    __slots__ = ("times", "users", "index")
+
+    def __init__(self, size: int):
+        self.times = array("d", bytes(8 * size))
+        self.users = array("q", bytes(8 * size))
+        self.index = 0
+
+
+class RaidState:
+    """An ongoing raid: when it started and who joined during it."""
+
+    __slots__ = ("started_at", "joiners")
+
+    def __init__(self, started_at: float, joiners: Iterable[int] = ()):
+        self.started_at = started_at
+        # dict as an insertion-ordered set
+        self.joiners: Dict[int, None] = dict.fromkeys(joiners)
+
+
+class RaidDetector:
+    """Per-chat join-rate detection for raids.
+
+    A raid starts when `threshold` joins arrive within `window` seconds.
+    Like the flood detector, each chat keeps a ring of exactly the last
+    `threshold` join times, so a join costs one comparison against the
+    oldest entry and no API calls. The users of those joins and of every
+    join during the raid are queued, at most `max_joiners` of them, for
+    optional bulk removal.
+    """
+
+    def __init__(self, threshold: int = 10, window: float = 60.0, max_joiners: int = 1000, max_chats: int = 100000):
+        self.threshold = threshold
+        self.window = window
+        self.max_joiners = max_joiners
+        self.max_chats = max_chats
+        self._rings: "OrderedDict[int, JoinRing]" = OrderedDict()
+        self.raids: Dict[int, RaidState] = {}
+
+    def _ring(self, chat_id: int) -> JoinRing:
+        ring = self._rings.get(chat_id)
+        if ring is None:
+            ring = self._rings[chat_id] = JoinRing(self.threshold)
+            if len(self._rings) > self.max_chats:
+                self._rings.popitem(last=False)
+        else:
+            self._rings.move_to_end(chat_id)
+        return ring
+
+    def is_active(self, chat_id: int) -> bool:
+        return chat_id in self.raids
+
+    def record_join(self, chat_id: int, user_id: int, now: Optional[float] = None) -> bool:
+        """Record a join and return True if it starts a raid."""
+        raid = self.raids.get(chat_id)
+        if raid is not None:
+            if len(raid.joiners) < self.max_joiners:
+                raid.joiners[user_id] = None
+            return False
+
+        now = time.monotonic() if now is None else now
+        ring = self._ring(chat_id)
+        ring.times[ring.index] = now
+        ring.users[ring.index] = user_id
+        ring.index = (ring.index + 1) % self.threshold
+        # The slot after the newest entry holds the oldest of the last `threshold` joins
+        oldest = ring.times[ring.index]
+        if not oldest or now - oldest >= self.window:
+            return False
+
+        users = ring.users[ring.index:] + ring.users[:ring.index]
+        self.raids[chat_id] = RaidState(now, users)
+        del self._rings[chat_id]
+        return True
+
+    def restore(self, chat_id: int, joins: List[Tuple[float, int]]):
+        """Refill a chat's ring from earlier (join time, user ID) pairs, oldest first.
+
+        Unlike record_join(), this never starts a raid; a raid still under
+        way in the restored joins starts with the next join.
+        """
+        if chat_id in self.raids:
+            return
+        ring = self._ring(chat_id)
+        for joined_at, user_id in joins[-self.threshold:]:
+            ring.times[ring.index] = joined_at
+            ring.users[ring.index] = user_id
+            ring.index = (ring.index + 1) % self.threshold
+
+    def start(self, chat_id: int, now: Optional[float] = None) -> RaidState:
+        """Start a raid manually, or return the ongoing one."""
+        raid = self.raids.get(chat_id)
+        if raid is None:
+            raid = self.raids[chat_id] = RaidState(time.monotonic() if now is None else now)
+            self._rings.pop(chat_id, None)
+        return raid
+
+    def lift(self, chat_id: int) -> Optional[RaidState]:
+        """End a raid and return its state, or None if there was none."""
+        return self.raids.pop(chat_id, None)
+
+    def take_joiners(self, chat_id: int) -> List[int]:
+        """Return and clear the users queued during a chat's raid."""
+        raid = self.raids.get(chat_id)
+        if raid is None:
+            return []
+        joiners = list(raid.joiners)
+        raid.joiners.clear()
+        return joiners
@@ -0,0 +1,273 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, lower values are sent first
+PRIORITY_MODERATION = 0
+PRIORITY_NORMAL = 1
+PRIORITY_COSMETIC = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_MODERATION: "moderation",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_COSMETIC: "cosmetic",
+}
+
+MODERATION_ENDPOINTS = frozenset({
+    "banChatMember",
+    "unbanChatMember",
+    "restrictChatMember",
+    "setChatPermissions",
+    "deleteMessage",
+    "deleteMessages",
+    "answerCallbackQuery",
+})
+
+# Endpoints that post a message into a chat and count toward per-chat limits
+MESSAGE_ENDPOINTS = frozenset({
+    "copyMessage",
+    "copyMessages",
+    "forwardMessage",
+    "forwardMessages",
+})
+
+
+class PriorityTokenBucket:
+    """Token bucket whose waiters are served in priority order.
+
+    Requests that find a free token and no queued waiters pass straight
+    through. Otherwise they are queued and a single pump task hands out
+    tokens as they refill, highest priority first and FIFO within a lane.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._pump_task: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def idle(self) -> bool:
+        self._refill(time.monotonic())
+        return not self._waiters and self.tokens >= self.capacity
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _try_take(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds`, e.g. after a RetryAfter."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL):
+        """Wait until a token is available for a request of the given priority."""
+        if not self._waiters and self._try_take() == 0:
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.get_running_loop().create_task(self._pump())
+        await future
+
+    async def _pump(self):
+        while self._waiters:
+            if self._waiters[0][2].done():
+                # The waiter was cancelled
+                heapq.heappop(self._waiters)
+                continue
+            delay = self._try_take()
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+
+
+class WaitStats:
+    """Running count, total and maximum of queue wait times."""
+
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+        }
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """Outbound scheduler for Bot API requests.
+
+    Every request takes a token from a global bucket (30/s by default).
+    Messages posted into a chat additionally take a token from that chat's
+    bucket (20/min for groups, 1/s for private chats). Group buckets hold
+    `group_burst` tokens and refill with the rest of the per-minute limit,
+    so no 60 second window sees more than the limit. Moderation endpoints
+    are sent ahead of normal replies, which are sent ahead of cosmetic
+    messages such as welcomes; callers can pick a lane explicitly by passing
+    one of the PRIORITY_* constants as `rate_limit_args`. RetryAfter errors
+    pause the affected bucket and the request is retried.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        group_rate: float = 20 / 60,
+        group_burst: float = 3.0,
+        private_rate: float = 1.0,
+        private_burst: float = 1.0,
+        max_retries: int = 3,
+        max_chats: int = 10000,
+        metrics=None,
+    ):
+        if group_burst >= group_rate * 60:
+            raise ValueError("group_burst must be less than the per-minute group limit")
+        # A full bucket plus a minute of refill must fit in the per-minute limit
+        self.group_rate = group_rate - group_burst / 60
+        self.group_burst = group_burst
+        self.private_rate = private_rate
+        self.private_burst = private_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self.global_bucket = PriorityTokenBucket(global_rate, global_rate)
+        self.chat_buckets: Dict[Union[int, str], PriorityTokenBucket] = {}
+        self.wait_stats = {priority: WaitStats() for priority in PRIORITY_NAMES}
+        self.retry_after_count = 0
+        self.metrics = metrics
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> PriorityTokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= self.max_chats:
+                self._prune_idle_buckets()
+            if isinstance(chat_id, str) or chat_id < 0:
+                bucket = PriorityTokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = PriorityTokenBucket(self.private_rate, self.private_burst)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _prune_idle_buckets(self):
+        """Drop buckets that are full and have nobody waiting."""
+        for chat_id in [chat_id for chat_id, bucket in self.chat_buckets.items() if bucket.idle]:
+            del self.chat_buckets[chat_id]
+
+    @staticmethod
+    def default_priority(endpoint: str) -> int:
+        if endpoint in MODERATION_ENDPOINTS:
+            return PRIORITY_MODERATION
+        return PRIORITY_NORMAL
+
+    @staticmethod
+    def is_message_endpoint(endpoint: str) -> bool:
+        return endpoint.startswith("send") or endpoint in MESSAGE_ENDPOINTS
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Any:
+        priority = rate_limit_args if rate_limit_args is not None else self.default_priority(endpoint)
+
+        chat_bucket = None
+        chat_id = data.get("chat_id")
+        if chat_id is not None and self.is_message_endpoint(endpoint):
+            try:
+                chat_id = int(chat_id)
+            except (TypeError, ValueError):
+                pass
+            chat_bucket = self._chat_bucket(chat_id)
+
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            if chat_bucket is not None:
+                await chat_bucket.acquire(priority)
+            await self.global_bucket.acquire(priority)
+            self.wait_stats[priority].record(time.monotonic() - started)
+
+            try:
+                return await self._call(endpoint, callback, args, kwargs)
+            except RetryAfter as e:
+                self.retry_after_count += 1
+                if attempt == self.max_retries:
+                    raise
+                logger.info(f"{endpoint} hit flood control, retrying in {e.retry_after}s")
+                (chat_bucket or self.global_bucket).pause(e.retry_after)
+
+    async def _call(self, endpoint: str, callback: Callable[..., Coroutine[Any, Any, Any]],
+                    args: Any, kwargs: Dict[str, Any]) -> Any:
+        """Make the request, recording its latency and outcome if metrics are set."""
+        if self.metrics is None:
+            return await callback(*args, **kwargs)
+
+        started = time.monotonic()
+        try:
+            result = await callback(*args, **kwargs)
+        except Exception as e:
+            self.metrics.observe_api_call(endpoint, time.monotonic() - started, e)
+            raise
+        self.metrics.observe_api_call(endpoint, time.monotonic() - started)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depths and wait-time statistics."""
+        return {
+            "global_queue_depth": self.global_bucket.depth,
+            "chat_queue_depth": sum(bucket.depth for bucket in self.chat_buckets.values()),
+            "tracked_chats": len(self.chat_buckets),
+            "retry_after": self.retry_after_count,
+            "wait": {
+                PRIORITY_NAMES[priority]: stats.as_dict()
+                for priority, stats in self.wait_stats.items()
+            },
+        }
@@ -0,0 +1,41 @@
+import ssl
+from typing import Optional
+
+import httpx
+from telegram.request import HTTPXRequest
+
+_ssl_context: Optional[ssl.SSLContext] = None
+
+
+def shared_ssl_context() -> ssl.SSLContext:
+    """Return the SSL context of the process, loading the CA bundle on first use."""
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = httpx.create_ssl_context()
+    return _ssl_context
+
+
+class Request(HTTPXRequest):
+    """HTTPXRequest whose clients all use one SSL context.
+
+    httpx loads the CA bundle again for every client, which takes tens of
+    milliseconds. Each bot has two clients, one for getUpdates, and
+    rebuilds them when it restarts.
+    """
+
+    def _build_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(verify=shared_ssl_context(), **self._client_kwargs)
+
+
+class SharedRequest(Request):
+    """HTTPXRequest used by several bots at once.
+
+    Bots shut down their requests when they stop, which must not close the
+    pool under the bots that keep running. Its owner calls close() instead.
+    """
+
+    async def shutdown(self):
+        pass
+
+    async def close(self):
+        await super().shutdown()
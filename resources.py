@@ -0,0 +1,44 @@
+import asyncio
+from typing import Optional
+
+from admin_cache import AdminCache
+from request import SharedRequest
+from storage import Storage
+from user_index import UsernameIndex
+
+
+class SharedResources:
+    """State that every bot of a process can share.
+
+    Holds the storage backend, the admin cache, the username index and
+    optionally the HTTP connection pool for Bot API requests. Bots call
+    acquire() from post_init and release() from post_shutdown; the first
+    acquire opens the backend and loads the username index, the last
+    release flushes and closes them.
+    """
+
+    def __init__(self, storage: Storage, admin_cache: AdminCache, username_index: UsernameIndex,
+                 request: Optional[SharedRequest] = None, username_index_path: Optional[str] = None):
+        self.storage = storage
+        self.admin_cache = admin_cache
+        self.username_index = username_index
+        self.request = request
+        self.username_index_path = username_index_path
+        self._users = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            if not self._users:
+                await self.storage.start()
+                if self.username_index_path:
+                    self.username_index.load_file(self.username_index_path)
+            self._users += 1
+
+    async def release(self):
+        async with self._lock:
+            self._users -= 1
+            if not self._users:
+                await self.storage.close()
+                if self.username_index_path:
+                    self.username_index.save_file(self.username_index_path)
@@ -0,0 +1,221 @@
+import html
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from captcha import CHALLENGE_EMOJIS
+from welcome import WelcomeTemplate, compile_template
+
+# Static texts are HTML and must be sent with ParseMode.HTML
+
+START_PRIVATE_TEXT = """
+👋 Hello {mention}!
+
+🤖 I'm GroupHelpBot - Your friendly group management assistant!
+
+📋 <b>Available Commands:</b>
+• /help - Show all commands
+• /rules - Show group rules
+• /warn @user - Warn a user
+• /warnings @user - Check user warnings
+• /kick @user - Kick a user
+• /ban @user - Ban a user
+• /mute @user [time] - Mute a user
+• /unmute @user - Unmute a user
+
+🔧 <b>Admin Commands:</b>
+• /setrules [rules] - Set group rules
+• /setwelcome [message] - Set welcome message
+• /addfilter [words] - Block words in this group
+• /purge [number] - Delete multiple messages
+• /promote @user - Promote to admin
+• /demote @user - Remove admin
+• /pin - Pin current message
+• /unpin - Unpin current message
+
+Add me to your group and make me admin to start managing!
+"""
+
+START_GROUP_TEXT = "Hello! I'm here to help manage this group. Use /help to see all available commands."
+
+HELP_TEXT = """
+📚 <b>GroupHelpBot Commands:</b>
+
+👥 <b>Basic Commands:</b>
+• /rules - Show group rules
+• /help - Show this help message
+
+⚡ <b>Moderation Commands:</b>
+• /warn @user [reason] - Warn a user
+• /warnings @user - Check user warnings
+• /kick @user [reason] - Kick a user from group
+• /ban @user [reason] - Ban a user from group
+• /mute @user [1h/1d/1w] - Mute a user
+• /unmute @user - Unmute a user
+• /tmute @user [30m/1h/1d] - Mute a user, unmuted automatically
+• /tban @user [30m/1h/1d] - Ban a user, unbanned automatically
+• /jobs - List pending unmutes and unbans
+• /canceljob [id] - Cancel a pending job
+• /purge [number] - Delete multiple messages
+• /massban [IDs/@users/joined:10m] [reason] - Ban many users
+• /masskick [IDs/@users/joined:10m] [reason] - Kick many users
+• /massmute [IDs/@users/joined:10m] [1h/1d/1w] - Mute many users
+• /raid [on/off/kick/ban] - Raid mode status and controls
+• /modlog - Show the moderation log
+• /history @user - Show a user's moderation history
+
+⚙️ <b>Admin Commands:</b>
+• /setrules [rules] - Set group rules
+• /setwelcome [message] - Set welcome message
+• /settings - Show this chat's settings
+• /set [setting] [value] - Change a setting
+• /set captcha on - Verify new members with a button challenge
+• /addfilter [words] - Block words
+• /addregex [pattern] - Block a regular expression
+• /delfilter [word/pattern] - Remove a filter
+• /filters - List active filters
+• /filterlinks on/off - Block links
+• /filteraction delete/warn/mute - Action on a match
+• /promote @user - Promote user to admin
+• /demote @user - Remove admin rights
+• /pin - Pin current message
+• /unpin - Unpin current message
+
+💡 <b>Tips:</b>
+• Make sure I have admin privileges for full functionality
+• Use @username to mention users
+• Time formats for mute: 1h, 2d, 1w
+"""
+
+ADMIN_PANEL_TEXT = """
+🔧 <b>Admin Panel</b>
+
+Quick actions:
+• Use /warn @user to warn
+• Use /kick @user to kick
+• Use /purge to clean messages
+• Use /pin to pin important messages
+
+Settings:
+• /setrules - Configure group rules
+• /setwelcome - Set welcome message
+• /settings - Show chat settings
+"""
+
+ADMIN_PANEL_DENIED_TEXT = "❌ Admin panel is only available for group admins"
+
+RULES_HEADER = "📜 <b>Group Rules:</b>\n\n"
+NO_RULES_TEXT = RULES_HEADER + "No rules set yet. Admins can set rules using /setrules"
+
+CAPTCHA_TEXT = "🤖 {mentions}, tap {emoji} within {timeout} to show you're human and start chatting."
+
+WELCOME_KEYBOARD = InlineKeyboardMarkup([[InlineKeyboardButton("📜 Read Rules", callback_data="show_rules")]])
+
+
+def help_keyboard(bot_username: Optional[str]) -> InlineKeyboardMarkup:
+    """Build the keyboard attached to /help, linking to the bot's add-to-group page."""
+    keyboard = [
+        [InlineKeyboardButton("📜 Rules", callback_data="show_rules")],
+        [InlineKeyboardButton("👮 Admin Panel", callback_data="admin_panel")],
+    ]
+    if bot_username:
+        keyboard.append([InlineKeyboardButton("➕ Add to Group", url=f"https://t.me/{bot_username}?startgroup=true")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def welcome_keyboard(user_id: Optional[int] = None) -> InlineKeyboardMarkup:
+    """Return the welcome keyboard, with a "Say Hello" button for a single new member."""
+    if user_id is None:
+        return WELCOME_KEYBOARD
+    return InlineKeyboardMarkup([
+        *WELCOME_KEYBOARD.inline_keyboard,
+        [InlineKeyboardButton("👋 Say Hello", url=f"tg://user?id={user_id}")],
+    ])
+
+
+def captcha_keyboard(options: List[int]) -> InlineKeyboardMarkup:
+    """Build the emoji buttons of a join challenge."""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton(CHALLENGE_EMOJIS[option], callback_data=f"captcha:{option}") for option in options
+    ]])
+
+
+def older_events_keyboard(target_id: Optional[int], before_id: int) -> InlineKeyboardMarkup:
+    """Build the button that pages /modlog and /history back to older events."""
+    data = f"modlog:{'' if target_id is None else target_id}:{before_id}"
+    return InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Older", callback_data=data)]])
+
+
+def render_rules(rules: Optional[str]) -> str:
+    """Render a chat's rules as an HTML message."""
+    if not rules:
+        return NO_RULES_TEXT
+    return RULES_HEADER + html.escape(rules)
+
+
+class ResponseCache:
+    """Per-chat cache of rendered rules and compiled welcome templates.
+
+    Entries are loaded from storage on first use, kept in LRU order and
+    dropped by invalidate() whenever an admin changes them.
+    """
+
+    def __init__(self, load_rules: Callable[[int], Awaitable[Optional[str]]],
+                 load_welcome: Callable[[int], Awaitable[Optional[str]]],
+                 default_welcome: str, max_chats: int = 10000):
+        self.load_rules = load_rules
+        self.load_welcome = load_welcome
+        self.default_welcome = default_welcome
+        self.max_chats = max_chats
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, Tuple[Optional[str], Optional[WelcomeTemplate]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, chat_id: int, index: int):
+        entry = self._entries.get(chat_id)
+        if entry is None or entry[index] is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(chat_id)
+        return entry[index]
+
+    def _set(self, chat_id: int, index: int, value):
+        entry = list(self._entries.get(chat_id, (None, None)))
+        entry[index] = value
+        self._entries[chat_id] = tuple(entry)
+        self._entries.move_to_end(chat_id)
+        while len(self._entries) > self.max_chats:
+            self._entries.popitem(last=False)
+
+    async def rules(self, chat_id: int) -> str:
+        """Return the rendered rules message of a chat."""
+        text = self._get(chat_id, 0)
+        if text is None:
+            text = render_rules(await self.load_rules(chat_id))
+            self._set(chat_id, 0, text)
+        return text
+
+    async def welcome(self, chat_id: int) -> WelcomeTemplate:
+        """Return the compiled welcome template of a chat."""
+        template = self._get(chat_id, 1)
+        if template is None:
+            template = compile_template(await self.load_welcome(chat_id) or self.default_welcome)
+            self._set(chat_id, 1, template)
+        return template
+
+    def invalidate(self, chat_id: int):
+        """Drop the cached responses of a chat."""
+        self._entries.pop(chat_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the number of cached chats."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "chats": len(self._entries),
+        }
@@ -0,0 +1,159 @@
+import asyncio
+import heapq
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """A delayed action, e.g. lifting a mute at `run_at` (seconds since the epoch)."""
+
+    __slots__ = ("job_id", "run_at", "kind", "chat_id", "user_id", "payload")
+
+    def __init__(self, job_id: str, run_at: float, kind: str, chat_id: int,
+                 user_id: Optional[int] = None, payload: Optional[dict] = None):
+        self.job_id = job_id
+        self.run_at = run_at
+        self.kind = kind
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.payload = payload or {}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Job":
+        return cls(**data)
+
+    def to_dict(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class Scheduler:
+    """Persistent scheduler for delayed moderation actions.
+
+    Jobs are kept in a min-heap ordered by due time and mirrored to the
+    storage backend, so they survive restarts. A single task sleeps until
+    the earliest job is due and then runs every due job, up to `batch_size`
+    at a time, concurrently. Cancelled jobs are skipped lazily when they
+    reach the top of the heap.
+
+    When several processes share the storage backend, `owns(chat_id)`
+    selects the persisted jobs this one loads and runs.
+    """
+
+    def __init__(self, storage, batch_size: int = 100, owns: Optional[Callable[[int], bool]] = None):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.owns = owns or (lambda chat_id: True)
+        self.handlers: Dict[str, Callable[[Job], Awaitable[None]]] = {}
+        self.jobs: Dict[str, Job] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.jobs)
+
+    def register(self, kind: str, handler: Callable[[Job], Awaitable[None]]):
+        """Set the coroutine function that runs jobs of a kind."""
+        self.handlers[kind] = handler
+
+    async def start(self):
+        """Load persisted jobs and start dispatching."""
+        for data in await self.storage.load_jobs():
+            if self.owns(data["chat_id"]):
+                self._push(Job.from_dict(data))
+        if self.jobs:
+            logger.info(f"Restored {len(self.jobs)} scheduled jobs")
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop dispatching. Pending jobs stay persisted."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _push(self, job: Job):
+        self.jobs[job.job_id] = job
+        if not self._heap or job.run_at < self._heap[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self._heap, (job.run_at, job.job_id))
+
+    async def schedule(self, kind: str, delay: float, chat_id: int,
+                       user_id: Optional[int] = None, payload: Optional[dict] = None) -> Job:
+        """Schedule a job to run `delay` seconds from now."""
+        # Full UUIDs: the jobs table is shared by every namespace and worker
+        job = Job(uuid.uuid4().hex, time.time() + delay, kind, chat_id, user_id, payload)
+        self._push(job)
+        await self.storage.save_job(job.to_dict())
+        return job
+
+    async def reschedule(self, kind: str, delay: float, chat_id: int,
+                         user_id: Optional[int] = None, payload: Optional[dict] = None) -> Job:
+        """Replace any pending job of the same kind for the same chat and user."""
+        for job in self.find(chat_id, kind=kind, user_id=user_id):
+            await self.cancel(job.job_id)
+        return await self.schedule(kind, delay, chat_id, user_id, payload)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a pending job and return whether it existed."""
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            return False
+        await self.storage.delete_job(job_id)
+        return True
+
+    def find(self, chat_id: int, kind: Optional[str] = None, user_id: Optional[int] = None) -> List[Job]:
+        """Return the pending jobs of a chat, earliest first."""
+        return sorted(
+            (
+                job for job in self.jobs.values()
+                if job.chat_id == chat_id
+                and (kind is None or job.kind == kind)
+                and (user_id is None or job.user_id == user_id)
+            ),
+            key=lambda job: job.run_at
+        )
+
+    def _pop_due(self, now: float) -> List[Job]:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            run_at, job_id = heapq.heappop(self._heap)
+            job = self.jobs.get(job_id)
+            # Skip cancelled jobs and stale entries of rescheduled ones
+            if job is not None and job.run_at == run_at:
+                del self.jobs[job_id]
+                due.append(job)
+        return due
+
+    async def _execute(self, job: Job):
+        handler = self.handlers.get(job.kind)
+        try:
+            if handler is None:
+                logger.error(f"No handler for scheduled job kind {job.kind}")
+            else:
+                await handler(job)
+        except Exception as e:
+            logger.error(f"Scheduled {job.kind} job {job.job_id} in chat {job.chat_id} failed: {e}")
+        finally:
+            await self.storage.delete_job(job.job_id)
+
+    async def _run(self):
+        while True:
+            due = self._pop_due(time.time())
+            if due:
+                await asyncio.gather(*(self._execute(job) for job in due))
+                continue
+
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
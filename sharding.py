@@ -0,0 +1,270 @@
+import asyncio
+import contextlib
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+from typing import List, Optional
+
+from aiohttp import web
+from telegram import Bot, Update
+
+from webhook import WebhookServer
+
+logger = logging.getLogger(__name__)
+
+# Update fields that carry the chat an update belongs to
+CHAT_FIELDS = (
+    "message",
+    "edited_message",
+    "channel_post",
+    "edited_channel_post",
+    "chat_member",
+    "my_chat_member",
+    "chat_join_request",
+    "message_reaction",
+    "message_reaction_count",
+    "chat_boost",
+    "removed_chat_boost",
+)
+
+
+def shard_key(data: dict) -> int:
+    """Return the ID used to route an update, preferring its chat ID."""
+    for field in CHAT_FIELDS:
+        payload = data.get(field)
+        if payload and "chat" in payload:
+            return payload["chat"]["id"]
+
+    callback_query = data.get("callback_query")
+    if callback_query:
+        message = callback_query.get("message")
+        if message and "chat" in message:
+            return message["chat"]["id"]
+        return callback_query["from"]["id"]
+
+    for payload in data.values():
+        if isinstance(payload, dict) and "from" in payload:
+            return payload["from"]["id"]
+    return data.get("update_id", 0)
+
+
+def shard_for(data: dict, workers: int) -> int:
+    """Return the index of the worker that owns an update's chat."""
+    return shard_key(data) % workers
+
+
+def run_worker(token: str, index: int, workers: int, updates: multiprocessing.Queue):
+    """Entry point of a worker process."""
+    # Give every worker its own metrics port
+    metrics_port = int(os.getenv("METRICS_PORT", "0"))
+    if metrics_port:
+        os.environ["METRICS_PORT"] = str(metrics_port + index)
+
+    # main's own basicConfig already ran when spawn imported it as __mp_main__
+    logging.basicConfig(
+        format=f'%(asctime)s - worker-{index} - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO,
+        force=True
+    )
+    asyncio.run(_serve_worker(token, index, workers, updates))
+
+
+async def _serve_worker(token: str, index: int, workers: int, updates: multiprocessing.Queue):
+    # Imported here so the ingress process doesn't build any handlers
+    from main import RATE_LIMIT_GLOBAL, GroupHelpBot
+
+    # All workers send with the same token, so they split its global limit
+    application = GroupHelpBot(
+        token, rate_limit_global=RATE_LIMIT_GLOBAL / workers, worker=index, workers=workers
+    ).application
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGINT, lambda: None)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    try:
+        while True:
+            data = await loop.run_in_executor(None, updates.get)
+            if data is None:
+                break
+            update = Update.de_json(data, application.bot)
+            if update is not None:
+                await application.update_queue.put(update)
+    finally:
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+class ShardSupervisor:
+    """Run worker processes and route raw updates to them by chat ID.
+
+    Every chat maps to exactly one worker, so updates of a chat are handled
+    in order by a single process that owns all of that chat's state.
+    Crashed workers are restarted and resume from their queue, which lives
+    in the supervisor process. Each worker gets an equal share of
+    RATE_LIMIT_GLOBAL, since they all call the Bot API with one token.
+    """
+
+    def __init__(self, token: str, workers: int, queue_size: int = 10000, check_interval: float = 1.0):
+        self.token = token
+        self.workers = workers
+        self.check_interval = check_interval
+        self._context = multiprocessing.get_context("spawn")
+        self.queues: List[multiprocessing.Queue] = [
+            self._context.Queue(maxsize=queue_size) for _ in range(workers)
+        ]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self.restarts = 0
+        self._stopping = False
+        self._monitor: Optional[asyncio.Task] = None
+
+    def _spawn(self, index: int):
+        process = self._context.Process(
+            target=run_worker,
+            args=(self.token, index, self.workers, self.queues[index]),
+            name=f"grouphelpbot-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info(f"Started worker {index} (pid {process.pid})")
+
+    @property
+    def alive(self) -> bool:
+        return all(process is not None and process.is_alive() for process in self.processes)
+
+    async def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+        self._monitor = asyncio.get_running_loop().create_task(self._supervise())
+
+    async def _supervise(self):
+        while not self._stopping:
+            await asyncio.sleep(self.check_interval)
+            for index, process in enumerate(self.processes):
+                if not self._stopping and not process.is_alive():
+                    logger.error(f"Worker {index} exited with code {process.exitcode}, restarting")
+                    self.restarts += 1
+                    self._spawn(index)
+
+    async def dispatch(self, data: dict):
+        """Queue a raw update for the worker that owns its chat."""
+        updates = self.queues[shard_for(data, self.workers)]
+        try:
+            updates.put_nowait(data)
+        except queue.Full:
+            # Apply backpressure to the ingress until the worker catches up
+            await asyncio.get_running_loop().run_in_executor(None, updates.put, data)
+
+    async def stop(self, timeout: float = 30.0):
+        """Ask every worker to finish its queue and exit."""
+        self._stopping = True
+        if self._monitor is not None:
+            self._monitor.cancel()
+        for updates in self.queues:
+            updates.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+
+
+class ShardedWebhookServer(WebhookServer):
+    """Webhook server that forwards raw updates to the shard supervisor."""
+
+    def __init__(self, supervisor: ShardSupervisor, **kwargs):
+        super().__init__(application=None, **kwargs)
+        self.supervisor = supervisor
+
+    async def dispatch(self, data: dict):
+        if "update_id" not in data:
+            raise ValueError("Missing update_id")
+        await self.supervisor.dispatch(data)
+
+    async def handle_ready(self, request: web.Request) -> web.Response:
+        if self.supervisor.alive:
+            return web.Response(text="ready")
+        return web.Response(status=503, text="not ready")
+
+
+async def poll_updates(bot: Bot, supervisor: ShardSupervisor, stop_event: asyncio.Event, timeout: int = 30):
+    """Long-poll getUpdates and forward every update to the supervisor."""
+    offset = None
+    try:
+        while not stop_event.is_set():
+            try:
+                updates = await bot.get_updates(
+                    offset=offset,
+                    timeout=timeout,
+                    read_timeout=timeout + 10,
+                    allowed_updates=Update.ALL_TYPES
+                )
+            except Exception as e:
+                logger.error(f"Failed to fetch updates: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            for update in updates:
+                await supervisor.dispatch(update.to_dict())
+                offset = update.update_id + 1
+    finally:
+        if offset is not None:
+            # Confirm the last forwarded update so it isn't delivered again
+            await bot.get_updates(offset=offset, timeout=0)
+
+
+async def run_sharded(
+    token: str,
+    workers: int,
+    mode: str = "polling",
+    webhook_options: Optional[dict] = None,
+    webhook_url: Optional[str] = None,
+    max_connections: int = 40,
+):
+    """Run one ingress in this process and `workers` handler processes."""
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+
+    supervisor = ShardSupervisor(token, workers)
+    await supervisor.start()
+
+    bot = Bot(token)
+    await bot.initialize()
+    try:
+        if mode == "webhook":
+            server = ShardedWebhookServer(supervisor, **(webhook_options or {}))
+            await server.start()
+            if webhook_url:
+                await bot.set_webhook(
+                    webhook_url,
+                    allowed_updates=Update.ALL_TYPES,
+                    secret_token=server.secret_token,
+                    max_connections=max_connections,
+                )
+            await stop_event.wait()
+            await server.stop()
+        else:
+            await bot.delete_webhook()
+            polling = loop.create_task(poll_updates(bot, supervisor, stop_event))
+            await stop_event.wait()
+            polling.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await polling
+    finally:
+        await supervisor.stop()
+        await bot.shutdown()
@@ -0,0 +1,134 @@
+import json
+import logging
+import mmap
+import os
+import struct
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GHS1"
+# Magic, next update ID, number of chats, number of updates, offset of the updates section
+HEADER = struct.Struct("<4sqIIQ")
+# Chat ID, offset and length of its record; sorted by chat ID
+INDEX_ENTRY = struct.Struct("<qQI")
+# Last welcome message ID (0 for none) and number of joins
+CHAT_HEADER = struct.Struct("<qI")
+# Join time (seconds since the epoch) and user ID
+JOIN = struct.Struct("<dq")
+UPDATE_LENGTH = struct.Struct("<I")
+
+
+class ChatState(NamedTuple):
+    """In-memory state of one chat that is worth keeping across a restart."""
+
+    last_welcome: int
+    # (seconds since the epoch, user ID), oldest first
+    joins: List[Tuple[float, int]]
+
+
+def encode_chat(state: ChatState) -> bytes:
+    parts = [CHAT_HEADER.pack(state.last_welcome, len(state.joins))]
+    parts.extend(JOIN.pack(joined_at, user_id) for joined_at, user_id in state.joins)
+    return b"".join(parts)
+
+
+def decode_chat(data: bytes) -> ChatState:
+    last_welcome, count = CHAT_HEADER.unpack_from(data)
+    return ChatState(last_welcome, list(JOIN.iter_unpack(data[CHAT_HEADER.size:CHAT_HEADER.size + count * JOIN.size])))
+
+
+def write_snapshot(path: str, next_update_id: int, chats: Dict[int, bytes], updates: List[dict]):
+    """Write encoded chat records and pending updates to `path` atomically.
+
+    The chat index is sorted by chat ID so a reader can binary-search it
+    in place through mmap and decode only the chats it needs.
+    """
+    chat_ids = sorted(chats)
+    index_end = HEADER.size + INDEX_ENTRY.size * len(chat_ids)
+    offset = index_end
+    index = []
+    for chat_id in chat_ids:
+        index.append(INDEX_ENTRY.pack(chat_id, offset, len(chats[chat_id])))
+        offset += len(chats[chat_id])
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, next_update_id, len(chat_ids), len(updates), offset))
+        f.writelines(index)
+        f.writelines(chats[chat_id] for chat_id in chat_ids)
+        for update in updates:
+            data = json.dumps(update, separators=(",", ":")).encode()
+            f.write(UPDATE_LENGTH.pack(len(data)))
+            f.write(data)
+    os.replace(tmp_path, path)
+
+
+class Snapshot:
+    """Read-only view of a snapshot file, mapped into memory.
+
+    Opening it only reads the header; chat records are located by binary
+    search over the mapped index and decoded one at a time on request.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.next_update_id, self.chat_count, self.update_count, self._updates_offset = (
+            HEADER.unpack_from(self._map)
+        )
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a snapshot")
+
+    @classmethod
+    def open(cls, path: str) -> Optional["Snapshot"]:
+        """Open a snapshot, or return None if there is no usable one."""
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Ignoring snapshot {path}: {e}")
+            return None
+
+    def close(self):
+        self._map.close()
+
+    def _entry(self, position: int) -> Tuple[int, int, int]:
+        return INDEX_ENTRY.unpack_from(self._map, HEADER.size + position * INDEX_ENTRY.size)
+
+    def raw_chat(self, chat_id: int) -> Optional[bytes]:
+        """Return the encoded record of a chat, or None if it has none."""
+        low, high = 0, self.chat_count
+        while low < high:
+            middle = (low + high) // 2
+            entry_chat_id, offset, length = self._entry(middle)
+            if entry_chat_id == chat_id:
+                return self._map[offset:offset + length]
+            if entry_chat_id < chat_id:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def chat(self, chat_id: int) -> Optional[ChatState]:
+        data = self.raw_chat(chat_id)
+        return decode_chat(data) if data is not None else None
+
+    def raw_chats(self) -> Iterator[Tuple[int, bytes]]:
+        for position in range(self.chat_count):
+            chat_id, offset, length = self._entry(position)
+            yield chat_id, self._map[offset:offset + length]
+
+    def updates(self) -> List[dict]:
+        """Return the updates that were received but not processed, in order."""
+        updates = []
+        offset = self._updates_offset
+        for _ in range(self.update_count):
+            (length,) = UPDATE_LENGTH.unpack_from(self._map, offset)
+            offset += UPDATE_LENGTH.size
+            updates.append(json.loads(self._map[offset:offset + length]))
+            offset += length
+        return updates
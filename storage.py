@@ -0,0 +1,515 @@
+import asyncio
+import itertools
+import json
+import logging
+import sqlite3
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from audit import AuditEvent
+from warning_store import WarningStore
+
+logger = logging.getLogger(__name__)
+
+
+class Storage(ABC):
+    """Interface for persisting warnings, rules, welcome messages, filters, settings, jobs and the audit log."""
+
+    async def start(self):
+        """Open the backend. Called once before the bot handles updates."""
+
+    async def close(self):
+        """Flush pending writes and release resources."""
+
+    @abstractmethod
+    async def add_warning(self, chat_id: int, user_id: int, timestamp: datetime):
+        """Record a warning for a user in a chat."""
+
+    @abstractmethod
+    async def get_warnings(self, chat_id: int, user_id: int, since: datetime) -> List[datetime]:
+        """Return a user's warnings in a chat issued after `since`, oldest first."""
+
+    @abstractmethod
+    async def expire_warnings(self, before: datetime):
+        """Delete every warning issued at or before `before`."""
+
+    @abstractmethod
+    async def get_rules(self, chat_id: int) -> Optional[str]:
+        """Return the rules of a chat."""
+
+    @abstractmethod
+    async def set_rules(self, chat_id: int, rules: str):
+        """Set the rules of a chat."""
+
+    @abstractmethod
+    async def get_welcome(self, chat_id: int) -> Optional[str]:
+        """Return the welcome message template of a chat."""
+
+    @abstractmethod
+    async def set_welcome(self, chat_id: int, message: str):
+        """Set the welcome message template of a chat."""
+
+    @abstractmethod
+    async def get_filters(self, chat_id: int) -> Optional[dict]:
+        """Return the blocklist configuration of a chat."""
+
+    @abstractmethod
+    async def set_filters(self, chat_id: int, filters: dict):
+        """Set the blocklist configuration of a chat."""
+
+    @abstractmethod
+    async def get_chat_settings(self, chat_id: int) -> Optional[dict]:
+        """Return the settings admins changed in a chat."""
+
+    @abstractmethod
+    async def set_chat_settings(self, chat_id: int, settings: dict):
+        """Set the settings admins changed in a chat."""
+
+    @abstractmethod
+    async def save_job(self, job: dict):
+        """Persist a scheduled job."""
+
+    @abstractmethod
+    async def delete_job(self, job_id: str):
+        """Forget a scheduled job."""
+
+    @abstractmethod
+    async def load_jobs(self) -> List[dict]:
+        """Return every persisted scheduled job."""
+
+    @abstractmethod
+    async def add_audit_event(self, event: AuditEvent):
+        """Append a moderation event to the audit log."""
+
+    @abstractmethod
+    async def get_audit_events(self, chat_id: int, target_id: Optional[int] = None,
+                               before_id: Optional[int] = None, limit: int = 10) -> List[AuditEvent]:
+        """Return a chat's audit events newest first, optionally only those for one target.
+
+        Pages are selected by key: pass the smallest event_id of the
+        previous page as `before_id` to get the next one.
+        """
+
+
+class MemoryStorage(Storage):
+    """Process-local storage. Everything is lost on restart.
+
+    The audit log keeps the last `audit_events_per_chat` events of each chat.
+    """
+
+    def __init__(self, warning_ttl: float, audit_events_per_chat: int = 10000):
+        self.user_warnings = WarningStore(warning_ttl)
+        self.group_rules: Dict[int, str] = {}
+        self.welcome_messages: Dict[int, str] = {}
+        self.chat_filters: Dict[int, dict] = {}
+        self.chat_settings: Dict[int, dict] = {}
+        self.jobs: Dict[str, dict] = {}
+        self.audit_events_per_chat = audit_events_per_chat
+        self.audit_log: Dict[int, Deque[AuditEvent]] = {}
+        self._audit_ids = itertools.count(1)
+
+    async def start(self):
+        self.user_warnings.start_sweeper()
+
+    async def close(self):
+        await self.user_warnings.stop_sweeper()
+
+    async def add_warning(self, chat_id: int, user_id: int, timestamp: datetime):
+        self.user_warnings.add(chat_id, user_id, timestamp.timestamp())
+
+    async def get_warnings(self, chat_id: int, user_id: int, since: datetime) -> List[datetime]:
+        timestamps = self.user_warnings.get(chat_id, user_id, since.timestamp())
+        return [datetime.fromtimestamp(ts) for ts in timestamps]
+
+    async def expire_warnings(self, before: datetime):
+        self.user_warnings.sweep(before.timestamp() + self.user_warnings.ttl)
+
+    async def get_rules(self, chat_id: int) -> Optional[str]:
+        return self.group_rules.get(chat_id)
+
+    async def set_rules(self, chat_id: int, rules: str):
+        self.group_rules[chat_id] = rules
+
+    async def get_welcome(self, chat_id: int) -> Optional[str]:
+        return self.welcome_messages.get(chat_id)
+
+    async def set_welcome(self, chat_id: int, message: str):
+        self.welcome_messages[chat_id] = message
+
+    async def get_filters(self, chat_id: int) -> Optional[dict]:
+        return self.chat_filters.get(chat_id)
+
+    async def set_filters(self, chat_id: int, filters: dict):
+        self.chat_filters[chat_id] = filters
+
+    async def get_chat_settings(self, chat_id: int) -> Optional[dict]:
+        return self.chat_settings.get(chat_id)
+
+    async def set_chat_settings(self, chat_id: int, settings: dict):
+        self.chat_settings[chat_id] = settings
+
+    async def save_job(self, job: dict):
+        self.jobs[job["job_id"]] = job
+
+    async def delete_job(self, job_id: str):
+        self.jobs.pop(job_id, None)
+
+    async def load_jobs(self) -> List[dict]:
+        return list(self.jobs.values())
+
+    async def add_audit_event(self, event: AuditEvent):
+        events = self.audit_log.get(event.chat_id)
+        if events is None:
+            events = self.audit_log[event.chat_id] = deque(maxlen=self.audit_events_per_chat)
+        events.append(event._replace(event_id=next(self._audit_ids)))
+
+    async def get_audit_events(self, chat_id: int, target_id: Optional[int] = None,
+                               before_id: Optional[int] = None, limit: int = 10) -> List[AuditEvent]:
+        page = []
+        for event in reversed(self.audit_log.get(chat_id, ())):
+            if before_id is not None and event.event_id >= before_id:
+                continue
+            if target_id is not None and event.target_id != target_id:
+                continue
+            page.append(event)
+            if len(page) == limit:
+                break
+        return page
+
+
+class SQLiteStorage(Storage):
+    """SQLite storage with WAL journaling and write-behind batching.
+
+    All database work runs on a single background thread, so the event loop
+    never waits on disk I/O. Writes are queued and committed together once
+    `batch_size` writes are pending or `flush_interval` seconds have passed.
+    Reads flush pending writes first, so they always see earlier writes.
+    Connections wait up to `timeout` seconds for locks held by other
+    processes sharing the file.
+    """
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS warnings (
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            timestamp REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_warnings_chat_user_ts ON warnings (chat_id, user_id, timestamp)",
+        "CREATE TABLE IF NOT EXISTS rules (chat_id INTEGER PRIMARY KEY, rules TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS welcome_messages (chat_id INTEGER PRIMARY KEY, message TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS filters (chat_id INTEGER PRIMARY KEY, config TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS chat_settings (chat_id INTEGER PRIMARY KEY, settings TEXT NOT NULL)",
+        """CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            run_at REAL NOT NULL,
+            kind TEXT NOT NULL,
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER,
+            payload TEXT NOT NULL
+        )""",
+        # Append-only; event_id is the rowid, so it grows with every insert
+        """CREATE TABLE IF NOT EXISTS audit_log (
+            event_id INTEGER PRIMARY KEY,
+            chat_id INTEGER NOT NULL,
+            actor_id INTEGER NOT NULL,
+            target_id INTEGER,
+            action TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            timestamp REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_audit_chat ON audit_log (chat_id, event_id)",
+        "CREATE INDEX IF NOT EXISTS idx_audit_target ON audit_log (target_id, chat_id, event_id)",
+    )
+
+    # Statements are kept as constants so sqlite3's statement cache reuses
+    # the prepared form on every call
+    INSERT_WARNING = "INSERT INTO warnings (chat_id, user_id, timestamp) VALUES (?, ?, ?)"
+    SELECT_WARNINGS = (
+        "SELECT timestamp FROM warnings WHERE chat_id = ? AND user_id = ? AND timestamp > ? "
+        "ORDER BY timestamp"
+    )
+    DELETE_EXPIRED_WARNINGS = "DELETE FROM warnings WHERE timestamp <= ?"
+    UPSERT_RULES = "INSERT OR REPLACE INTO rules (chat_id, rules) VALUES (?, ?)"
+    SELECT_RULES = "SELECT rules FROM rules WHERE chat_id = ?"
+    UPSERT_WELCOME = "INSERT OR REPLACE INTO welcome_messages (chat_id, message) VALUES (?, ?)"
+    SELECT_WELCOME = "SELECT message FROM welcome_messages WHERE chat_id = ?"
+    UPSERT_FILTERS = "INSERT OR REPLACE INTO filters (chat_id, config) VALUES (?, ?)"
+    SELECT_FILTERS = "SELECT config FROM filters WHERE chat_id = ?"
+    UPSERT_CHAT_SETTINGS = "INSERT OR REPLACE INTO chat_settings (chat_id, settings) VALUES (?, ?)"
+    SELECT_CHAT_SETTINGS = "SELECT settings FROM chat_settings WHERE chat_id = ?"
+    INSERT_JOB = (
+        "INSERT OR REPLACE INTO jobs (job_id, run_at, kind, chat_id, user_id, payload) "
+        "VALUES (?, ?, ?, ?, ?, ?)"
+    )
+    DELETE_JOB = "DELETE FROM jobs WHERE job_id = ?"
+    SELECT_JOBS = "SELECT job_id, run_at, kind, chat_id, user_id, payload FROM jobs"
+    INSERT_AUDIT_EVENT = (
+        "INSERT INTO audit_log (chat_id, actor_id, target_id, action, reason, timestamp) "
+        "VALUES (?, ?, ?, ?, ?, ?)"
+    )
+    SELECT_AUDIT_EVENTS = (
+        "SELECT chat_id, actor_id, target_id, action, reason, timestamp, event_id FROM audit_log "
+        "WHERE chat_id = ? AND event_id < ? ORDER BY event_id DESC LIMIT ?"
+    )
+    SELECT_AUDIT_EVENTS_FOR_TARGET = (
+        "SELECT chat_id, actor_id, target_id, action, reason, timestamp, event_id FROM audit_log "
+        "WHERE target_id = ? AND chat_id = ? AND event_id < ? ORDER BY event_id DESC LIMIT ?"
+    )
+    # Larger than any rowid
+    MAX_EVENT_ID = 2 ** 63 - 1
+
+    def __init__(self, path: str, flush_interval: float = 0.5, batch_size: int = 500, timeout: float = 10.0):
+        self.path = path
+        self.timeout = timeout
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: List[Tuple[str, tuple]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        await self._run(self._connect)
+
+    async def close(self):
+        if self._executor is None:
+            return
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        if self._pending:
+            logger.error(f"Dropping {len(self._pending)} operations that couldn't be written to {self.path}")
+            self._pending = []
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self._run(self._conn.close)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        self._conn = conn
+
+    async def _run(self, func: Callable, *args) -> Any:
+        """Run a function on the database thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _write_batch(self, operations: List[Tuple[str, tuple]]):
+        """Commit a batch of writes, grouping runs of the same statement."""
+        with self._conn:
+            start = 0
+            while start < len(operations):
+                sql = operations[start][0]
+                end = start
+                while end < len(operations) and operations[end][0] == sql:
+                    end += 1
+                self._conn.executemany(sql, [params for _, params in operations[start:end]])
+                start = end
+
+    def _write(self, sql: str, params: tuple):
+        """Queue a write and schedule a flush."""
+        self._pending.append((sql, params))
+        if len(self._pending) >= self.batch_size:
+            asyncio.get_running_loop().create_task(self.flush())
+        elif self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_interval)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        """Commit all pending writes.
+
+        A batch that fails with an OperationalError, such as the database
+        being locked by another worker, goes back to the front of the queue
+        and is retried after `flush_interval`. Other errors drop it.
+        """
+        if not self._pending:
+            return
+        operations, self._pending = self._pending, []
+        try:
+            await self._run(self._write_batch, operations)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Failed to write {len(operations)} operations to {self.path}, retrying: {e}")
+            self._pending[:0] = operations
+            if self._flush_task is None and self._executor is not None:
+                self._flush_task = asyncio.get_running_loop().create_task(self._delayed_flush())
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write {len(operations)} operations to {self.path}: {e}")
+
+    async def _read(self, sql: str, params: tuple) -> List[tuple]:
+        await self.flush()
+        return await self._run(lambda: self._conn.execute(sql, params).fetchall())
+
+    async def add_warning(self, chat_id: int, user_id: int, timestamp: datetime):
+        self._write(self.INSERT_WARNING, (chat_id, user_id, timestamp.timestamp()))
+
+    async def get_warnings(self, chat_id: int, user_id: int, since: datetime) -> List[datetime]:
+        rows = await self._read(self.SELECT_WARNINGS, (chat_id, user_id, since.timestamp()))
+        return [datetime.fromtimestamp(row[0]) for row in rows]
+
+    async def expire_warnings(self, before: datetime):
+        self._write(self.DELETE_EXPIRED_WARNINGS, (before.timestamp(),))
+
+    async def get_rules(self, chat_id: int) -> Optional[str]:
+        rows = await self._read(self.SELECT_RULES, (chat_id,))
+        return rows[0][0] if rows else None
+
+    async def set_rules(self, chat_id: int, rules: str):
+        self._write(self.UPSERT_RULES, (chat_id, rules))
+
+    async def get_welcome(self, chat_id: int) -> Optional[str]:
+        rows = await self._read(self.SELECT_WELCOME, (chat_id,))
+        return rows[0][0] if rows else None
+
+    async def set_welcome(self, chat_id: int, message: str):
+        self._write(self.UPSERT_WELCOME, (chat_id, message))
+
+    async def get_filters(self, chat_id: int) -> Optional[dict]:
+        rows = await self._read(self.SELECT_FILTERS, (chat_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    async def set_filters(self, chat_id: int, filters: dict):
+        self._write(self.UPSERT_FILTERS, (chat_id, json.dumps(filters)))
+
+    async def get_chat_settings(self, chat_id: int) -> Optional[dict]:
+        rows = await self._read(self.SELECT_CHAT_SETTINGS, (chat_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    async def set_chat_settings(self, chat_id: int, settings: dict):
+        self._write(self.UPSERT_CHAT_SETTINGS, (chat_id, json.dumps(settings)))
+
+    async def save_job(self, job: dict):
+        self._write(self.INSERT_JOB, (
+            job["job_id"], job["run_at"], job["kind"], job["chat_id"],
+            job["user_id"], json.dumps(job["payload"])
+        ))
+
+    async def delete_job(self, job_id: str):
+        self._write(self.DELETE_JOB, (job_id,))
+
+    async def load_jobs(self) -> List[dict]:
+        rows = await self._read(self.SELECT_JOBS, ())
+        return [
+            {
+                "job_id": job_id,
+                "run_at": run_at,
+                "kind": kind,
+                "chat_id": chat_id,
+                "user_id": user_id,
+                "payload": json.loads(payload),
+            }
+            for job_id, run_at, kind, chat_id, user_id, payload in rows
+        ]
+
+    async def add_audit_event(self, event: AuditEvent):
+        self._write(self.INSERT_AUDIT_EVENT, tuple(event[:-1]))
+
+    async def get_audit_events(self, chat_id: int, target_id: Optional[int] = None,
+                               before_id: Optional[int] = None, limit: int = 10) -> List[AuditEvent]:
+        before_id = self.MAX_EVENT_ID if before_id is None else before_id
+        if target_id is None:
+            rows = await self._read(self.SELECT_AUDIT_EVENTS, (chat_id, before_id, limit))
+        else:
+            rows = await self._read(self.SELECT_AUDIT_EVENTS_FOR_TARGET, (target_id, chat_id, before_id, limit))
+        return [AuditEvent(*row) for row in rows]
+
+
+class NamespacedStorage(Storage):
+    """One bot's view of a backend shared by several bots.
+
+    Bot API chat IDs have at most 52 significant bits, so every namespace
+    gets its own disjoint range of 64-bit keys: a chat is stored under
+    `chat_id + namespace * NAMESPACE_STRIDE`. Namespace 0 uses the chat ID
+    unchanged, so the data of a single-bot deployment stays where it is.
+    Opening and closing the shared backend is left to its owner.
+    """
+
+    NAMESPACE_STRIDE = 2 ** 53
+    MAX_NAMESPACE = 1023
+
+    def __init__(self, backend: Storage, namespace: int = 0):
+        if not 0 <= namespace <= self.MAX_NAMESPACE:
+            raise ValueError(f"Namespace must be between 0 and {self.MAX_NAMESPACE}")
+        self.backend = backend
+        self.namespace = namespace
+        self.offset = namespace * self.NAMESPACE_STRIDE
+
+    def owns(self, key: int) -> bool:
+        """Return whether a stored chat key belongs to this namespace."""
+        return abs(key - self.offset) < self.NAMESPACE_STRIDE // 2
+
+    async def add_warning(self, chat_id: int, user_id: int, timestamp: datetime):
+        await self.backend.add_warning(chat_id + self.offset, user_id, timestamp)
+
+    async def get_warnings(self, chat_id: int, user_id: int, since: datetime) -> List[datetime]:
+        return await self.backend.get_warnings(chat_id + self.offset, user_id, since)
+
+    async def expire_warnings(self, before: datetime):
+        await self.backend.expire_warnings(before)
+
+    async def get_rules(self, chat_id: int) -> Optional[str]:
+        return await self.backend.get_rules(chat_id + self.offset)
+
+    async def set_rules(self, chat_id: int, rules: str):
+        await self.backend.set_rules(chat_id + self.offset, rules)
+
+    async def get_welcome(self, chat_id: int) -> Optional[str]:
+        return await self.backend.get_welcome(chat_id + self.offset)
+
+    async def set_welcome(self, chat_id: int, message: str):
+        await self.backend.set_welcome(chat_id + self.offset, message)
+
+    async def get_filters(self, chat_id: int) -> Optional[dict]:
+        return await self.backend.get_filters(chat_id + self.offset)
+
+    async def set_filters(self, chat_id: int, filters: dict):
+        await self.backend.set_filters(chat_id + self.offset, filters)
+
+    async def get_chat_settings(self, chat_id: int) -> Optional[dict]:
+        return await self.backend.get_chat_settings(chat_id + self.offset)
+
+    async def set_chat_settings(self, chat_id: int, settings: dict):
+        await self.backend.set_chat_settings(chat_id + self.offset, settings)
+
+    async def save_job(self, job: dict):
+        await self.backend.save_job({**job, "chat_id": job["chat_id"] + self.offset})
+
+    async def delete_job(self, job_id: str):
+        await self.backend.delete_job(job_id)
+
+    async def load_jobs(self) -> List[dict]:
+        return [
+            {**job, "chat_id": job["chat_id"] - self.offset}
+            for job in await self.backend.load_jobs()
+            if self.owns(job["chat_id"])
+        ]
+
+    async def add_audit_event(self, event: AuditEvent):
+        await self.backend.add_audit_event(event._replace(chat_id=event.chat_id + self.offset))
+
+    async def get_audit_events(self, chat_id: int, target_id: Optional[int] = None,
+                               before_id: Optional[int] = None, limit: int = 10) -> List[AuditEvent]:
+        events = await self.backend.get_audit_events(chat_id + self.offset, target_id, before_id, limit)
+        return [event._replace(chat_id=chat_id) for event in events]
+
+
+def create_storage(backend: str, path: str, warning_ttl: float) -> Storage:
+    """Create a storage backend by name ("memory" or "sqlite")."""
+    if backend == "memory":
+        return MemoryStorage(warning_ttl)
+    if backend == "sqlite":
+        return SQLiteStorage(path)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+from typing import Dict, NamedTuple, Optional
+
+from resources import SharedResources
+
+logger = logging.getLogger(__name__)
+
+
+class BotConfig(NamedTuple):
+    """Settings of one bot hosted by the multi-bot runner."""
+
+    token: str
+    # Storage namespace, must be unique and stable across restarts
+    namespace: int
+    rate_limit_global: Optional[float] = None
+    rate_limit_group_per_minute: Optional[float] = None
+    metrics_port: int = 0
+
+
+def load_config(path: str) -> Dict[str, BotConfig]:
+    """Read the bots of a config file, keyed by token.
+
+    The file holds {"bots": [{"token": ..., "namespace": ...}, ...]} with
+    optional "rate_limit_global", "rate_limit_group_per_minute" and
+    "metrics_port" per bot.
+    """
+    with open(path) as f:
+        data = json.load(f)
+
+    bots: Dict[str, BotConfig] = {}
+    namespaces = set()
+    for entry in data.get("bots", []):
+        config = BotConfig(**entry)
+        if config.token in bots:
+            raise ValueError(f"Bot {config.token.split(':')[0]} is listed twice")
+        if config.namespace in namespaces:
+            raise ValueError(f"Namespace {config.namespace} is used by more than one bot")
+        bots[config.token] = config
+        namespaces.add(config.namespace)
+    return bots
+
+
+class MultiBotRunner:
+    """Host several GroupHelpBots in one event loop.
+
+    All bots share one SharedResources: a single HTTP connection pool for
+    Bot API calls, one storage backend with a namespace per bot, and the
+    admin and username caches. Each bot keeps its own rate limiter, update
+    processor, long-polling connection and snapshot file, suffixed with its
+    namespace. The config file is checked every `check_interval` seconds;
+    bots that were added are started, bots that were removed are stopped
+    and bots whose settings changed are restarted.
+    """
+
+    def __init__(self, config_path: str, shared: SharedResources, check_interval: float = 5.0):
+        self.config_path = config_path
+        self.shared = shared
+        self.check_interval = check_interval
+        self.configs: Dict[str, BotConfig] = {}
+        self.bots: Dict[str, "GroupHelpBot"] = {}
+        self._mtime: Optional[float] = None
+
+    async def start_bot(self, config: BotConfig):
+        # Imported here because main imports this module
+        from main import GroupHelpBot
+
+        options = {key: value for key, value in config._asdict().items() if value is not None}
+        bot = GroupHelpBot(shared=self.shared, **options)
+        application = bot.application
+        try:
+            await application.initialize()
+        except Exception as e:
+            logger.error(f"Failed to start bot {config.token.split(':')[0]}: {e}")
+            return
+        try:
+            await bot.start_polling()
+        except Exception as e:
+            logger.error(f"Failed to start bot @{application.bot.username}: {e}")
+            await bot.stop_polling()
+            return
+        self.bots[config.token] = bot
+        logger.info(f"Started bot @{application.bot.username} in namespace {config.namespace}")
+
+    async def stop_bot(self, token: str):
+        bot = self.bots.pop(token, None)
+        if bot is not None:
+            await bot.stop_polling()
+            logger.info(f"Stopped bot @{bot.application.bot.username}")
+
+    async def reload(self):
+        """Apply the config file if it changed since the last check."""
+        try:
+            mtime = os.stat(self.config_path).st_mtime
+        except OSError as e:
+            logger.error(f"Cannot read bot config {self.config_path}: {e}")
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            configs = load_config(self.config_path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"Ignoring bot config {self.config_path}: {e}")
+            return
+
+        for token, config in self.configs.items():
+            if configs.get(token) != config:
+                await self.stop_bot(token)
+        for token, config in configs.items():
+            if token not in self.bots:
+                await self.start_bot(config)
+        self.configs = configs
+
+    async def run(self):
+        """Run the bots until SIGINT/SIGTERM."""
+        loop = asyncio.get_running_loop()
+        stop_event = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except NotImplementedError:
+                pass
+
+        try:
+            while not stop_event.is_set():
+                await self.reload()
+                try:
+                    await asyncio.wait_for(stop_event.wait(), self.check_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await asyncio.gather(*(self.stop_bot(token) for token in list(self.bots)))
+            if self.shared.request is not None:
+                await self.shared.request.close()
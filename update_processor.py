@@ -0,0 +1,188 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Coroutine, Deque, Dict, List, Optional, Set, Tuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def ordering_key(update: object) -> Optional[int]:
+    """Return the ID whose updates must be processed in order, or None."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return None
+
+
+class ChatQueue:
+    """Updates of one chat waiting behind the one being processed."""
+
+    __slots__ = ("pending", "blocked")
+
+    def __init__(self):
+        self.pending: Deque[Tuple[object, Coroutine[Any, Any, Any]]] = deque()
+        # Updates that arrived while `pending` was full, with the future
+        # their task waits on until they are moved into `pending`
+        self.blocked: Deque[Tuple[object, Coroutine[Any, Any, Any], asyncio.Future]] = deque()
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Process updates of different chats concurrently, each chat in order.
+
+    Up to `max_concurrent_updates` chats are worked on at once. The first
+    update of an idle chat processes it and then drains whatever queued up
+    for that chat in the meantime, so warnings, mutes and unmutes of a chat
+    are applied in the order they arrived. Later updates for a busy chat
+    are queued and return at once without occupying a slot.
+
+    At most `max_queued_per_chat` updates are queued per chat. Beyond that
+    the arriving update waits until the chat catches up. Waiting updates
+    don't take a processing slot, so a flooded chat never holds more than
+    one and other chats keep going. Only when `max_blocked` updates are
+    waiting across all chats does intake slow down, bounding memory.
+
+    For a graceful shutdown, hold() lets the updates being processed finish
+    but starts no others: queued and newly arriving updates are collected
+    in `held` instead, to be persisted and processed after a restart.
+    abort() cancels the updates still being processed.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_queued_per_chat: int = 100, max_blocked: int = 1000):
+        # The base class semaphore bounds the updates being processed plus
+        # those waiting on a full chat queue; `_slots` bounds the former
+        super().__init__(max_concurrent_updates + max_blocked)
+        if max_queued_per_chat < 1:
+            raise ValueError("`max_queued_per_chat` must be a positive integer!")
+        self.max_queued_per_chat = max_queued_per_chat
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._chats: Dict[int, ChatQueue] = {}
+        self.blocked_count = 0
+        self.last_update_id = 0
+        self.holding = False
+        self.held: List[Update] = []
+        self._aborting = False
+        self._running: Set[asyncio.Task] = set()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @property
+    def active_chats(self) -> int:
+        return len(self._chats)
+
+    @property
+    def queued_updates(self) -> int:
+        return sum(len(chat.pending) + len(chat.blocked) for chat in self._chats.values())
+
+    def hold(self):
+        """Finish the updates being processed and hold back all others."""
+        self.holding = True
+
+    def abort(self) -> int:
+        """Cancel the updates still being processed and return how many there were."""
+        self._aborting = True
+        for task in self._running:
+            task.cancel()
+        return len(self._running)
+
+    def _hold(self, update: object, coroutine: Coroutine[Any, Any, Any]):
+        coroutine.close()
+        if isinstance(update, Update):
+            self.held.append(update)
+
+    async def do_process_update(self, update: object, coroutine: Coroutine[Any, Any, Any]):
+        if isinstance(update, Update) and update.update_id > self.last_update_id:
+            self.last_update_id = update.update_id
+        if self.holding:
+            self._hold(update, coroutine)
+            return
+
+        task = asyncio.current_task()
+        self._running.add(task)
+        try:
+            await self._process(update, coroutine)
+        except asyncio.CancelledError:
+            # Let Application.stop() see aborted updates as done
+            if not self._aborting:
+                raise
+        finally:
+            self._running.discard(task)
+
+    async def _process(self, update: object, coroutine: Coroutine[Any, Any, Any]):
+        key = ordering_key(update)
+        if key is None:
+            async with self._slots:
+                if self.holding:
+                    self._hold(update, coroutine)
+                else:
+                    await coroutine
+            return
+
+        chat = self._chats.get(key)
+        if chat is None:
+            await self._drain(key, update, coroutine)
+            return
+
+        if len(chat.pending) < self.max_queued_per_chat and not chat.blocked:
+            chat.pending.append((update, coroutine))
+            return
+
+        self.blocked_count += 1
+        moved = asyncio.get_running_loop().create_future()
+        chat.blocked.append((update, coroutine, moved))
+        await moved
+
+    async def _drain(self, key: int, update: object, coroutine: Coroutine[Any, Any, Any]):
+        # Registered before waiting for a slot so later updates queue behind this one
+        chat = self._chats[key] = ChatQueue()
+        chat.pending.append((update, coroutine))
+        try:
+            async with self._slots:
+                while chat.pending and not self.holding:
+                    _, coroutine = chat.pending.popleft()
+                    if chat.blocked:
+                        blocked_update, blocked, moved = chat.blocked.popleft()
+                        chat.pending.append((blocked_update, blocked))
+                        if not moved.done():
+                            moved.set_result(None)
+                    try:
+                        await coroutine
+                    except Exception:
+                        # Application.process_update reports handler errors itself
+                        logger.exception(f"Failed to process update for chat {key}")
+        finally:
+            del self._chats[key]
+            if self.holding:
+                for update, pending in chat.pending:
+                    self._hold(update, pending)
+                for update, blocked, moved in chat.blocked:
+                    self._hold(update, blocked)
+                    if not moved.done():
+                        moved.set_result(None)
+            else:
+                # Only reached with work left if the task was cancelled
+                dropped = len(chat.pending) + len(chat.blocked)
+                for _, pending in chat.pending:
+                    pending.close()
+                for _, blocked, moved in chat.blocked:
+                    blocked.close()
+                    moved.cancel()
+                if dropped:
+                    logger.warning(f"Dropped {dropped} queued updates for chat {key}")
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of busy chats, queued updates and intake stalls."""
+        return {
+            "active_chats": self.active_chats,
+            "queued_updates": self.queued_updates,
+            "blocked": self.blocked_count,
+        }
@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+import sys
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from telegram import User
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry cost of the dict slots, tuples and ints besides the strings
+ENTRY_OVERHEAD_BYTES = 240
+
+
+class UsernameIndex:
+    """Per-chat map from @username to user, built from the updates the bot sees.
+
+    Entries are kept in LRU order and evicted once the estimated memory use
+    exceeds `max_bytes`. A reverse map drops a user's old username when
+    they are seen with a new one.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.memory_bytes = 0
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[int, str]]" = OrderedDict()
+        self._usernames: Dict[Tuple[int, int], str] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _entry_size(username: str, first_name: str) -> int:
+        return ENTRY_OVERHEAD_BYTES + sys.getsizeof(username) + sys.getsizeof(first_name)
+
+    def add(self, chat_id: int, user_id: int, username: str, first_name: str):
+        """Record that `username` belongs to `user_id` in a chat."""
+        username = username.lower()
+        key = (chat_id, username)
+        entry = self._entries.get(key)
+        if entry is not None and entry == (user_id, first_name):
+            self._entries.move_to_end(key)
+            return
+
+        old_username = self._usernames.get((chat_id, user_id))
+        if old_username is not None and old_username != username:
+            self._remove((chat_id, old_username))
+        if entry is not None:
+            self._remove(key)
+
+        self._entries[key] = (user_id, first_name)
+        self._usernames[(chat_id, user_id)] = username
+        self.memory_bytes += self._entry_size(username, first_name)
+        while self.memory_bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Tuple[int, str]):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id, first_name = entry
+        self.memory_bytes -= self._entry_size(key[1], first_name)
+        if self._usernames.get((key[0], user_id)) == key[1]:
+            del self._usernames[(key[0], user_id)]
+
+    def observe(self, chat_id: int, user: Optional[User]):
+        """Index a user seen in a chat, if they have a username."""
+        if user is not None and user.username:
+            self.add(chat_id, user.id, user.username, user.first_name)
+
+    def resolve(self, chat_id: int, username: str) -> Optional[User]:
+        """Return the user known under `username` in a chat, or None."""
+        key = (chat_id, username.lstrip("@").lower())
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        user_id, first_name = entry
+        return User(id=user_id, first_name=first_name, is_bot=False, username=key[1])
+
+    def dump(self) -> List[list]:
+        """Return all entries, least recently used first."""
+        return [
+            [chat_id, username, user_id, first_name]
+            for (chat_id, username), (user_id, first_name) in self._entries.items()
+        ]
+
+    def load(self, entries: List[list]):
+        """Add entries produced by dump()."""
+        for chat_id, username, user_id, first_name in entries:
+            self.add(chat_id, user_id, username, first_name)
+
+    def save_file(self, path: str):
+        """Write the index to a JSON file."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.dump(), f)
+        os.replace(tmp_path, path)
+
+    def load_file(self, path: str):
+        """Load the index from a JSON file written by save_file()."""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path) as f:
+                self.load(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to load username index from {path}: {e}")
@@ -0,0 +1,110 @@
+import asyncio
+import heapq
+import logging
+import time
+from bisect import insort
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+WarningKey = Tuple[int, int]
+
+
+class WarningStore:
+    """In-memory warnings keyed by (chat_id, user_id).
+
+    Each key holds a deque of warning timestamps in ascending order, so
+    expired warnings are always popped from the front. A global min-heap of
+    expiry times lets the sweeper find due entries without scanning every
+    user, and keys are dropped as soon as their last warning expires.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._warnings: Dict[WarningKey, Deque[float]] = {}
+        self._expiry_heap: List[Tuple[float, WarningKey]] = []
+        self._sweeper: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._warnings)
+
+    def add(self, chat_id: int, user_id: int, timestamp: float):
+        """Record a warning issued at `timestamp` (seconds since the epoch)."""
+        key = (chat_id, user_id)
+        timestamps = self._warnings.get(key)
+        if timestamps is None:
+            timestamps = self._warnings[key] = deque()
+
+        if not timestamps or timestamps[-1] <= timestamp:
+            timestamps.append(timestamp)
+        else:
+            insort(timestamps, timestamp)
+
+        expires_at = timestamp + self.ttl
+        if not self._expiry_heap or expires_at < self._expiry_heap[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self._expiry_heap, (expires_at, key))
+
+    def _prune(self, key: WarningKey, cutoff: float) -> Optional[Deque[float]]:
+        """Pop warnings issued at or before `cutoff` and drop empty keys."""
+        timestamps = self._warnings.get(key)
+        if timestamps is None:
+            return None
+        while timestamps and timestamps[0] <= cutoff:
+            timestamps.popleft()
+        if not timestamps:
+            del self._warnings[key]
+            return None
+        return timestamps
+
+    def get(self, chat_id: int, user_id: int, since: float) -> List[float]:
+        """Return the warnings issued after `since`, oldest first."""
+        timestamps = self._prune((chat_id, user_id), since)
+        return list(timestamps) if timestamps else []
+
+    def count(self, chat_id: int, user_id: int, since: float) -> int:
+        """Return the number of warnings issued after `since`."""
+        timestamps = self._prune((chat_id, user_id), since)
+        return len(timestamps) if timestamps else 0
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Expire every warning that is due and return how many keys were dropped."""
+        now = time.time() if now is None else now
+        cutoff = now - self.ttl
+        dropped = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            _, key = heapq.heappop(self._expiry_heap)
+            if key in self._warnings and self._prune(key, cutoff) is None:
+                dropped += 1
+        return dropped
+
+    def start_sweeper(self, max_interval: float = 3600.0):
+        """Start the background task that expires warnings when they are due."""
+        if self._sweeper is None:
+            self._sweeper = asyncio.get_running_loop().create_task(self._run_sweeper(max_interval))
+
+    async def stop_sweeper(self):
+        """Stop the background sweeper."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    async def _run_sweeper(self, max_interval: float):
+        while True:
+            delay = max_interval
+            if self._expiry_heap:
+                delay = min(max(self._expiry_heap[0][0] - time.time(), 0), max_interval)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            dropped = self.sweep()
+            if dropped:
+                logger.debug(f"Expired warnings of {dropped} users")
@@ -0,0 +1,136 @@
+import asyncio
+import hmac
+import logging
+import signal
+from typing import Optional
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """aiohttp server that feeds webhook updates into an Application.
+
+    POST requests on `path` must carry the secret token (if one is set) and
+    an Update JSON body. The update is put on the application's update queue
+    and the request returns immediately. /healthz reports liveness and
+    /readyz reports whether the application is processing updates.
+    """
+
+    def __init__(
+        self,
+        application: Application,
+        host: str = "0.0.0.0",
+        port: int = 8080,
+        path: str = "/webhook",
+        secret_token: Optional[str] = None,
+    ):
+        self.application = application
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self._runner: Optional[web.AppRunner] = None
+
+    def create_app(self) -> web.Application:
+        """Build the aiohttp application with the webhook and health routes."""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get("/healthz", self.handle_health)
+        app.router.add_get("/readyz", self.handle_ready)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """Validate and enqueue one update."""
+        if self.secret_token is not None:
+            token = request.headers.get(SECRET_TOKEN_HEADER, "")
+            if not hmac.compare_digest(token, self.secret_token):
+                return web.Response(status=403, text="Invalid secret token")
+
+        try:
+            data = await request.json()
+            await self.dispatch(data)
+        except Exception as e:
+            logger.warning(f"Rejected malformed webhook update: {e}")
+            return web.Response(status=400, text="Malformed update")
+
+        return web.Response(text="ok")
+
+    async def dispatch(self, data: dict):
+        """Parse an update and put it on the application's update queue."""
+        update = Update.de_json(data, self.application.bot)
+        if update is None:
+            raise ValueError("Empty update")
+        await self.application.update_queue.put(update)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    async def handle_ready(self, request: web.Request) -> web.Response:
+        if self.application.running:
+            return web.Response(text="ready")
+        return web.Response(status=503, text="not ready")
+
+    async def start(self):
+        """Start listening for HTTP requests."""
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        logger.info(f"Webhook server listening on {self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        """Stop accepting requests."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def run_webhook(
+    application: Application,
+    server: WebhookServer,
+    webhook_url: Optional[str] = None,
+    max_connections: int = 40,
+):
+    """Run the application behind a webhook server until SIGINT/SIGTERM.
+
+    The webhook is only registered with Telegram when `webhook_url` is set,
+    so the server can also run locally and be fed synthetic updates.
+    """
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    await server.start()
+    if webhook_url:
+        await application.bot.set_webhook(
+            webhook_url,
+            allowed_updates=Update.ALL_TYPES,
+            secret_token=server.secret_token,
+            max_connections=max_connections,
+        )
+
+    try:
+        await stop_event.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
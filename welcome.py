@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from functools import lru_cache
+from string import Formatter
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from telegram import User
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_FIELDS = ("username", "mention")
+
+
+class WelcomeTemplate:
+    """A welcome message template parsed once into literal and field parts.
+
+    Supports the {username} and {mention} placeholders. Any other
+    placeholder is kept verbatim instead of raising like str.format would.
+    """
+
+    __slots__ = ("parts",)
+
+    def __init__(self, template: str):
+        self.parts: List[Tuple[str, str]] = []
+        for literal, field_name, format_spec, conversion in Formatter().parse(template):
+            if field_name is None or field_name in TEMPLATE_FIELDS:
+                self.parts.append((literal, field_name))
+            else:
+                placeholder = "{" + field_name
+                if conversion:
+                    placeholder += "!" + conversion
+                if format_spec:
+                    placeholder += ":" + format_spec
+                self.parts.append((literal + placeholder + "}", None))
+
+    def render(self, username: str, mention: str) -> str:
+        values = {"username": username, "mention": mention}
+        return "".join(
+            literal + (values[field_name] if field_name else "")
+            for literal, field_name in self.parts
+        )
+
+
+@lru_cache(maxsize=4096)
+def compile_template(template: str) -> WelcomeTemplate:
+    """Return the compiled form of a template, parsing each distinct one once."""
+    return WelcomeTemplate(template)
+
+
+def join_names(names: List[str], limit: int) -> str:
+    """Join names as "a, b and c", collapsing anything past `limit`."""
+    shown = names[:limit]
+    hidden = len(names) - len(shown)
+    if hidden:
+        return f"{', '.join(shown)} and {hidden} others"
+    if len(shown) > 1:
+        return f"{', '.join(shown[:-1])} and {shown[-1]}"
+    return shown[0] if shown else ""
+
+
+class WelcomeCoalescer:
+    """Buffer new members per chat and welcome them in a single message.
+
+    The first join in a chat opens a window of `window` seconds. Members
+    joining during the window are added to the same batch, which is handed
+    to `flush_callback` once the window closes.
+    """
+
+    def __init__(
+        self,
+        flush_callback: Callable[[object, int, List[User]], Awaitable[None]],
+        window: float = 2.0,
+    ):
+        self.flush_callback = flush_callback
+        self.window = window
+        self._pending: Dict[int, Tuple[object, List[User]]] = {}
+        self._timers: Dict[int, asyncio.Task] = {}
+
+    @property
+    def pending_members(self) -> int:
+        return sum(len(members) for _, members in self._pending.values())
+
+    def add(self, bot, chat_id: int, members: List[User]):
+        """Queue members for the next combined welcome in a chat."""
+        if chat_id in self._pending:
+            self._pending[chat_id][1].extend(members)
+            return
+        self._pending[chat_id] = (bot, list(members))
+        self._timers[chat_id] = asyncio.get_running_loop().create_task(self._flush_later(chat_id))
+
+    async def _flush_later(self, chat_id: int):
+        await asyncio.sleep(self.window)
+        self._timers.pop(chat_id, None)
+        await self.flush(chat_id)
+
+    async def flush(self, chat_id: int):
+        """Send the pending welcome of a chat now."""
+        entry = self._pending.pop(chat_id, None)
+        if entry is None:
+            return
+        bot, members = entry
+        try:
+            await self.flush_callback(bot, chat_id, members)
+        except Exception as e:
+            logger.error(f"Failed to welcome {len(members)} members in chat {chat_id}: {e}")
+
+    def discard(self, chat_id: int):
+        """Drop the pending welcome of a chat without sending it."""
+        timer = self._timers.pop(chat_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._pending.pop(chat_id, None)
+
+    async def flush_all(self):
+        """Send every pending welcome immediately."""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        await asyncio.gather(*(self.flush(chat_id) for chat_id in list(self._pending)))